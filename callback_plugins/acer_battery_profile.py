@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Per-task wall time, remote executions and status, written as JSON."""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Dict, List
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = r"""
+---
+name: acer_battery_profile
+type: aggregate
+short_description: Profile role runs per task and write a JSON report
+description:
+  - Records, for every task and host, the wall time since the task started,
+    the number of module executions on the target (loop items count
+    separately; local actions such as C(set_fact) and C(debug) count as 0)
+    and the result status (ok, changed, failed, skipped, unreachable).
+  - Writes the report as JSON at the end of the run and prints the slowest
+    tasks.
+requirements:
+  - enable in ansible.cfg (C(callbacks_enabled = acer_battery_profile)) or
+    with C(ANSIBLE_CALLBACKS_ENABLED=acer_battery_profile)
+options:
+  report_path:
+    description: File the JSON report is written to.
+    default: acer_battery_profile.json
+    env:
+      - name: ACER_BATTERY_PROFILE_PATH
+    ini:
+      - section: callback_acer_battery_profile
+        key: report_path
+  top:
+    description: Number of slowest tasks printed at the end of the run.
+    type: int
+    default: 10
+    env:
+      - name: ACER_BATTERY_PROFILE_TOP
+    ini:
+      - section: callback_acer_battery_profile
+        key: top
+"""
+
+
+def remote_executions(result: Dict[str, Any]) -> int:
+    """Count module runs on the target: results that carry an invocation."""
+    if isinstance(result.get("results"), list):
+        return sum(
+            1
+            for item in result["results"]
+            if isinstance(item, dict) and "invocation" in item
+        )
+    return 1 if "invocation" in result else 0
+
+
+class CallbackModule(CallbackBase):
+    """Collect per-task timings and write them as a JSON report."""
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "acer_battery_profile"
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.started = time.time()
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+
+    def _start(self, task: Any, handler: bool = False) -> None:
+        self.tasks[task._uuid] = {
+            "name": task.get_name(),
+            "action": task.action,
+            "path": task.get_path(),
+            "handler": handler,
+            "start": time.time(),
+            "duration": 0.0,
+            "hosts": {},
+        }
+
+    def v2_playbook_on_task_start(self, task: Any, is_conditional: bool) -> None:
+        self._start(task)
+
+    def v2_playbook_on_handler_task_start(self, task: Any) -> None:
+        self._start(task, handler=True)
+
+    def _record(self, result: Any, status: str) -> None:
+        entry = self.tasks.get(result._task._uuid)
+        if entry is None:
+            return
+        now = time.time()
+        entry["duration"] = max(entry["duration"], now - entry["start"])
+        res = result._result
+        if status == "ok" and res.get("changed"):
+            status = "changed"
+        entry["hosts"][result._host.get_name()] = {
+            "status": status,
+            "duration": round(now - entry["start"], 4),
+            "remote_executions": 0 if status == "skipped" else remote_executions(res),
+        }
+
+    def v2_runner_on_ok(self, result: Any) -> None:
+        self._record(result, "ok")
+
+    def v2_runner_on_failed(self, result: Any, ignore_errors: bool = False) -> None:
+        self._record(result, "failed")
+
+    def v2_runner_on_skipped(self, result: Any) -> None:
+        self._record(result, "skipped")
+
+    def v2_runner_on_unreachable(self, result: Any) -> None:
+        self._record(result, "unreachable")
+
+    def report(self) -> Dict[str, Any]:
+        """Return the profile of the run so far."""
+        tasks: List[Dict[str, Any]] = []
+        totals: Dict[str, int] = {"tasks": 0, "remote_executions": 0}
+        for entry in self.tasks.values():
+            task = {k: v for k, v in entry.items() if k != "start"}
+            task["duration"] = round(entry["duration"], 4)
+            tasks.append(task)
+            totals["tasks"] += 1
+            for host in entry["hosts"].values():
+                totals["remote_executions"] += host["remote_executions"]
+                totals[host["status"]] = totals.get(host["status"], 0) + 1
+        return {
+            "total_seconds": round(time.time() - self.started, 4),
+            "totals": totals,
+            "tasks": tasks,
+        }
+
+    def v2_playbook_on_stats(self, stats: Any) -> None:
+        report = self.report()
+        with open(self.get_option("report_path"), "w") as f:
+            json.dump(report, f, indent=2)
+
+        self._display.banner("ACER BATTERY PROFILE")
+        self._display.display(
+            "%.2fs total, %d tasks, %d remote executions (report: %s)"
+            % (
+                report["total_seconds"],
+                report["totals"]["tasks"],
+                report["totals"]["remote_executions"],
+                self.get_option("report_path"),
+            )
+        )
+        slowest = sorted(report["tasks"], key=lambda t: t["duration"], reverse=True)
+        for task in slowest[: self.get_option("top")]:
+            self._display.display("%8.2fs  %s" % (task["duration"], task["name"]))
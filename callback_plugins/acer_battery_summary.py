@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Aggregate acer_battery_mode results across a fleet."""
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = r"""
+---
+name: acer_battery_summary
+type: aggregate
+short_description: Fleet summary of acer_battery_mode results
+description:
+  - Collects the per-host result of every C(acer_battery_mode) task and prints
+    one summary at the end of the run - hosts per health/calibration state,
+    hosts changed, unchanged, failed and unreachable.
+  - Works with the C(free) strategy and C(async) tasks since it only looks at
+    final task results.
+requirements:
+  - enable in ansible.cfg (C(callbacks_enabled = acer_battery_summary)) or
+    with C(ANSIBLE_CALLBACKS_ENABLED=acer_battery_summary)
+options:
+  summary_path:
+    description: Also write the summary (including per-host state) as JSON to this file.
+    default: ""
+    env:
+      - name: ACER_BATTERY_SUMMARY_PATH
+    ini:
+      - section: callback_acer_battery_summary
+        key: summary_path
+"""
+
+MODULE_NAMES = ("acer_battery_mode", "yaconsult.acer_battery.acer_battery_mode")
+
+
+def _state(value: Optional[bool]) -> str:
+    return "unknown" if value is None else ("on" if value else "off")
+
+
+class CallbackModule(CallbackBase):
+    """Record acer_battery_mode results per host and summarize them."""
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "acer_battery_summary"
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.hosts: Dict[str, Dict[str, Any]] = {}
+
+    def _is_mode_task(self, result: Any) -> bool:
+        return result._task.action in MODULE_NAMES
+
+    def v2_runner_on_ok(self, result: Any) -> None:
+        if not self._is_mode_task(result):
+            return
+        state = result._result.get("acer_battery_mode") or {}
+        self.hosts[result._host.get_name()] = {
+            "status": "changed" if result._result.get("changed") else "unchanged",
+            "health_mode": state.get("health_mode"),
+            "calibration_mode": state.get("calibration_mode"),
+            "changed_attributes": state.get("changed_attributes", []),
+        }
+
+    def v2_runner_on_failed(self, result: Any, ignore_errors: bool = False) -> None:
+        if not self._is_mode_task(result):
+            return
+        self.hosts[result._host.get_name()] = {
+            "status": "failed",
+            "msg": result._result.get("msg", ""),
+        }
+
+    def v2_runner_on_unreachable(self, result: Any) -> None:
+        if not self._is_mode_task(result):
+            return
+        self.hosts[result._host.get_name()] = {"status": "unreachable"}
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the aggregated fleet state."""
+        statuses = Counter(h["status"] for h in self.hosts.values())
+        reported = [h for h in self.hosts.values() if "health_mode" in h]
+        return {
+            "hosts": len(self.hosts),
+            "status": dict(sorted(statuses.items())),
+            "health_mode": dict(
+                sorted(Counter(_state(h["health_mode"]) for h in reported).items())
+            ),
+            "calibration_mode": dict(
+                sorted(Counter(_state(h["calibration_mode"]) for h in reported).items())
+            ),
+            "failed": sorted(
+                name
+                for name, h in self.hosts.items()
+                if h["status"] in ("failed", "unreachable")
+            ),
+            "per_host": dict(sorted(self.hosts.items())),
+        }
+
+    def v2_playbook_on_stats(self, stats: Any) -> None:
+        if not self.hosts:
+            return
+        summary = self.summary()
+        self._display.banner("ACER BATTERY SUMMARY")
+        self._display.display(
+            "hosts: %d  %s"
+            % (
+                summary["hosts"],
+                "  ".join("%s: %d" % item for item in summary["status"].items()),
+            )
+        )
+        for attr in ("health_mode", "calibration_mode"):
+            self._display.display(
+                "%s: %s"
+                % (
+                    attr,
+                    ", ".join("%s=%d" % item for item in summary[attr].items()),
+                )
+            )
+        if summary["failed"]:
+            self._display.display("failed: " + ", ".join(summary["failed"]))
+
+        path = self.get_option("summary_path")
+        if path:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2, sort_keys=True)
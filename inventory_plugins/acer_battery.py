@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Group hosts by acer_battery state read from the fact cache."""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ansible.errors import AnsibleParserError
+from ansible.plugins.inventory import BaseInventoryPlugin
+
+DOCUMENTATION = r"""
+---
+name: acer_battery
+short_description: Group hosts by acer_battery module, kernel and Secure Boot state
+description:
+  - Reads the C(jsonfile) fact cache directly, so it works offline and never
+    connects to a host. The cached C(acer_battery) fact (from the
+    C(acer_battery_facts) module) and C(acer_battery_applied) (what the role
+    last applied, recorded at the end of every run) are turned into groups.
+  - C(<prefix>needs_build) - the role never completed, applied another
+    I(version), ran on another kernel than the one now cached, could not load
+    the module, or the drift agent reported drift after the last run.
+  - C(<prefix>unsigned) - the last applied module was not signed.
+  - C(<prefix>sb_enabled) - Secure Boot is enabled.
+  - C(<prefix>by_kernel_<kernel>) - one group per running kernel.
+  - C(<prefix>stale) - the cached facts are older than I(ttl); such hosts get
+    no other group. C(<prefix>unknown) - hosts of earlier inventory sources
+    with no cached facts.
+  - Why a host needs a build is set as the C(acer_battery_inventory_reasons)
+    host variable.
+requirements:
+  - C(fact_caching = jsonfile) for the playbook runs that use the role
+  - enable in ansible.cfg (C(enable_plugins = ..., acer_battery) in C([inventory]))
+options:
+  plugin:
+    description: Token that makes this file a source for this plugin.
+    required: true
+    choices: [acer_battery]
+  fact_cache:
+    description: Directory of the C(jsonfile) fact cache.
+    required: true
+    env:
+      - name: ANSIBLE_CACHE_PLUGIN_CONNECTION
+    ini:
+      - section: defaults
+        key: fact_caching_connection
+  fact_cache_prefix:
+    description: Prefix of the cache files.
+    default: ""
+    env:
+      - name: ANSIBLE_CACHE_PLUGIN_PREFIX
+    ini:
+      - section: defaults
+        key: fact_caching_prefix
+  ttl:
+    description: Seconds after which cached facts are stale; C(0) never expires them.
+    type: int
+    default: 86400
+    env:
+      - name: ANSIBLE_CACHE_PLUGIN_TIMEOUT
+    ini:
+      - section: defaults
+        key: fact_caching_timeout
+  version:
+    description: C(acer_battery_version) the hosts should run.
+    default: main
+  add_hosts:
+    description:
+      - Also add hosts that are only in the fact cache, not in an earlier
+        inventory source.
+    type: bool
+    default: true
+  group_prefix:
+    description: Prefix of every group name.
+    default: acer_battery_
+"""
+
+EXAMPLES = r"""
+# fleet.acer_battery.yml, used after the static inventory:
+#   ansible-playbook -i hosts -i fleet.acer_battery.yml fleet.yml \
+#     -e acer_battery_fleet_hosts=acer_battery_needs_build
+plugin: acer_battery
+fact_cache: ~/.cache/ansible/facts
+ttl: 172800
+version: main
+"""
+
+# Wrapping of the fact cache entries by ansible-core 2.19+.
+PAYLOAD = "__payload__"
+SCHEMA_PREFIX = re.compile(r"^s[0-9]+_")
+
+
+def group_suffix(value: str) -> str:
+    """Make value usable in a group name (6.9.0-1.fc40 -> 6_9_0_1_fc40)."""
+    return re.sub(r"[^A-Za-z0-9_]", "_", value)
+
+
+def read_cache(
+    cache_dir: str, prefix: str, ttl: int, now: Optional[float] = None
+) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Cached facts per host; None for hosts whose facts are older than ttl.
+
+    Reads both the plain layout and the one of ansible-core 2.19+, which
+    prefixes the file name with a schema id (s1_<host>) and wraps the facts
+    in a __payload__ JSON string.
+    """
+    now = time.time() if now is None else now
+    hosts: Dict[str, Optional[Dict[str, Any]]] = {}
+    mtimes: Dict[str, float] = {}
+    try:
+        entries = list(os.scandir(cache_dir))
+    except OSError as exc:
+        raise AnsibleParserError("Cannot read fact cache %s: %s" % (cache_dir, exc))
+    for entry in entries:
+        if entry.name.startswith(".") or not entry.name.startswith(prefix):
+            continue
+        host = entry.name[len(prefix) :]
+        try:
+            mtime = entry.stat().st_mtime
+            with open(entry.path, "r") as f:
+                facts = json.load(f)
+            if isinstance(facts, dict) and PAYLOAD in facts:
+                facts = json.loads(facts[PAYLOAD])
+                host = SCHEMA_PREFIX.sub("", host)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(facts, dict) or mtime < mtimes.get(host, 0):
+            continue
+        mtimes[host] = mtime
+        hosts[host] = None if ttl and now - mtime > ttl else facts
+    return hosts
+
+
+def classify(facts: Dict[str, Any], version: str) -> Tuple[List[str], List[str]]:
+    """Group suffixes for one host's facts, and why it needs a build."""
+    state = facts.get("acer_battery") or {}
+    applied = facts.get("acer_battery_applied") or {}
+    kernel = facts.get("ansible_kernel") or state.get("kernel")
+    groups: List[str] = []
+    reasons: List[str] = []
+    if kernel:
+        groups.append("by_kernel_" + group_suffix(kernel))
+    if (state.get("secure_boot") or {}).get("enabled"):
+        groups.append("sb_enabled")
+
+    if not applied:
+        reasons.append("role not applied")
+    else:
+        if applied.get("version") != version:
+            reasons.append("version %s applied" % applied.get("version"))
+        if kernel and applied.get("kernel") != kernel:
+            reasons.append("applied on kernel %s" % applied.get("kernel"))
+        if not applied.get("loaded"):
+            reasons.append("module not loaded")
+        if not applied.get("signed"):
+            groups.append("unsigned")
+    drift = state.get("drift") or {}
+    if drift.get("drifted") and drift.get("checked_at", 0) > applied.get("time", 0):
+        reasons.append("drift: %s" % ", ".join(drift.get("reasons", [])))
+    if reasons:
+        groups.append("needs_build")
+    return groups, reasons
+
+
+class InventoryModule(BaseInventoryPlugin):
+    """Add acer_battery state groups from the fact cache."""
+
+    NAME = "acer_battery"
+
+    def verify_file(self, path: str) -> bool:
+        return super().verify_file(path) and path.endswith(
+            ("acer_battery.yml", "acer_battery.yaml")
+        )
+
+    def parse(self, inventory: Any, loader: Any, path: str, cache: bool = True) -> None:
+        super().parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+        prefix = self.get_option("group_prefix")
+        cached = read_cache(
+            os.path.expanduser(self.get_option("fact_cache")),
+            self.get_option("fact_cache_prefix") or "",
+            self.get_option("ttl"),
+        )
+        hosts = set(self.inventory.hosts)
+        if self.get_option("add_hosts"):
+            hosts.update(cached)
+
+        for host in sorted(hosts):
+            self.inventory.add_host(host)
+            facts = cached.get(host)
+            reasons: List[str] = []
+            if host not in cached:
+                groups = ["unknown"]
+            elif facts is None:
+                groups = ["stale"]
+            else:
+                groups, reasons = classify(facts, self.get_option("version"))
+            for group in groups:
+                self.inventory.add_group(prefix + group)
+                self.inventory.add_child(prefix + group, host)
+            self.inventory.set_variable(host, "acer_battery_inventory_reasons", reasons)
@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+"""Check the host for drift from the state the acer_battery role last applied.
+
+Run by acer-battery-drift.timer between playbook runs. Compares:
+
+- the SHA-256 of every file in the converged-state manifest,
+- the module of the running kernel: installed, and its driver loaded,
+- its signature, when the manifest records a signing certificate (and the
+  certificate itself, so a replaced MOK shows up),
+- health_mode, against the charge policy the role last applied.
+
+The common path reads a few small files and spawns nothing: the signature is
+only verified (with acer-battery-sigcheck) when the module file or the
+certificate changed since the previous check, otherwise the previous verdict
+is reused from the status file.
+
+The result is written atomically to a compact JSON status file, which the
+acer_battery_facts module returns as acer_battery.drift and drift.yml reads
+to converge only the drifted hosts. Exit status is 1 when the host drifted.
+
+Usage:
+    acer-battery-drift [--manifest PATH] [--policy PATH] [--status-file PATH]
+                       [--cert PEM] [--sigcheck PATH] [--kernel KVER]
+                       [--root DIR] [--json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MANIFEST = "/usr/src/acer-wmi-battery-main/ANSIBLE-MANAGED.json"
+DEFAULT_POLICY = "/var/lib/acer-wmi-battery/policy.json"
+DEFAULT_STATUS = "/var/lib/acer-wmi-battery/drift.json"
+SIGCHECK = "/usr/local/bin/acer-battery-sigcheck"
+MODULE_GLOBS = ("extra/acer_wmi_battery.ko*", "extra/acer-wmi-battery.ko*")
+WMI_DIR = "/sys/bus/wmi/drivers/acer-wmi-battery"
+
+FORMAT = 1
+# Signature statuses (see acer-battery-sigcheck) that count as drift.
+BAD_SIGNATURES = ("unsigned", "wrong-key", "error")
+
+
+def file_digest(path: str) -> Optional[str]:
+    """SHA-256 of a file, or None if it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def load_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def installed_module(root: str, kernel: str) -> Optional[str]:
+    for pattern in MODULE_GLOBS:
+        matches = sorted(
+            glob.glob(os.path.join(root + "/lib/modules", kernel, pattern))
+        )
+        if matches:
+            return matches[0]
+    return None
+
+
+def read_health_mode(root: str) -> Optional[bool]:
+    """health_mode of the loaded driver; None when the driver is not loaded."""
+    try:
+        with open(root + WMI_DIR + "/health_mode", "r") as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return {"0": False, "1": True}.get(value)
+
+
+def module_stamp(path: str) -> List[int]:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def verify_signature(
+    sigcheck: str, root: str, kernel: str, module: str, cert: str
+) -> str:
+    """Signature status of module from acer-battery-sigcheck."""
+    cmd = [sys.executable, sigcheck, "--json", "--kernel", kernel, "--module", module]
+    cmd += ["--cert", cert, "--root", root]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        return str(json.loads(proc.stdout)["kernels"][kernel]["status"])
+    except (OSError, ValueError, KeyError, subprocess.SubprocessError):
+        return "error"
+
+
+def signature(
+    previous: Optional[Dict[str, Any]],
+    sigcheck: str,
+    root: str,
+    kernel: str,
+    module: str,
+    cert: str,
+) -> Dict[str, Any]:
+    """Signature verdict, reused from previous while module and cert are unchanged."""
+    current: Dict[str, Any] = {
+        "module": module,
+        "stamp": module_stamp(module),
+        "cert": file_digest(cert) if cert else "",
+    }
+    if previous and all(previous.get(k) == v for k, v in current.items()):
+        current["status"] = previous.get("status")
+        return current
+    current["status"] = verify_signature(sigcheck, root, kernel, module, cert)
+    return current
+
+
+def check(
+    manifest_path: str,
+    policy_path: str,
+    previous: Optional[Dict[str, Any]],
+    root: str = "",
+    cert: str = "",
+    sigcheck: str = "",
+    kernel: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Compare the host with the manifest and policy; returns the status."""
+    kernel = kernel or os.uname().release
+    reasons: List[str] = []
+    status: Dict[str, Any] = {
+        "format": FORMAT,
+        "checked_at": int(time.time()),
+        "kernel": kernel,
+        "module": None,
+        "health_mode": read_health_mode(root),
+        "signature": None,
+    }
+
+    manifest = load_json(manifest_path)
+    if manifest is None:
+        reasons.append("no manifest")
+        manifest = {}
+    for path, digest in sorted(manifest.get("files", {}).items()):
+        if file_digest(path) != digest:
+            reasons.append("file %s" % path)
+
+    module = installed_module(root, kernel)
+    status["module"] = module
+    if module is None:
+        reasons.append("no module for kernel %s" % kernel)
+    elif status["health_mode"] is None:
+        reasons.append("driver not loaded")
+
+    signer = manifest.get("inputs", {}).get("signer")
+    if signer:
+        if not cert or file_digest(cert) != signer:
+            reasons.append("signing certificate")
+        if module is not None:
+            previous_signature = (previous or {}).get("signature")
+            status["signature"] = signature(
+                previous_signature,
+                sigcheck or root + SIGCHECK,
+                root,
+                kernel,
+                module,
+                cert,
+            )
+            if status["signature"]["status"] in BAD_SIGNATURES:
+                reasons.append("signature %s" % status["signature"]["status"])
+
+    policy = load_json(policy_path) or {}
+    wanted = policy.get("health_mode")
+    if wanted is not None and status["health_mode"] is not None:
+        if status["health_mode"] != wanted:
+            reasons.append("health_mode")
+
+    status["drifted"] = bool(reasons)
+    status["reasons"] = reasons
+    return status
+
+
+def write_status(path: str, status: Dict[str, Any]) -> None:
+    """Write the status file atomically."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".drift.", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(status, f, sort_keys=True, separators=(",", ":"))
+            f.write("\n")
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="acer-battery-drift", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument(
+        "--manifest", default=DEFAULT_MANIFEST, help="converged-state manifest"
+    )
+    parser.add_argument(
+        "--policy", default=DEFAULT_POLICY, help="last applied charge policy"
+    )
+    parser.add_argument(
+        "--status-file", default=DEFAULT_STATUS, help="where to write the result"
+    )
+    parser.add_argument(
+        "--cert",
+        default="",
+        help="certificate the module should be signed with (PEM or DER)",
+    )
+    parser.add_argument(
+        "--sigcheck", default="", help="acer-battery-sigcheck to verify with"
+    )
+    parser.add_argument(
+        "--kernel", help="kernel release to check (default: the running one)"
+    )
+    parser.add_argument("--root", default="", help="filesystem root (for testing)")
+    parser.add_argument(
+        "--json", action="store_true", help="also print the status as JSON"
+    )
+    args = parser.parse_args(argv)
+
+    previous = load_json(args.status_file)
+    status = check(
+        args.manifest,
+        args.policy,
+        previous,
+        args.root.rstrip("/"),
+        args.cert,
+        args.sigcheck,
+        args.kernel,
+    )
+    try:
+        write_status(args.status_file, status)
+    except OSError as exc:
+        print("Could not write %s: %s" % (args.status_file, exc), file=sys.stderr)
+    if args.json:
+        json.dump(status, sys.stdout, indent=2, sort_keys=True)
+        print()
+    elif status["drifted"]:
+        print("Drifted: %s" % ", ".join(status["reasons"]))
+    else:
+        print("In sync with the applied state")
+    return 1 if status["drifted"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+"""Apply the acer-wmi-battery charge policy rules to health_mode.
+
+Run by acer-battery-policy.service, which is started only by events: the
+driver service coming up, udev AC adapter (power_supply Mains/USB) change
+events, acer-battery-policy.timer at the rule windows' start and end times,
+and acer-battery-policy.path when a flag file is created or removed. Nothing
+stays resident and nothing polls, so an idle host is never woken up.
+
+The rules file is written by the role:
+
+    {"default": true,
+     "rules": [{"name": "morning", "health_mode": false,
+                "days": ["mon", "tue", "wed", "thu", "fri"],
+                "from": "07:00", "until": "08:00"},
+               {"name": "travel", "health_mode": false,
+                "ac": true, "flag": "/var/lib/acer-wmi-battery/travel"}]}
+
+The first rule whose conditions all hold sets health_mode; when none does,
+"default" does (null leaves health_mode alone). Conditions are "days", a
+"from"/"until" window (which may cross midnight), "ac" (on AC power or not)
+and "flag" (the file exists). health_mode is only written when it differs,
+and the applied value is recorded in the policy file the drift agent
+compares with.
+
+Usage:
+    acer-battery-policy [--rules PATH] [--policy PATH] [--now ISO-TIME]
+                        [--root DIR] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_RULES = "/etc/acer-wmi-battery/charge-policy.json"
+DEFAULT_POLICY = "/var/lib/acer-wmi-battery/policy.json"
+WMI_DIRS = (
+    "/sys/bus/wmi/drivers/acer-wmi-battery",
+    "/sys/devices/platform/acer-wmi-battery",
+)
+POWER_SUPPLY_GLOB = "/sys/class/power_supply/*"
+# power_supply types that mean external power (USB for USB-C chargers).
+AC_TYPES = ("Mains", "USB")
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def read_attr(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def on_ac(root: str = "") -> Optional[bool]:
+    """Whether an AC adapter is online; None if the host reports none."""
+    online = None
+    for supply in sorted(glob.glob(root + POWER_SUPPLY_GLOB)):
+        if read_attr(os.path.join(supply, "type")) not in AC_TYPES:
+            continue
+        value = read_attr(os.path.join(supply, "online"))
+        if value is not None:
+            online = bool(online) or value == "1"
+    return online
+
+
+def parse_time(value: str) -> datetime.time:
+    hours, minutes = value.split(":")
+    return datetime.time(int(hours), int(minutes))
+
+
+def in_window(rule: Dict[str, Any], now: datetime.datetime) -> bool:
+    """Whether now is on one of the rule's days and inside its from/until window.
+
+    A window that crosses midnight belongs to the day it starts on.
+    """
+    day = now.weekday()
+    if "from" in rule or "until" in rule:
+        start = parse_time(rule.get("from", "00:00"))
+        end = parse_time(rule.get("until", "00:00"))
+        current = now.time()
+        if start < end:
+            if not start <= current < end:
+                return False
+        elif end <= current < start:
+            return False
+        elif current < end:
+            day = (day - 1) % 7
+    days = rule.get("days")
+    return not days or DAYS[day] in [d[:3].lower() for d in days]
+
+
+def matches(
+    rule: Dict[str, Any], now: datetime.datetime, ac: Optional[bool], root: str = ""
+) -> bool:
+    """Whether all conditions of the rule hold."""
+    if not in_window(rule, now):
+        return False
+    if "ac" in rule and ac != bool(rule["ac"]):
+        return False
+    if "flag" in rule and not os.path.exists(root + rule["flag"]):
+        return False
+    return True
+
+
+def evaluate(
+    config: Dict[str, Any],
+    now: datetime.datetime,
+    ac: Optional[bool],
+    root: str = "",
+) -> Tuple[Optional[bool], str]:
+    """health_mode the rules ask for now, and the name of the deciding rule."""
+    for index, rule in enumerate(config.get("rules", [])):
+        if matches(rule, now, ac, root):
+            return bool(rule["health_mode"]), rule.get("name", "rule %d" % index)
+    return config.get("default"), "default"
+
+
+def find_wmi_dir(root: str = "") -> Optional[str]:
+    for path in WMI_DIRS:
+        if os.path.isfile(root + path + "/health_mode"):
+            return root + path
+    return None
+
+
+def record_policy(path: str, health_mode: bool) -> None:
+    """Record the applied health_mode atomically, unless already recorded."""
+    policy = {"health_mode": health_mode}
+    try:
+        with open(path, "r") as f:
+            if json.load(f) == policy:
+                return
+    except (OSError, ValueError):
+        pass
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".policy.", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(policy, f)
+            f.write("\n")
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def apply(
+    config: Dict[str, Any],
+    policy_path: str,
+    now: datetime.datetime,
+    root: str = "",
+    dry_run: bool = False,
+) -> Tuple[int, str]:
+    """Bring health_mode in line with the rules; returns (exit status, message)."""
+    wanted, reason = evaluate(config, now, on_ac(root), root)
+    if wanted is None:
+        return 0, "No rule applies (%s); health_mode left alone" % reason
+    wmi_dir = find_wmi_dir(root)
+    if wmi_dir is None:
+        return 0, "Driver not loaded; will apply when it is"
+    attr = os.path.join(wmi_dir, "health_mode")
+    current = read_attr(attr)
+    value = "1" if wanted else "0"
+    if current == value:
+        message = "health_mode is %s (%s)" % (value, reason)
+    elif dry_run:
+        return 0, "Would set health_mode to %s (%s)" % (value, reason)
+    else:
+        try:
+            with open(attr, "w") as f:
+                f.write(value)
+        except OSError as exc:
+            return 1, "Could not write %s: %s" % (attr, exc)
+        if read_attr(attr) != value:
+            return 1, "%s did not take the new value %s" % (attr, value)
+        message = "Set health_mode to %s (%s)" % (value, reason)
+    if policy_path and not dry_run:
+        try:
+            record_policy(policy_path, wanted)
+        except OSError as exc:
+            print("Could not write %s: %s" % (policy_path, exc), file=sys.stderr)
+    return 0, message
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="acer-battery-policy", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("--rules", default=DEFAULT_RULES, help="charge policy rules")
+    parser.add_argument(
+        "--policy",
+        default=DEFAULT_POLICY,
+        help="where the applied health_mode is recorded for the drift agent",
+    )
+    parser.add_argument(
+        "--now", help="evaluate at this local time (YYYY-MM-DDTHH:MM, for testing)"
+    )
+    parser.add_argument("--root", default="", help="filesystem root (for testing)")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="report what would be written"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.rules, "r") as f:
+            config = json.load(f)
+    except (OSError, ValueError) as exc:
+        print("Cannot read %s: %s" % (args.rules, exc), file=sys.stderr)
+        return 2
+    now = (
+        datetime.datetime.fromisoformat(args.now)
+        if args.now
+        else datetime.datetime.now()
+    )
+    status, message = apply(
+        config, args.policy, now, args.root.rstrip("/"), args.dry_run
+    )
+    print(message, file=sys.stderr if status else sys.stdout)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
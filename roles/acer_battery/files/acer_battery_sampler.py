@@ -0,0 +1,334 @@
+#!/usr/bin/python3
+"""Low-overhead battery telemetry sampler with a bounded on-disk ring buffer.
+
+The sampler opens the power_supply and acer-wmi-battery sysfs attributes once
+and re-reads them with pread(2), so a sample costs a handful of syscalls and no
+process spawns. Samples are fixed-width records in a memory-mapped ring buffer
+file whose size never changes, so disk and memory use stay flat.
+
+Usage:
+    acer-battery-sampler run   [--file PATH] [--interval SECONDS] [--capacity RECORDS]
+    acer-battery-sampler read  [--file PATH] [--since TS] [--until TS] [--format FMT]
+    acer-battery-sampler bench [--iterations N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import glob
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+DEFAULT_FILE = "/var/lib/acer-wmi-battery/samples.ring"
+WMI_DIR = "/sys/bus/wmi/drivers/acer-wmi-battery"
+POWER_SUPPLY_GLOB = "/sys/class/power_supply/BAT*"
+
+MAGIC = b"ACBR"
+FORMAT_VERSION = 2
+# magic, format version, record size, capacity (records), records written
+HEADER = struct.Struct("<4sHHIQ")
+HEADER_SIZE = 64
+# timestamp followed by one int32 per field (MISSING when unavailable)
+RECORD = struct.Struct("<d12i")
+MISSING = -(2**31)
+
+STATUS_CODES = {
+    "Unknown": 0,
+    "Charging": 1,
+    "Discharging": 2,
+    "Not charging": 3,
+    "Full": 4,
+}
+
+# Batteries report either energy (µWh, µW) or charge (µAh, µA); both are kept
+# as they are, in separate fields, and the other pair stays MISSING.
+FIELDS = (
+    "capacity",
+    "status",
+    "energy_now",
+    "energy_full",
+    "charge_now",
+    "charge_full",
+    "voltage_now",
+    "power_now",
+    "current_now",
+    "cycle_count",
+    "temperature",
+    "health_mode",
+)
+
+
+class Sample(NamedTuple):
+    """One telemetry record; integer fields use MISSING when not available."""
+
+    timestamp: float
+    capacity: int
+    status: int
+    energy_now: int
+    energy_full: int
+    charge_now: int
+    charge_full: int
+    voltage_now: int
+    power_now: int
+    current_now: int
+    cycle_count: int
+    temperature: int
+    health_mode: int
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        """Return the sample with MISSING fields mapped to None."""
+        return {
+            key: (None if value == MISSING else value)
+            for key, value in self._asdict().items()
+        }
+
+
+class RingBuffer:
+    """Fixed-size, memory-mapped ring buffer of Sample records."""
+
+    def __init__(self, path: str, capacity: Optional[int] = None) -> None:
+        self.path = path
+        writable = capacity is not None
+        if writable:
+            self._prepare(path, capacity or 1)
+        self._fd = os.open(path, os.O_RDWR if writable else os.O_RDONLY)
+        size = os.fstat(self._fd).st_size
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self._map = mmap.mmap(self._fd, size, access=access)
+        magic, version, record_size, self.capacity, _ = HEADER.unpack_from(self._map, 0)
+        if (magic, version, record_size) != (MAGIC, FORMAT_VERSION, RECORD.size):
+            raise ValueError("%s is not a sample ring buffer" % path)
+
+    @staticmethod
+    def _prepare(path: str, capacity: int) -> None:
+        """Create the fixed-size file, or recreate it when the layout changed."""
+        size = HEADER_SIZE + capacity * RECORD.size
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER.size)
+            if len(header) == HEADER.size:
+                magic, version, record_size, existing, _ = HEADER.unpack(header)
+                if (
+                    magic == MAGIC
+                    and version == FORMAT_VERSION
+                    and record_size == RECORD.size
+                    and existing == capacity
+                    and os.path.getsize(path) == size
+                ):
+                    return
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.truncate(size)
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, capacity, 0))
+        os.replace(tmp, path)
+
+    @property
+    def written(self) -> int:
+        """Total number of records ever appended."""
+        return int(HEADER.unpack_from(self._map, 0)[4])
+
+    def append(self, sample: Sample) -> None:
+        """Write a record, then publish it by bumping the counter."""
+        written = self.written
+        offset = HEADER_SIZE + (written % self.capacity) * RECORD.size
+        RECORD.pack_into(self._map, offset, *sample)
+        struct.pack_into("<Q", self._map, HEADER.size - 8, written + 1)
+
+    def _at(self, index: int) -> Sample:
+        offset = HEADER_SIZE + (index % self.capacity) * RECORD.size
+        return Sample(*RECORD.unpack_from(self._map, offset))
+
+    def records(
+        self, since: Optional[float] = None, until: Optional[float] = None
+    ) -> List[Sample]:
+        """Return retained samples with since <= timestamp <= until, oldest first."""
+        written = self.written
+        first = max(0, written - self.capacity)
+        window = _Window(self, first, written)
+        lo = bisect.bisect_left(window, since) if since is not None else 0
+        hi = bisect.bisect_right(window, until) if until is not None else len(window)
+        samples = [self._at(first + i) for i in range(lo, hi)]
+        # Drop anything the writer overwrote while we were reading.
+        oldest_valid = max(0, self.written - self.capacity)
+        skip = max(0, oldest_valid - (first + lo))
+        return samples[skip:]
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class _Window:
+    """Timestamps of the retained records, indexable for bisect."""
+
+    def __init__(self, ring: RingBuffer, first: int, end: int) -> None:
+        self._ring = ring
+        self._first = first
+        self._end = end
+
+    def __len__(self) -> int:
+        return self._end - self._first
+
+    def __getitem__(self, index: int) -> float:
+        return self._ring._at(self._first + index).timestamp
+
+
+class Sampler:
+    """Reads the battery attributes through file descriptors kept open.
+
+    A descriptor whose read fails (the driver was unloaded, e.g. by a module
+    swap or rebuild) is closed and its path opened again, and attributes that
+    were missing are looked up again, so the sampler follows module reloads
+    without a restart.
+    """
+
+    def __init__(
+        self, battery_dir: Optional[str] = None, wmi_dir: str = WMI_DIR
+    ) -> None:
+        if battery_dir is None:
+            batteries = sorted(glob.glob(POWER_SUPPLY_GLOB))
+            battery_dir = batteries[0] if batteries else ""
+        self._fds: Dict[str, int] = {}
+        # Paths to try for each field, in order of preference.
+        self._paths: Dict[str, List[str]] = {
+            field: [os.path.join(battery_dir, field)] if battery_dir else []
+            for field in FIELDS
+            if field not in ("temperature", "health_mode")
+        }
+        for field in ("temperature", "health_mode"):
+            self._paths[field] = [os.path.join(wmi_dir, field)]
+        for field in self._paths:
+            self._open(field)
+
+    def _open(self, field: str) -> bool:
+        for path in self._paths[field]:
+            try:
+                self._fds[field] = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            return True
+        return False
+
+    def _reopen(self, field: str) -> Optional[int]:
+        fd = self._fds.pop(field, None)
+        if fd is not None:
+            os.close(fd)
+        if field not in self._paths or not self._open(field):
+            return None
+        return self._fds[field]
+
+    def _pread(self, field: str) -> Optional[bytes]:
+        fd = self._fds.get(field)
+        if fd is not None:
+            try:
+                return os.pread(fd, 64, 0)
+            except OSError:
+                pass
+        fd = self._reopen(field)
+        if fd is None:
+            return None
+        try:
+            return os.pread(fd, 64, 0)
+        except OSError:
+            return None
+
+    def _read(self, field: str) -> int:
+        raw = self._pread(field)
+        if raw is None:
+            return MISSING
+        raw = raw.strip()
+        if field == "status":
+            return STATUS_CODES.get(raw.decode("ascii", "replace"), 0)
+        try:
+            return int(raw)
+        except ValueError:
+            return MISSING
+
+    def sample(self) -> Sample:
+        return Sample(time.time(), *(self._read(field) for field in FIELDS))
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+
+def run(path: str, interval: float, capacity: int) -> None:
+    sampler = Sampler()
+    ring = RingBuffer(path, capacity)
+    next_at = time.monotonic()
+    while True:
+        ring.append(sampler.sample())
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.monotonic()))
+
+
+def read(path: str, since: Optional[float], until: Optional[float], fmt: str) -> None:
+    ring = RingBuffer(path)
+    try:
+        samples = ring.records(since, until)
+    finally:
+        ring.close()
+    if fmt == "json":
+        json.dump([s.as_dict() for s in samples], sys.stdout)
+        sys.stdout.write("\n")
+        return
+    print(",".join(Sample._fields))
+    for s in samples:
+        print(",".join("" if v is None else str(v) for v in s.as_dict().values()))
+
+
+def bench(iterations: int) -> None:
+    sampler = Sampler()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        sampler.sample()
+    elapsed = time.perf_counter() - start
+    sampler.close()
+    per_sample_us = elapsed / iterations * 1e6
+    print("%.1f us per sample (%d samples)" % (per_sample_us, iterations))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="acer-battery-sampler", description=__doc__.splitlines()[0]
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="sample forever into the ring buffer")
+    run_p.add_argument("--file", default=DEFAULT_FILE)
+    run_p.add_argument("--interval", type=float, default=60.0)
+    run_p.add_argument("--capacity", type=int, default=43200)
+
+    read_p = sub.add_parser(
+        "read", help="print samples, optionally limited to a time range"
+    )
+    read_p.add_argument("--file", default=DEFAULT_FILE)
+    read_p.add_argument("--since", type=float, help="unix timestamp (inclusive)")
+    read_p.add_argument("--until", type=float, help="unix timestamp (inclusive)")
+    read_p.add_argument("--format", choices=("csv", "json"), default="csv")
+
+    bench_p = sub.add_parser("bench", help="measure the cost of one sample")
+    bench_p.add_argument("--iterations", type=int, default=1000)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args.file, args.interval, args.capacity)
+    elif args.command == "read":
+        read(args.file, args.since, args.until, args.format)
+    else:
+        bench(args.iterations)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
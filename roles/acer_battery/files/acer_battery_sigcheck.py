@@ -0,0 +1,529 @@
+#!/usr/bin/python3
+"""Verify the signatures of the installed acer_wmi_battery modules.
+
+Scans the module installed for every kernel in one pass. Compressed modules
+(xz, zstd, gzip) are decompressed as a stream and only the tail is kept. The
+appended "~Module signature appended~" trailer is parsed directly: the PKCS#7
+SignerInfo is compared with the MOK certificate the role signs with, and with
+the certificates enrolled in MokListRT, which is read from efivars.
+
+With --module, the given file (e.g. a freshly built module that is not
+installed yet) is checked instead, reported under the single --kernel.
+
+Exit status is 1 when any module is unsigned, signed with another key or
+unreadable, or signed with a certificate that is not enrolled. A module
+signed with the local MOK (--mok), which the role generated and which may
+still be waiting for enrollment, only fails with --require-enrolled.
+
+Usage:
+    acer-battery-sigcheck [--cert PEM] [--kernel KVER ...] [--root DIR] [--json]
+                          [--require-enrolled] [--module PATH] [--mok PEM]
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import glob
+import gzip
+import io
+import json
+import lzma
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import uuid
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+DEFAULT_CERT = "/var/lib/dkms/mok.pub"
+MODULE_GLOBS = ("extra/acer_wmi_battery.ko*", "extra/acer-wmi-battery.ko*")
+
+MAGIC = b"~Module signature appended~\n"
+# struct module_signature: algo, hash, id_type, signer_len, key_id_len, pad[3], sig_len
+SIG_INFO = struct.Struct(">BBBBB3xI")
+PKEY_ID_PKCS7 = 2
+# Enough for any PKCS#7 signature the kernel's sign-file produces.
+TAIL_SIZE = 256 * 1024
+CHUNK = 64 * 1024
+
+MOK_VARIABLES = "/sys/firmware/efi/mok-variables"
+EFIVARS = "/sys/firmware/efi/efivars"
+SHIM_GUID = "605dab50-e046-4300-abb6-3dd810dd8b23"
+EFI_CERT_X509 = uuid.UUID("a5c059a1-94e4-4aa7-87b5-ab155c2bf072").bytes_le
+
+OID_CN = bytes.fromhex("550403")
+OID_SKID = bytes.fromhex("551d0e")
+DIGESTS = {
+    bytes.fromhex("2b0e03021a"): "sha1",
+    bytes.fromhex("608648016503040204"): "sha224",
+    bytes.fromhex("608648016503040201"): "sha256",
+    bytes.fromhex("608648016503040202"): "sha384",
+    bytes.fromhex("608648016503040203"): "sha512",
+}
+
+# Statuses that make the exit status non-zero (not-enrolled: see problems()).
+PROBLEMS = ("unsigned", "wrong-key", "error")
+
+
+class Tlv(NamedTuple):
+    """One DER element: tag, content and the full encoding."""
+
+    tag: int
+    content: bytes
+    raw: bytes
+
+
+def der_elements(data: bytes) -> Iterator[Tlv]:
+    """Iterate over the DER elements in data (definite or indefinite length)."""
+    pos = 0
+    while pos < len(data):
+        start = pos
+        tag = data[pos]
+        if tag == 0 and data[pos + 1 : pos + 2] == b"\x00":
+            return  # end-of-contents of an indefinite-length parent
+        length = data[pos + 1]
+        pos += 2
+        if length == 0x80:
+            # Indefinite length: the content is a run of elements ended by 00 00.
+            end = pos
+            for child in der_elements(data[pos:]):
+                end += len(child.raw)
+            yield Tlv(tag, data[pos:end], data[start : end + 2])
+            pos = end + 2
+            continue
+        if length & 0x80:
+            count = length & 0x7F
+            length = int.from_bytes(data[pos : pos + count], "big")
+            pos += count
+        if pos + length > len(data):
+            raise ValueError("truncated DER element")
+        yield Tlv(tag, data[pos : pos + length], data[start : pos + length])
+        pos += length
+
+
+def der_children(tlv: Tlv) -> List[Tlv]:
+    return list(der_elements(tlv.content))
+
+
+def der_first(data: bytes) -> Tlv:
+    return next(der_elements(data))
+
+
+def name_cn(name: Tlv) -> str:
+    """Common name of an X.501 Name, or its first attribute value."""
+    values = []
+    for rdn in der_children(name):
+        for attr in der_children(rdn):
+            oid, value = der_children(attr)[:2]
+            text = value.content.decode("utf-8", "replace")
+            if oid.content == OID_CN:
+                return text
+            values.append(text)
+    return values[0] if values else ""
+
+
+class Certificate(NamedTuple):
+    """The parts of an X.509 certificate a SignerInfo refers to."""
+
+    subject: str
+    issuer: bytes
+    serial: int
+    skid: Optional[bytes]
+    der: bytes
+
+
+def parse_certificate(der: bytes) -> Certificate:
+    tbs = der_children(der_first(der))[0]
+    fields = der_children(tbs)
+    if fields[0].tag == 0xA0:  # explicit version
+        fields = fields[1:]
+    serial, _, issuer, _, subject = fields[:5]
+    skid = None
+    for field in fields[5:]:
+        if field.tag != 0xA3:
+            continue
+        for ext in der_children(der_children(field)[0]):
+            parts = der_children(ext)
+            if parts[0].content == OID_SKID:
+                skid = der_first(parts[-1].content).content
+    return Certificate(
+        subject=name_cn(subject),
+        issuer=issuer.raw,
+        serial=int.from_bytes(serial.content, "big", signed=True),
+        skid=skid,
+        der=der,
+    )
+
+
+def load_certificate(path: str) -> Certificate:
+    """Load a PEM or DER certificate."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if b"-----BEGIN CERTIFICATE-----" in data:
+        body = data.split(b"-----BEGIN CERTIFICATE-----", 1)[1]
+        body = body.split(b"-----END CERTIFICATE-----", 1)[0]
+        data = base64.b64decode(b"".join(body.split()))
+    return parse_certificate(data)
+
+
+class Signer(NamedTuple):
+    """Who signed a module, as recorded in the PKCS#7 SignerInfo."""
+
+    issuer: Optional[bytes]
+    serial: Optional[int]
+    skid: Optional[bytes]
+    issuer_cn: str
+    digest: str
+
+    def matches(self, cert: Certificate) -> bool:
+        if self.skid is not None:
+            return cert.skid == self.skid
+        return self.issuer == cert.issuer and self.serial == cert.serial
+
+
+def parse_pkcs7_signer(der: bytes) -> Signer:
+    """Extract the first SignerInfo of a PKCS#7/CMS SignedData."""
+    content_info = der_children(der_first(der))
+    signed_data = der_children(der_children(content_info[1])[0])
+    signer_infos = [tlv for tlv in signed_data if tlv.tag == 0x31][-1]
+    signer_info = der_children(der_children(signer_infos)[0])
+    sid, digest_alg = signer_info[1], signer_info[2]
+    digest = DIGESTS.get(der_children(digest_alg)[0].content, "unknown")
+    if sid.tag == 0x80:  # [0] SubjectKeyIdentifier
+        return Signer(None, None, sid.content, "", digest)
+    issuer, serial = der_children(sid)[:2]
+    return Signer(
+        issuer.raw,
+        int.from_bytes(serial.content, "big", signed=True),
+        None,
+        name_cn(issuer),
+        digest,
+    )
+
+
+def _zstd_chunks(path: str) -> Iterator[bytes]:
+    try:
+        from compression import zstd  # type: ignore[import-not-found]  # Python 3.14+
+    except ImportError:
+        zstd = None
+    if zstd is not None:
+        decompressor = zstd.ZstdDecompressor()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK), b""):
+                yield decompressor.decompress(chunk)
+        return
+    binary = shutil.which("zstd")
+    if binary is None:
+        raise RuntimeError("zstd is required to read %s" % path)
+    proc = subprocess.Popen([binary, "-dcq", path], stdout=subprocess.PIPE)
+    assert proc.stdout is not None
+    yield from iter(lambda: proc.stdout.read(CHUNK), b"")  # type: ignore[union-attr]
+    if proc.wait() != 0:
+        raise RuntimeError("zstd failed to decompress %s" % path)
+
+
+def _chunks(path: str) -> Iterator[bytes]:
+    """Decompressed content of a module, in chunks."""
+    if path.endswith(".zst"):
+        yield from _zstd_chunks(path)
+        return
+    f: io.BufferedIOBase
+    if path.endswith(".xz"):
+        f = lzma.open(path, "rb")
+    elif path.endswith(".gz"):
+        f = gzip.open(path, "rb")
+    else:
+        f = open(path, "rb")
+    with f:
+        yield from iter(lambda: f.read(CHUNK), b"")
+
+
+def module_tail(path: str, size: int = TAIL_SIZE) -> bytes:
+    """The last size bytes of the (decompressed) module."""
+    tail = b""
+    for chunk in _chunks(path):
+        tail = (tail + chunk)[-size:]
+    return tail
+
+
+def module_signer(path: str) -> Optional[Signer]:
+    """The signer of a module, or None if it carries no signature."""
+    tail = module_tail(path)
+    if not tail.endswith(MAGIC):
+        return None
+    info_end = len(tail) - len(MAGIC)
+    fields = SIG_INFO.unpack(tail[info_end - SIG_INFO.size : info_end])
+    id_type, sig_len = fields[2], fields[5]
+    if id_type != PKEY_ID_PKCS7:
+        raise ValueError("unsupported signature type %d" % id_type)
+    sig_end = info_end - SIG_INFO.size
+    if sig_len > sig_end:
+        raise ValueError("signature length %d exceeds the module tail" % sig_len)
+    return parse_pkcs7_signer(tail[sig_end - sig_len : sig_end])
+
+
+def efi_signature_list_certs(data: bytes) -> List[Certificate]:
+    """X.509 certificates in an EFI_SIGNATURE_LIST sequence."""
+    certs = []
+    pos = 0
+    while pos + 28 <= len(data):
+        sig_type = data[pos : pos + 16]
+        list_size, header_size, sig_size = struct.unpack_from("<III", data, pos + 16)
+        if list_size < 28 or sig_size < 16:
+            break
+        entry = pos + 28 + header_size
+        while sig_type == EFI_CERT_X509 and entry + sig_size <= pos + list_size:
+            try:
+                certs.append(parse_certificate(data[entry + 16 : entry + sig_size]))
+            except (ValueError, IndexError):
+                pass
+            entry += sig_size
+        pos += list_size
+    return certs
+
+
+def enrolled_certificates(root: str = "") -> Optional[List[Certificate]]:
+    """Certificates in MokListRT, or None when the list cannot be read."""
+    data = None
+    # Newer kernels export the full list here; MokListRT may be split in parts.
+    parts = sorted(glob.glob(root + MOK_VARIABLES + "/MokListRT*"))
+    if parts:
+        data = b""
+        for part in parts:
+            with open(part, "rb") as f:
+                data += f.read()
+    else:
+        path = "%s%s/MokListRT-%s" % (root, EFIVARS, SHIM_GUID)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()[4:]  # skip the variable attributes
+        except OSError:
+            return None
+    return efi_signature_list_certs(data)
+
+
+def installed_modules(
+    root: str = "", kernels: Optional[List[str]] = None
+) -> Dict[str, str]:
+    """Map kernel release to the module installed for it."""
+    modules_dir = root + "/lib/modules"
+    if not kernels:
+        try:
+            kernels = sorted(os.listdir(modules_dir))
+        except OSError:
+            kernels = []
+    found = {}
+    for kernel in kernels:
+        for pattern in MODULE_GLOBS:
+            matches = sorted(glob.glob(os.path.join(modules_dir, kernel, pattern)))
+            if matches:
+                found[kernel] = matches[0]
+                break
+    return found
+
+
+def check_module(
+    path: str,
+    cert: Optional[Certificate],
+    enrolled: Optional[List[Certificate]],
+    mok: Optional[Certificate] = None,
+) -> Dict[str, Any]:
+    """Verify one module; returns its report entry."""
+    entry: Dict[str, Any] = {
+        "module": path,
+        "status": "error",
+        "signer": None,
+        "serial": None,
+        "digest": None,
+        "matches_cert": None,
+        "enrolled": None,
+        "local_mok": None,
+    }
+    try:
+        signer = module_signer(path)
+    except (OSError, ValueError, IndexError, RuntimeError, lzma.LZMAError) as exc:
+        entry["error"] = str(exc)
+        return entry
+    if signer is None:
+        entry["status"] = "unsigned"
+        return entry
+
+    entry["signer"] = signer.issuer_cn or None
+    entry["serial"] = "%x" % signer.serial if signer.serial is not None else None
+    entry["digest"] = signer.digest
+    if signer.skid is not None:
+        entry["key_id"] = signer.skid.hex()
+    if enrolled is not None:
+        entry["enrolled"] = any(signer.matches(c) for c in enrolled)
+    if mok is not None:
+        entry["local_mok"] = signer.matches(mok)
+    if cert is not None:
+        entry["matches_cert"] = signer.matches(cert)
+        if not entry["signer"] and entry["matches_cert"]:
+            entry["signer"] = cert.subject
+
+    if entry["matches_cert"] is False:
+        entry["status"] = "wrong-key"
+    elif entry["enrolled"] is False:
+        entry["status"] = "not-enrolled"
+    else:
+        entry["status"] = "ok"
+    return entry
+
+
+def report(
+    root: str = "",
+    cert_path: Optional[str] = DEFAULT_CERT,
+    kernels: Optional[List[str]] = None,
+    module: Optional[str] = None,
+    mok_path: Optional[str] = DEFAULT_CERT,
+) -> Dict[str, Any]:
+    """Verify the module of every (or the given) kernel in one pass.
+
+    With module, only that file is verified, as the module of the first kernel.
+    mok_path is the local MOK; a host without one (e.g. a consumer that only
+    installs artifacts) has none.
+    """
+    cert = None
+    cert_error = None
+    if cert_path:
+        try:
+            cert = load_certificate(cert_path)
+        except (OSError, ValueError, IndexError) as exc:
+            cert_error = "%s: %s" % (cert_path, exc)
+    mok = None
+    if mok_path:
+        try:
+            mok = load_certificate(mok_path)
+        except (OSError, ValueError, IndexError):
+            pass
+    enrolled = enrolled_certificates(root)
+    if module:
+        kernels = (kernels or [os.uname().release])[:1]
+        modules = {kernels[0]: module} if os.path.exists(module) else {}
+    else:
+        modules = installed_modules(root, kernels)
+    result: Dict[str, Any] = {
+        "cert": (
+            {"path": cert_path, "subject": cert.subject, "serial": "%x" % cert.serial}
+            if cert is not None
+            else None
+        ),
+        "mok_list": None if enrolled is None else len(enrolled),
+        "kernels": {},
+    }
+    if cert_error:
+        result["cert_error"] = cert_error
+    if cert is not None and enrolled is not None:
+        result["cert"]["enrolled"] = any(c.der == cert.der for c in enrolled)
+    for kernel in kernels or sorted(modules):
+        if kernel not in modules:
+            result["kernels"][kernel] = {
+                "module": None,
+                "status": "error",
+                "error": "no module installed",
+            }
+            continue
+        result["kernels"][kernel] = check_module(modules[kernel], cert, enrolled, mok)
+    return result
+
+
+def problems(result: Dict[str, Any], require_enrolled: bool = False) -> List[str]:
+    """Kernels whose module fails verification.
+
+    A signer that is not enrolled is only tolerated for the local MOK, which
+    has to wait for the next boot to be enrolled.
+    """
+    failed = []
+    for kernel, entry in result["kernels"].items():
+        if entry["status"] == "not-enrolled":
+            if require_enrolled or not entry.get("local_mok"):
+                failed.append(kernel)
+        elif entry["status"] in PROBLEMS:
+            failed.append(kernel)
+    if result.get("cert_error"):
+        failed.append("cert")
+    return failed
+
+
+def print_text(result: Dict[str, Any]) -> None:
+    cert = result["cert"]
+    if cert is not None:
+        print(
+            "Certificate: %s (serial %s)%s"
+            % (
+                cert["subject"],
+                cert["serial"],
+                {True: ", enrolled", False: ", NOT enrolled"}.get(
+                    cert.get("enrolled"), ""
+                ),
+            )
+        )
+    elif result.get("cert_error"):
+        print("Certificate: unreadable (%s)" % result["cert_error"])
+    if result["mok_list"] is None:
+        print("MOK list: not available (no EFI or shim)")
+    print("%-32s %-13s %-28s %s" % ("KERNEL", "STATUS", "SIGNER", "MODULE"))
+    for kernel, entry in result["kernels"].items():
+        print(
+            "%-32s %-13s %-28s %s"
+            % (
+                kernel,
+                entry["status"],
+                entry.get("signer") or "-",
+                entry.get("module") or entry.get("error", "-"),
+            )
+        )
+    if not result["kernels"]:
+        print("No acer_wmi_battery modules installed")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="acer-battery-sigcheck", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument(
+        "--cert",
+        default=DEFAULT_CERT,
+        help="certificate the modules should be signed with (PEM or DER); "
+        "empty to only check for a signature",
+    )
+    parser.add_argument(
+        "--kernel",
+        action="append",
+        help="kernel release to check (repeatable; default: every kernel)",
+    )
+    parser.add_argument("--root", default="", help="filesystem root (for testing)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument(
+        "--require-enrolled",
+        action="store_true",
+        help="also fail when the signer is not in the enrolled MOK list",
+    )
+    parser.add_argument(
+        "--module",
+        help="check this module file instead of the installed one (for one --kernel)",
+    )
+    parser.add_argument(
+        "--mok",
+        default=DEFAULT_CERT,
+        help="the MOK certificate generated on this host; a module it signed "
+        "may still be waiting for enrollment",
+    )
+    args = parser.parse_args(argv)
+
+    result = report(
+        args.root.rstrip("/"), args.cert or None, args.kernel, args.module, args.mok
+    )
+    if args.json:
+        json.dump(result, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        print_text(result)
+    return 1 if problems(result, args.require_enrolled) or not result["kernels"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
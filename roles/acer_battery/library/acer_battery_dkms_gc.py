@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Remove acer-wmi-battery DKMS builds and modules nobody uses anymore."""
+
+from __future__ import annotations
+
+from ansible.module_utils.acer_battery_dkms import (
+    BUILD_LOCK_DIR,
+    collect_garbage,
+    read_tree,
+)
+from ansible.module_utils.basic import AnsibleModule
+
+DOCUMENTATION = r"""
+---
+module: acer_battery_dkms_gc
+short_description: Garbage-collect the acer-wmi-battery DKMS tree
+description:
+  - Removes the DKMS trees (and C(/usr/src) sources) of versions other than
+    I(version), and the DKMS builds, C(kernel-*) links and installed modules
+    of kernels that are no longer installed.
+  - A kernel counts as installed while C(/lib/modules/<kernel>) still has
+    C(kernel/), C(modules.order) or C(vmlinuz). Kernels in I(keep) always count.
+  - With I(cache_dir), also removes the module cache entries of build-cache.sh
+    other than the active module of each installed kernel and its rollback
+    target. Kernels whose build lock is held by a running build are skipped.
+  - The state is read from the DKMS directory layout; C(dkms) is not run.
+options:
+  version:
+    description: DKMS version the role installs.
+    type: str
+    required: true
+  keep:
+    description: Kernels that always count as installed (normally the running one).
+    type: list
+    elements: str
+    default: []
+  root:
+    description:
+      - Filesystem root prefixed to C(/var/lib/dkms), C(/lib/modules) and
+        C(/usr/src).
+    type: path
+    default: ""
+  cache_dir:
+    description:
+      - Cache directory of build-cache.sh (C(acer_battery_cache_dir)); not
+        prefixed with I(root).
+    type: path
+notes:
+  - Supports check mode; nothing is removed but the report is the same.
+"""
+
+EXAMPLES = r"""
+- name: Collect DKMS garbage
+  acer_battery_dkms_gc:
+    version: main
+    keep:
+      - "{{ ansible_kernel }}"
+    cache_dir: /var/cache/acer-battery
+  register: dkms_gc
+"""
+
+RETURN = r"""
+acer_battery_dkms_gc:
+  description: What was removed.
+  returned: always
+  type: dict
+  contains:
+    removed:
+      description: Removed paths with the reason and their size in bytes.
+      type: list
+      elements: dict
+    reclaimed_bytes:
+      type: int
+    dry_run:
+      type: bool
+"""
+
+
+def main() -> None:
+    module = AnsibleModule(
+        argument_spec=dict(
+            version=dict(type="str", required=True),
+            keep=dict(type="list", elements="str", default=[]),
+            root=dict(type="path", default=""),
+            cache_dir=dict(type="path"),
+        ),
+        supports_check_mode=True,
+    )
+    root = module.params["root"].rstrip("/")
+    dkms_root, modules_root = root + "/var/lib/dkms", root + "/lib/modules"
+
+    tree = read_tree(
+        module.params["version"], dkms_root, modules_root, module.params["keep"]
+    )
+    try:
+        result = collect_garbage(
+            tree,
+            dkms_root,
+            modules_root,
+            root + "/usr/src",
+            dry_run=module.check_mode,
+            cache_root=module.params["cache_dir"],
+            lock_root=root + BUILD_LOCK_DIR,
+        )
+    except OSError as exc:
+        module.fail_json(msg="Failed to collect DKMS garbage: %s" % exc)
+    module.exit_json(changed=bool(result["removed"]), acer_battery_dkms_gc=result)
+
+
+if __name__ == "__main__":
+    main()
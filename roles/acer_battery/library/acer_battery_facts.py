@@ -0,0 +1,337 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Collect everything the acer_battery role probes in a single module run."""
+
+from __future__ import annotations
+
+import errno
+import json
+import os
+import shutil
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+from ansible.module_utils.acer_battery_dkms import MODULE_NAMES, read_tree
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.facts.system.distribution import DistributionFactCollector
+from ansible.module_utils.facts.system.platform import PlatformFactCollector
+
+DOCUMENTATION = r"""
+---
+module: acer_battery_facts
+short_description: Gather acer-wmi-battery preflight and module state in one pass
+description:
+  - Replaces the individual probing commands of the acer_battery role
+    (C(id -u), C(getenforce), C(mokutil --sb-state), bootloader checks,
+    C(dkms status), module lookup, C(file) and kernel log greps).
+  - Reads sysfs, efivars and the DKMS tree directly (the DKMS state comes
+    from the role's C(acer_battery_dkms) module_utils); only C(rpm -V) is run
+    as a subprocess, and only on RedHat-family systems.
+  - Also sets C(ansible_distribution), C(ansible_os_family) and
+    C(ansible_kernel) so plays can run with C(gather_facts) disabled.
+options:
+  version:
+    description:
+      - DKMS version the role installs; other versions are reported as
+        conflicting.
+    type: str
+    required: true
+  kernel:
+    description: Kernel release to inspect. Defaults to the running kernel.
+    type: str
+  root:
+    description:
+      - Filesystem root prefixed to every path read (sysfs, efivars, C(/dev/kmsg),
+        the DKMS tree and C(/lib/modules)). Used by the test harness.
+    type: path
+    default: ""
+  verify_bootloader:
+    description:
+      - Check the signed bootloader files and run C(rpm -V) on their packages.
+      - Only done on RedHat-family systems (including Fedora).
+    type: bool
+    default: true
+  bootloader_files:
+    description: Bootloader files checked when verifying the bootloader.
+    type: list
+    elements: str
+    default: [/boot/efi/EFI/fedora/shimx64.efi, /boot/efi/EFI/fedora/grubx64.efi]
+  bootloader_packages:
+    description: Packages passed to C(rpm -V) when verifying the bootloader.
+    type: list
+    elements: str
+    default: [shim-x64, grub2-efi-x64]
+  kernel_log:
+    description:
+      - Return the acer_wmi_battery lines of the kernel ring buffer (read
+        from C(/dev/kmsg)).
+    type: bool
+    default: false
+  build_index:
+    description:
+      - Per-kernel build index written by the role's kernel hook build queue
+        (latest phase, result and duration per kernel), returned as C(builds).
+    type: path
+    default: /var/lib/acer-wmi-battery/builds.tsv
+  drift_status:
+    description:
+      - Status file written by the role's drift agent (C(acer-battery-drift)),
+        returned as C(drift); C(null) when the agent has not run yet.
+    type: path
+    default: /var/lib/acer-wmi-battery/drift.json
+"""
+
+EXAMPLES = r"""
+- name: Gather acer-wmi-battery facts
+  acer_battery_facts:
+    version: "{{ acer_battery_version }}"
+    kernel_log: true
+"""
+
+RETURN = r"""
+ansible_facts:
+  description: C(acer_battery) plus the distribution and platform facts the role uses.
+  returned: always
+  type: dict
+  contains:
+    acer_battery:
+      description:
+        - Structured probe results (uid, selinux, secure_boot, bootloader,
+          dkms, module, builds, drift, kernel_log).
+      type: dict
+"""
+
+SECURE_BOOT_VAR = "SecureBoot-8be4df61-93ca-11d2-aa0d-00e098032b8c"
+
+# Leading bytes of the module file formats that modprobe understands.
+MODULE_MAGIC = (
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"\x1f\x8b", "gzip"),
+    (b"\x7fELF", "elf"),
+)
+
+
+def read_text(path: str) -> Optional[str]:
+    """Return the stripped content of a small file, or None if unreadable."""
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def selinux_state(selinuxfs: str = "/sys/fs/selinux") -> Dict[str, Any]:
+    """Report SELinux the way getenforce would, without running it."""
+    installed = shutil.which("getenforce") is not None
+    enforce = read_text(os.path.join(selinuxfs, "enforce"))
+    if enforce is None:
+        mode = "Disabled" if installed else None
+    else:
+        mode = "Enforcing" if enforce == "1" else "Permissive"
+    return {"installed": installed, "mode": mode}
+
+
+def secure_boot_state(efi_dir: str = "/sys/firmware/efi") -> Dict[str, Any]:
+    """Read the SecureBoot EFI variable (4 attribute bytes followed by the value)."""
+    if not os.path.isdir(efi_dir):
+        return {"enabled": False, "source": "bios"}
+
+    try:
+        with open(os.path.join(efi_dir, "efivars", SECURE_BOOT_VAR), "rb") as f:
+            data = f.read()
+        if len(data) >= 5:
+            return {"enabled": data[4] == 1, "source": "efivars"}
+    except OSError:
+        pass
+
+    # efivarfs not mounted/readable: fall back to mokutil.
+    if shutil.which("mokutil"):
+        proc = subprocess.run(
+            ["mokutil", "--sb-state"], capture_output=True, text=True, check=False
+        )
+        return {"enabled": "SecureBoot enabled" in proc.stdout, "source": "mokutil"}
+    return {"enabled": False, "source": "unknown"}
+
+
+def bootloader_state(files: List[str], packages: List[str]) -> Dict[str, Any]:
+    """Check bootloader files and verify their packages with rpm -V."""
+    state: Dict[str, Any] = {
+        "files": {path: os.path.exists(path) for path in files},
+        "verified": None,
+        "verify_output": "",
+    }
+    if packages and shutil.which("rpm"):
+        proc = subprocess.run(
+            ["rpm", "-V"] + packages, capture_output=True, text=True, check=False
+        )
+        state["verified"] = proc.returncode == 0
+        state["verify_output"] = (proc.stdout + proc.stderr).strip()
+    return state
+
+
+def dkms_state(
+    version: str,
+    dkms_root: str = "/var/lib/dkms",
+    modules_root: str = "/lib/modules",
+    keep: Tuple[str, ...] = (),
+) -> Dict[str, Any]:
+    """Per-version and per-kernel DKMS state; other versions are conflicting."""
+    state: Dict[str, Any] = read_tree(version, dkms_root, modules_root, keep)
+    return state
+
+
+def module_format(path: str) -> str:
+    """Identify a module file by its magic bytes instead of running file(1)."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(8)
+    except OSError:
+        return "unknown"
+    for magic, name in MODULE_MAGIC:
+        if head.startswith(magic):
+            return name
+    return "unknown"
+
+
+def find_module(kernel: str, modules_root: str = "/lib/modules") -> Dict[str, Any]:
+    """Locate the installed module for a kernel anywhere in its module tree."""
+    for dirpath, _dirnames, filenames in os.walk(os.path.join(modules_root, kernel)):
+        for name in sorted(filenames):
+            if name.split(".ko")[0] in MODULE_NAMES and ".ko" in name:
+                path = os.path.join(dirpath, name)
+                return {"exists": True, "path": path, "format": module_format(path)}
+    return {"exists": False, "path": "", "format": None}
+
+
+def kernel_log_lines(kmsg: str = "/dev/kmsg") -> List[str]:
+    """Return ring buffer messages mentioning the module, without journalctl/dmesg."""
+    lines: List[str] = []
+    try:
+        fd = os.open(kmsg, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return lines
+    try:
+        while True:
+            try:
+                record = os.read(fd, 8192)
+            except BlockingIOError:
+                break
+            except OSError as exc:
+                if exc.errno == errno.EPIPE:
+                    # Record was overwritten while reading; continue with the next one.
+                    continue
+                break
+            if not record:
+                break
+            # "<prio>,<seq>,<usec>,<flags>;<message>\n[ continuation lines]"
+            message = record.decode("utf-8", "replace").split(";", 1)[-1].split("\n")[0]
+            if "acer_wmi_battery" in message.lower():
+                lines.append(message)
+    finally:
+        os.close(fd)
+    return lines
+
+
+def read_build_index(path: str) -> Dict[str, Dict[str, Any]]:
+    """Latest hook/queue build outcome per kernel from the build index."""
+    builds: Dict[str, Dict[str, Any]] = {}
+    try:
+        with open(path, "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return builds
+    # kernel, timestamp, phase, result, duration_ms, log
+    for line in lines:
+        fields = line.split("\t")
+        if len(fields) != 6:
+            continue
+        kernel, timestamp, phase, result, duration, log = fields
+        builds[kernel] = {
+            "time": timestamp,
+            "phase": phase,
+            "result": result,
+            "duration_ms": int(duration) if duration.isdigit() else None,
+            "log": log,
+        }
+    return builds
+
+
+def read_drift_status(path: str) -> Optional[Dict[str, Any]]:
+    """Latest verdict of the drift agent, or None if it has not run."""
+    try:
+        with open(path, "r") as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return status if isinstance(status, dict) else None
+
+
+def main() -> None:
+    module = AnsibleModule(
+        argument_spec=dict(
+            version=dict(type="str", required=True),
+            kernel=dict(type="str"),
+            root=dict(type="path", default=""),
+            verify_bootloader=dict(type="bool", default=True),
+            bootloader_files=dict(
+                type="list",
+                elements="str",
+                default=[
+                    "/boot/efi/EFI/fedora/shimx64.efi",
+                    "/boot/efi/EFI/fedora/grubx64.efi",
+                ],
+            ),
+            bootloader_packages=dict(
+                type="list", elements="str", default=["shim-x64", "grub2-efi-x64"]
+            ),
+            kernel_log=dict(type="bool", default=False),
+            build_index=dict(
+                type="path", default="/var/lib/acer-wmi-battery/builds.tsv"
+            ),
+            drift_status=dict(
+                type="path", default="/var/lib/acer-wmi-battery/drift.json"
+            ),
+        ),
+        supports_check_mode=True,
+    )
+
+    system: Dict[str, Any] = {}
+    system.update(DistributionFactCollector().collect(module=module))
+    system.update(PlatformFactCollector().collect(module=module))
+    kernel = module.params["kernel"] or system.get("kernel") or os.uname().release
+    root = module.params["root"].rstrip("/")
+
+    facts: Dict[str, Any] = {
+        "uid": os.geteuid(),
+        "kernel": kernel,
+        "selinux": selinux_state(root + "/sys/fs/selinux"),
+        "secure_boot": secure_boot_state(root + "/sys/firmware/efi"),
+        "dkms": dkms_state(
+            module.params["version"],
+            root + "/var/lib/dkms",
+            root + "/lib/modules",
+            (kernel,),
+        ),
+        "module": find_module(kernel, root + "/lib/modules"),
+        "builds": read_build_index(module.params["build_index"]),
+        "drift": read_drift_status(module.params["drift_status"]),
+        "bootloader": None,
+        "kernel_log": None,
+    }
+    if module.params["verify_bootloader"] and system.get("os_family") == "RedHat":
+        facts["bootloader"] = bootloader_state(
+            module.params["bootloader_files"], module.params["bootloader_packages"]
+        )
+    if module.params["kernel_log"]:
+        facts["kernel_log"] = kernel_log_lines(root + "/dev/kmsg")
+
+    ansible_facts = {"ansible_" + key: value for key, value in system.items()}
+    ansible_facts["acer_battery"] = facts
+    module.exit_json(changed=False, ansible_facts=ansible_facts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Record and compare the converged state of the acer_battery role."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from ansible.module_utils.basic import AnsibleModule
+
+DOCUMENTATION = r"""
+---
+module: acer_battery_manifest
+short_description: Converged-state manifest of the acer_battery role
+description:
+  - The manifest is a JSON file recording everything a converge depends on -
+    the inputs computed on the controller (role version, role variables,
+    rendered template hashes, kernel release), the resolved upstream commit,
+    the signing certificate and the SHA-256 of every installed file.
+  - With C(state=check) the current inputs and installed files are compared
+    with the manifest and C(converged) tells whether the install/build/load
+    pipeline can be skipped. Nothing is written. The upstream commit is the
+    one I(version) resolves to in the mirror, so no network access is needed.
+    Only when I(repo) is given is I(version) also resolved upstream with
+    C(git ls-remote); a commit other than the mirror's is reported as
+    C(upstream commit).
+  - With C(state=present) the manifest is (re)written for the current state.
+options:
+  path:
+    description: Manifest file.
+    type: path
+    required: true
+  state:
+    description: Compare with the manifest (C(check)) or record it (C(present)).
+    type: str
+    choices: [check, present]
+    default: check
+  inputs:
+    description: Inputs computed on the controller; compared key by key.
+    type: dict
+    default: {}
+  files:
+    description: Installed files whose content is recorded and compared.
+    type: list
+    elements: path
+    default: []
+  mirror_dir:
+    description: Bare upstream mirror the commit of I(version) is resolved in.
+    type: path
+  version:
+    description: Upstream version (branch, tag or commit) to resolve in I(mirror_dir).
+    type: str
+  repo:
+    description:
+      - Upstream repository I(version) is also resolved in with
+        C(state=check). Omit it to compare with the mirror only.
+      - When it cannot be reached within I(timeout) the mirror's commit is
+        trusted, so an offline host still counts as converged.
+    type: str
+  timeout:
+    description: Seconds C(git ls-remote) may take before I(repo) counts as unreachable.
+    type: int
+    default: 10
+  signing_cert:
+    description:
+      - Signing certificate whose hash is recorded; empty when modules are
+        not signed.
+    type: path
+    default: ""
+notes:
+  - Supports check mode; C(state=present) then only reports whether it would write.
+"""
+
+EXAMPLES = r"""
+- name: Check converged-state manifest
+  acer_battery_manifest:
+    path: /usr/src/acer-wmi-battery-main/ANSIBLE-MANAGED.json
+    inputs:
+      kernel: "{{ ansible_kernel }}"
+    files:
+      - /usr/local/bin/acer-battery-status
+  register: manifest_check
+"""
+
+RETURN = r"""
+acer_battery_manifest:
+  description: Result of the comparison.
+  returned: always
+  type: dict
+  contains:
+    converged:
+      description: True when nothing differs from the manifest.
+      type: bool
+    differences:
+      description:
+        - What differs (C(no manifest), an input name, C(template <src>) or
+          C(file <path>)).
+      type: list
+      elements: str
+    path:
+      type: str
+    upstream_commit:
+      description: Commit of I(version) upstream; empty when not resolved there.
+      type: str
+"""
+
+FORMAT = 1
+
+COMMIT_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+def file_digest(path: str) -> Optional[str]:
+    """SHA-256 of a file, or None if it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def load_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """Return the recorded manifest, or None if absent, unreadable or outdated."""
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("format") != FORMAT:
+        return None
+    return data
+
+
+def differences(
+    recorded: Optional[Dict[str, Any]], current: Dict[str, Any]
+) -> List[str]:
+    """List what differs between a recorded and the current manifest."""
+    if recorded is None:
+        return ["no manifest"]
+    diffs: List[str] = []
+    old_inputs = recorded.get("inputs", {})
+    for key, value in sorted(current["inputs"].items()):
+        old = old_inputs.get(key)
+        if key == "templates" and isinstance(value, dict) and isinstance(old, dict):
+            for name in sorted(set(value) | set(old)):
+                if value.get(name) != old.get(name):
+                    diffs.append("template %s" % name)
+        elif value != old:
+            diffs.append(key)
+    old_files = recorded.get("files", {})
+    for path, digest in sorted(current["files"].items()):
+        if digest is None or old_files.get(path) != digest:
+            diffs.append("file %s" % path)
+    return diffs
+
+
+def remote_commit(ls_remote: str, version: str) -> str:
+    """Commit of version in "git ls-remote" output, or "" if it is not listed.
+
+    An annotated tag is listed twice; its peeled "^{}" line names the commit.
+    A full commit id is its own commit and needs no lookup.
+    """
+    if COMMIT_RE.match(version):
+        return version
+    refs: Dict[str, str] = {}
+    for line in ls_remote.splitlines():
+        sha, _, ref = line.partition("\t")
+        refs[ref.strip()] = sha.strip()
+    for ref in ("refs/tags/%s^{}" % version, "refs/heads/%s" % version):
+        if ref in refs:
+            return refs[ref]
+    for ref in ("refs/tags/%s" % version, version):
+        if ref in refs:
+            return refs[ref]
+    return ""
+
+
+def write_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    """Write the manifest atomically."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".manifest.", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.write("\n")
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def main() -> None:
+    module = AnsibleModule(
+        argument_spec=dict(
+            path=dict(type="path", required=True),
+            state=dict(type="str", choices=["check", "present"], default="check"),
+            inputs=dict(type="dict", default={}),
+            files=dict(type="list", elements="path", default=[]),
+            mirror_dir=dict(type="path"),
+            version=dict(type="str"),
+            repo=dict(type="str"),
+            timeout=dict(type="int", default=10),
+            signing_cert=dict(type="path", default=""),
+        ),
+        supports_check_mode=True,
+    )
+    params = module.params
+
+    inputs = dict(params["inputs"])
+    commit = ""
+    if params["mirror_dir"] and params["version"]:
+        rc, out, _ = module.run_command(
+            [
+                "git",
+                "--git-dir=" + params["mirror_dir"],
+                "rev-parse",
+                "--verify",
+                "--quiet",
+                params["version"] + "^{commit}",
+            ]
+        )
+        commit = out.strip() if rc == 0 else ""
+    inputs["commit"] = commit
+    inputs["signer"] = (
+        file_digest(params["signing_cert"]) if params["signing_cert"] else ""
+    )
+    current: Dict[str, Any] = {
+        "format": FORMAT,
+        "inputs": inputs,
+        "files": {path: file_digest(path) for path in params["files"]},
+    }
+
+    recorded = load_manifest(params["path"])
+    diffs = differences(recorded, current)
+    if params["state"] == "check":
+        upstream = ""
+        if params["repo"] and params["version"]:
+            rc, out, _ = module.run_command(
+                [
+                    "timeout",
+                    str(params["timeout"]),
+                    "git",
+                    "ls-remote",
+                    params["repo"],
+                    params["version"],
+                ],
+                environ_update={"GIT_TERMINAL_PROMPT": "0"},
+            )
+            upstream = remote_commit(out if rc == 0 else "", params["version"])
+        if upstream and upstream != commit:
+            diffs.append("upstream commit")
+        module.exit_json(
+            changed=False,
+            acer_battery_manifest=dict(
+                converged=not diffs,
+                differences=diffs,
+                path=params["path"],
+                upstream_commit=upstream,
+            ),
+        )
+
+    changed = recorded != current
+    if changed and not module.check_mode:
+        try:
+            write_manifest(params["path"], current)
+        except OSError as exc:
+            module.fail_json(msg="Failed to write %s: %s" % (params["path"], exc))
+    module.exit_json(
+        changed=changed,
+        acer_battery_manifest=dict(
+            converged=True, differences=diffs, path=params["path"]
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
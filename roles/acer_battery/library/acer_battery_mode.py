@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Set the acer-wmi-battery health and calibration modes idempotently."""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from ansible.module_utils.basic import AnsibleModule
+
+DOCUMENTATION = r"""
+---
+module: acer_battery_mode
+short_description: Set the acer-wmi-battery health mode and calibration mode
+description:
+  - Reads C(health_mode) and C(calibration_mode) from the driver's sysfs
+    directory and only writes the attributes that differ from the requested
+    state, so hosts already in the requested state never trigger a WMI call.
+  - Every write is read back and the task fails if the driver did not accept it.
+  - Options left unset are reported but not changed.
+options:
+  health_mode:
+    description: Enable the 80% charge limit (C(true)) or charge to 100% (C(false)).
+    type: bool
+  calibration_mode:
+    description: Start (C(true)) or stop (C(false)) battery calibration.
+    type: bool
+  wmi_dirs:
+    description: Driver sysfs directories to try, in order.
+    type: list
+    elements: path
+    default:
+      - /sys/bus/wmi/drivers/acer-wmi-battery
+      - /sys/devices/platform/acer-wmi-battery
+  policy_file:
+    description:
+      - Where the applied I(health_mode) is recorded for the drift agent
+        (C(acer-battery-drift)), which reports a host whose health_mode no
+        longer matches it. Not written when I(health_mode) is unset.
+      - The record is bookkeeping and does not make the task changed.
+    type: path
+notes:
+  - Supports check mode, diff mode, C(async) and the C(free) strategy; the
+    C(acer_battery_summary) callback aggregates the results across hosts.
+"""
+
+EXAMPLES = r"""
+- name: Enforce the 80% charge limit
+  acer_battery_mode:
+    health_mode: true
+"""
+
+RETURN = r"""
+acer_battery_mode:
+  description: State after the task (C(null) for attributes the driver does not expose).
+  returned: always
+  type: dict
+  contains:
+    health_mode:
+      type: bool
+    calibration_mode:
+      type: bool
+    changed_attributes:
+      description: Attributes that were (or in check mode would be) written.
+      type: list
+      elements: str
+"""
+
+ATTRIBUTES = ("health_mode", "calibration_mode")
+
+
+def find_wmi_dir(dirs: List[str]) -> Optional[str]:
+    """Return the first directory exposing health_mode."""
+    for path in dirs:
+        if os.path.isfile(os.path.join(path, "health_mode")):
+            return path
+    return None
+
+
+def read_mode(path: str) -> Optional[bool]:
+    """Read a 0/1 sysfs attribute; None if absent or unreadable."""
+    try:
+        with open(path, "r") as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    if value not in ("0", "1"):
+        return None
+    return value == "1"
+
+
+def write_mode(path: str, enabled: bool) -> None:
+    """Write a 0/1 sysfs attribute in a single write(2)."""
+    with open(path, "w") as f:
+        f.write("1" if enabled else "0")
+
+
+def record_policy(path: str, health_mode: bool) -> None:
+    """Record the applied health_mode atomically, unless already recorded."""
+    policy = {"health_mode": health_mode}
+    try:
+        with open(path, "r") as f:
+            if json.load(f) == policy:
+                return
+    except (OSError, ValueError):
+        pass
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".policy.", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(policy, f)
+            f.write("\n")
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def main() -> None:
+    module = AnsibleModule(
+        argument_spec=dict(
+            health_mode=dict(type="bool"),
+            calibration_mode=dict(type="bool"),
+            wmi_dirs=dict(
+                type="list",
+                elements="path",
+                default=[
+                    "/sys/bus/wmi/drivers/acer-wmi-battery",
+                    "/sys/devices/platform/acer-wmi-battery",
+                ],
+            ),
+            policy_file=dict(type="path"),
+        ),
+        supports_check_mode=True,
+    )
+
+    wmi_dir = find_wmi_dir(module.params["wmi_dirs"])
+    if wmi_dir is None:
+        module.fail_json(
+            msg="acer-wmi-battery sysfs interface not found; is the module loaded?",
+            acer_battery_mode=None,
+        )
+        return
+
+    before: Dict[str, Optional[bool]] = {}
+    after: Dict[str, Optional[bool]] = {}
+    changed_attributes: List[str] = []
+    for attr in ATTRIBUTES:
+        path = os.path.join(wmi_dir, attr)
+        current = read_mode(path)
+        before[attr] = after[attr] = current
+        desired = module.params[attr]
+        if desired is None or desired == current:
+            continue
+        if current is None:
+            module.fail_json(msg="%s is not available in %s" % (attr, wmi_dir))
+        changed_attributes.append(attr)
+        after[attr] = desired
+        if module.check_mode:
+            continue
+        try:
+            write_mode(path, desired)
+        except OSError as exc:
+            module.fail_json(msg="Failed to write %s: %s" % (path, exc))
+        actual = read_mode(path)
+        if actual != desired:
+            module.fail_json(
+                msg="%s did not take the new value (wanted %s, read back %s)"
+                % (path, desired, actual),
+                acer_battery_mode=dict(after, changed_attributes=changed_attributes),
+            )
+
+    policy_file = module.params["policy_file"]
+    if (
+        policy_file
+        and module.params["health_mode"] is not None
+        and not module.check_mode
+    ):
+        try:
+            record_policy(policy_file, module.params["health_mode"])
+        except OSError as exc:
+            module.warn("Could not write %s: %s" % (policy_file, exc))
+
+    result: Dict[str, Any] = dict(
+        changed=bool(changed_attributes),
+        acer_battery_mode=dict(after, changed_attributes=changed_attributes),
+    )
+    if module._diff:
+        result["diff"] = dict(before=before, after=after)
+    module.exit_json(**result)
+
+
+if __name__ == "__main__":
+    main()
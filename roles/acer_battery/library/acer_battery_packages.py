@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Install the role's packages in one transaction, with a cached fast path."""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from ansible.module_utils.basic import AnsibleModule
+
+DOCUMENTATION = r"""
+---
+module: acer_battery_packages
+short_description: Install the acer_battery packages in a single transaction
+description:
+  - Checks which of I(names) are installed and installs the missing ones with
+    one package-manager transaction (C(dnf), C(apt-get), C(zypper) or C(pacman)).
+  - The installed packages are recorded in I(snapshot) together with the
+    modification times of the package database. While the database is
+    unchanged and the snapshot lists every name, no package manager command
+    is run at all.
+options:
+  names:
+    description: Packages that must be installed, including versioned kernel headers.
+    type: list
+    elements: str
+    required: true
+  snapshot:
+    description: Cached package-facts snapshot.
+    type: path
+    required: true
+  manager:
+    description: Package manager; C(auto) picks it from I(os_family).
+    type: str
+    choices: [auto, dnf, yum, apt, zypper, pacman]
+    default: auto
+  os_family:
+    description: C(ansible_os_family) (or C(Fedora)), used when I(manager=auto).
+    type: str
+    default: ""
+  root:
+    description:
+      - Filesystem root prefixed to the package database paths. Used by the
+        test harness.
+    type: path
+    default: ""
+notes:
+  - Supports check mode; missing packages are reported but not installed.
+"""
+
+EXAMPLES = r"""
+- name: Install required packages
+  acer_battery_packages:
+    names: [git, dkms, gcc, make, "kernel-devel-{{ ansible_kernel }}"]
+    snapshot: /var/cache/acer-battery/packages.json
+    os_family: Fedora
+"""
+
+RETURN = r"""
+acer_battery_packages:
+  description: Package state.
+  returned: always
+  type: dict
+  contains:
+    missing:
+      description: Packages that were missing before the transaction.
+      type: list
+      elements: str
+    cached:
+      description: True when the snapshot answered without querying the package manager.
+      type: bool
+    manager:
+      type: str
+"""
+
+MANAGERS = {
+    "RedHat": "dnf",
+    "Fedora": "dnf",
+    "Suse": "zypper",
+    "Debian": "apt",
+    "Archlinux": "pacman",
+}
+# Database of each manager; any change to it invalidates the snapshot.
+DATABASES = {
+    "dnf": ("/usr/lib/sysimage/rpm", "/var/lib/rpm"),
+    "yum": ("/usr/lib/sysimage/rpm", "/var/lib/rpm"),
+    "zypper": ("/usr/lib/sysimage/rpm", "/var/lib/rpm"),
+    "apt": ("/var/lib/dpkg/status",),
+    "pacman": ("/var/lib/pacman/local",),
+}
+INSTALL = {
+    "dnf": ["dnf", "install", "-y"],
+    "yum": ["yum", "install", "-y"],
+    "zypper": ["zypper", "--non-interactive", "install"],
+    "apt": ["apt-get", "install", "-y", "--no-install-recommends"],
+    "pacman": ["pacman", "-S", "--needed", "--noconfirm"],
+}
+NOT_INSTALLED = {
+    # rpm -q: "package foo is not installed"
+    "rpm": re.compile(r"^package (\S+) is not installed"),
+    # dpkg-query: "dpkg-query: no packages found matching foo"
+    "dpkg": re.compile(r"no packages found matching (\S+)"),
+    # pacman -Q: "error: package 'foo' was not found"
+    "pacman": re.compile(r"package '([^']+)' was not found"),
+}
+
+
+def database_signature(manager: str, root: str = "") -> Dict[str, float]:
+    """Modification times of the package database (and its direct entries)."""
+    signature: Dict[str, float] = {}
+    for path in DATABASES[manager]:
+        path = root + path
+        try:
+            signature[path] = os.stat(path).st_mtime
+        except OSError:
+            continue
+        if os.path.isdir(path):
+            for entry in os.scandir(path):
+                try:
+                    signature[entry.path] = entry.stat(follow_symlinks=False).st_mtime
+                except OSError:
+                    pass
+    return signature
+
+
+def load_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def snapshot_satisfies(
+    snapshot: Optional[Dict[str, Any]],
+    manager: str,
+    signature: Dict[str, float],
+    names: List[str],
+) -> bool:
+    """Whether the snapshot alone shows every name installed."""
+    if not snapshot or not signature:
+        return False
+    if snapshot.get("manager") != manager or snapshot.get("signature") != signature:
+        return False
+    return set(names) <= set(snapshot.get("installed", []))
+
+
+def write_snapshot(path: str, data: Dict[str, Any]) -> None:
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".packages.", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def query_command(manager: str, names: List[str]) -> Tuple[List[str], str]:
+    if manager in ("dnf", "yum", "zypper"):
+        return ["rpm", "-q"] + names, "rpm"
+    if manager == "apt":
+        return [
+            "dpkg-query",
+            "-W",
+            "-f=${Package}\\t${db:Status-Status}\\n",
+        ] + names, "dpkg"
+    return ["pacman", "-Q"] + names, "pacman"
+
+
+def missing_packages(
+    module: AnsibleModule, manager: str, names: List[str]
+) -> List[str]:
+    """Ask the package manager which of names are not installed."""
+    if not names:
+        return []
+    cmd, kind = query_command(manager, names)
+    _rc, out, err = module.run_command(cmd, environ_update={"LC_ALL": "C"})
+    missing = set()
+    for line in (out + "\n" + err).splitlines():
+        match = NOT_INSTALLED[kind].search(line)
+        if match:
+            missing.add(match.group(1))
+        elif kind == "dpkg" and "\t" in line:
+            package, status = line.split("\t", 1)
+            if status.strip() != "installed":
+                missing.add(package)
+    return [name for name in names if name in missing]
+
+
+def main() -> None:
+    module = AnsibleModule(
+        argument_spec=dict(
+            names=dict(type="list", elements="str", required=True),
+            snapshot=dict(type="path", required=True),
+            manager=dict(
+                type="str",
+                choices=["auto", "dnf", "yum", "apt", "zypper", "pacman"],
+                default="auto",
+            ),
+            os_family=dict(type="str", default=""),
+            root=dict(type="path", default=""),
+        ),
+        supports_check_mode=True,
+    )
+    params = module.params
+    names = sorted(set(n for n in params["names"] if n))
+    root = params["root"].rstrip("/")
+    manager = params["manager"]
+    if manager == "auto":
+        manager = MANAGERS.get(params["os_family"], "")
+        if manager == "dnf" and not shutil.which("dnf") and shutil.which("yum"):
+            manager = "yum"
+    if not manager:
+        module.fail_json(
+            msg="No package manager known for os_family %r; "
+            "set acer_battery_package_manager" % params["os_family"]
+        )
+
+    result: Dict[str, Any] = {"missing": [], "cached": False, "manager": manager}
+    signature = database_signature(manager, root)
+    if snapshot_satisfies(load_snapshot(params["snapshot"]), manager, signature, names):
+        result["cached"] = True
+        module.exit_json(changed=False, acer_battery_packages=result)
+
+    missing = missing_packages(module, manager, names)
+    result["missing"] = missing
+    if missing and not module.check_mode:
+        # One transaction for the whole set; already installed names are no-ops.
+        environ = {"DEBIAN_FRONTEND": "noninteractive"} if manager == "apt" else {}
+        rc, out, err = module.run_command(
+            INSTALL[manager] + names, environ_update=environ
+        )
+        if rc != 0:
+            module.fail_json(
+                msg="Failed to install %s" % ", ".join(missing),
+                rc=rc,
+                stdout=out,
+                stderr=err,
+                acer_battery_packages=result,
+            )
+        still_missing = missing_packages(module, manager, missing)
+        if still_missing:
+            module.fail_json(
+                msg="Packages still missing after install: %s"
+                % ", ".join(still_missing),
+                acer_battery_packages=result,
+            )
+        signature = database_signature(manager, root)
+
+    if not module.check_mode:
+        try:
+            write_snapshot(
+                params["snapshot"],
+                {"manager": manager, "signature": signature, "installed": names},
+            )
+        except OSError as exc:
+            module.warn("Could not write %s: %s" % (params["snapshot"], exc))
+    module.exit_json(changed=bool(missing), acer_battery_packages=result)
+
+
+if __name__ == "__main__":
+    main()
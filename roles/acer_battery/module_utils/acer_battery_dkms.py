@@ -0,0 +1,436 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Read the acer-wmi-battery DKMS tree and collect its garbage.
+
+The state is read straight from the DKMS directory layout instead of parsing
+``dkms status``:
+
+    /var/lib/dkms/acer-wmi-battery/<version>/source
+        -> /usr/src/acer-wmi-battery-<version>
+    /var/lib/dkms/acer-wmi-battery/<version>/<kernel>/<arch>/module/*.ko*
+    /var/lib/dkms/acer-wmi-battery/kernel-<kernel>-<arch> -> <version>/<kernel>/<arch>
+
+A kernel counts as present while /lib/modules/<kernel> still has its own
+modules (``kernel/``, ``modules.order`` or ``vmlinuz``); package managers
+leave the directory behind with only the DKMS-installed module in it.
+
+The module cache of build-cache.sh is collected too, when its directory is
+given:
+
+    <cache>/modules/<key>/acer_wmi_battery.ko*, <cache>/modules/<key>/kernel
+    <cache>/active/<kernel>/current, .../previous   ("<key> <version>")
+
+Only the active module of each present kernel and its rollback target are
+kept. Entries are removed under the per-kernel build locks of build-cache.sh
+(<lock dir>/build-<kernel>.lock); a kernel whose lock is held is skipped.
+
+Used by the acer_battery_facts and acer_battery_dkms_gc modules, and installed
+on the host as ``acer-battery-dkms`` for the status and build-cache scripts:
+
+    acer-battery-dkms --version VERSION [--root DIR] [--keep KVER] COMMAND
+
+    COMMAND: state [--kernel KVER] [--json] | gc [--dry-run] [--json] [--cache-dir DIR]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fcntl
+import glob
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+DKMS_MODULE = "acer-wmi-battery"
+MODULE_NAMES = ("acer_wmi_battery", "acer-wmi-battery")
+# Where DKMS and build-cache.sh install the module under /lib/modules/<kernel>.
+INSTALL_DIRS = ("extra", "updates", "updates/dkms")
+# Entries of a version directory that are not kernels.
+VERSION_ENTRIES = ("source", "build", "tarball")
+KERNEL_MARKERS = ("kernel", "modules.order", "vmlinuz")
+# Where build-cache.sh keeps its per-kernel build locks.
+BUILD_LOCK_DIR = "/run/acer-wmi-battery"
+
+
+def kernel_present(kernel: str, modules_root: str = "/lib/modules") -> bool:
+    """Whether the kernel itself is still installed, not just our module."""
+    base = os.path.join(modules_root, kernel)
+    return any(os.path.exists(os.path.join(base, marker)) for marker in KERNEL_MARKERS)
+
+
+def installed_modules(kernel: str, modules_root: str = "/lib/modules") -> List[str]:
+    """The acer-wmi-battery modules installed for a kernel."""
+    found: List[str] = []
+    for directory in INSTALL_DIRS:
+        for name in MODULE_NAMES:
+            found.extend(
+                glob.glob(os.path.join(modules_root, kernel, directory, name + ".ko*"))
+            )
+    return sorted(found)
+
+
+def _listdir(path: str) -> List[str]:
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def read_tree(
+    version: str,
+    dkms_root: str = "/var/lib/dkms",
+    modules_root: str = "/lib/modules",
+    keep: Iterable[str] = (),
+) -> Dict[str, Any]:
+    """Per-version and per-kernel state of the module from the DKMS tree.
+
+    Kernels in keep (normally the running one) always count as present.
+    """
+    module_dir = os.path.join(dkms_root, DKMS_MODULE)
+    versions: Dict[str, Dict[str, Any]] = {}
+    links: Dict[str, str] = {}
+    for name in _listdir(module_dir):
+        path = os.path.join(module_dir, name)
+        if name.startswith("kernel-") and os.path.islink(path):
+            # kernel-<kernel>-<arch> -> <version>/<kernel>/<arch>
+            target = os.path.join(module_dir, os.readlink(path))
+            kernel = name[len("kernel-") :].rsplit("-", 1)[0]
+            links[kernel] = os.path.relpath(target, module_dir).split(os.sep)[0]
+            continue
+        if name == "original_module" or os.path.islink(path) or not os.path.isdir(path):
+            continue
+        builds: Dict[str, Dict[str, Any]] = {}
+        for kernel in _listdir(path):
+            if kernel in VERSION_ENTRIES or not os.path.isdir(
+                os.path.join(path, kernel)
+            ):
+                continue
+            for arch in _listdir(os.path.join(path, kernel)):
+                modules = glob.glob(os.path.join(path, kernel, arch, "module", "*.ko*"))
+                builds[kernel] = {"arch": arch, "built": bool(modules)}
+        versions[name] = {
+            "added": os.path.lexists(os.path.join(path, "source")),
+            "builds": builds,
+        }
+
+    keep = set(keep)
+    kernels: Dict[str, Dict[str, Any]] = {}
+    names = set(_listdir(modules_root)) | set(links) | keep
+    for info in versions.values():
+        names.update(info["builds"])
+    for kernel in sorted(names):
+        current = versions.get(version, {}).get("builds", {}).get(kernel)
+        kernels[kernel] = {
+            "present": kernel in keep or kernel_present(kernel, modules_root),
+            "built": bool(current and current["built"]),
+            "installed": links.get(kernel),
+            "modules": installed_modules(kernel, modules_root),
+        }
+
+    return {
+        "version": version,
+        "added": versions.get(version, {}).get("added", False),
+        "versions": sorted(versions),
+        "conflicting": sorted(v for v in versions if v != version),
+        "kernels": kernels,
+    }
+
+
+def disk_usage(path: str) -> int:
+    """Bytes used by a file or directory tree (symlinks are not followed)."""
+    try:
+        if not os.path.isdir(path) or os.path.islink(path):
+            return os.lstat(path).st_size
+    except OSError:
+        return 0
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in dirnames + filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _read_line(path: str) -> str:
+    try:
+        with open(path, "r") as f:
+            return f.readline().strip()
+    except OSError:
+        return ""
+
+
+def cache_kernels(cache_root: str) -> Set[str]:
+    """Kernels with an active module or an entry in the module cache."""
+    kernels = set(_listdir(os.path.join(cache_root, "active")))
+    for key in _listdir(os.path.join(cache_root, "modules")):
+        kernel = _read_line(os.path.join(cache_root, "modules", key, "kernel"))
+        if kernel:
+            kernels.add(kernel)
+    return kernels
+
+
+@contextlib.contextmanager
+def build_locks(lock_root: str, kernels: Iterable[str]) -> Iterator[Set[str]]:
+    """Hold the free build-cache.sh locks of kernels; yields the kernels locked."""
+    held: Dict[str, int] = {}
+    try:
+        os.makedirs(lock_root, exist_ok=True)
+        for kernel in sorted(kernels):
+            path = os.path.join(lock_root, "build-%s.lock" % kernel)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            held[kernel] = fd
+        yield set(held)
+    finally:
+        for fd in held.values():
+            os.close(fd)
+
+
+def garbage(
+    tree: Dict[str, Any],
+    dkms_root: str = "/var/lib/dkms",
+    modules_root: str = "/lib/modules",
+    src_root: str = "/usr/src",
+    cache_root: Optional[str] = None,
+    locked: Optional[Set[str]] = None,
+) -> List[Dict[str, Any]]:
+    """What can be removed: superseded versions and everything for absent kernels.
+
+    With cache_root, also the module cache entries that are neither the active
+    module of a present kernel nor its rollback target. Only kernels in locked
+    are touched in the cache (all of them when locked is None).
+    """
+    module_dir = os.path.join(dkms_root, DKMS_MODULE)
+    items: List[Dict[str, Any]] = []
+
+    def add(path: str, reason: str) -> None:
+        if os.path.lexists(path):
+            items.append({"path": path, "reason": reason, "bytes": disk_usage(path)})
+
+    for old in tree["conflicting"]:
+        reason = "superseded version %s" % old
+        add(os.path.join(module_dir, old), reason)
+        add(os.path.join(src_root, "%s-%s" % (DKMS_MODULE, old)), reason)
+    absent = [k for k, state in tree["kernels"].items() if not state["present"]]
+    for kernel in absent:
+        reason = "kernel %s no longer installed" % kernel
+        add(os.path.join(module_dir, tree["version"], kernel), reason)
+        for link in glob.glob(os.path.join(module_dir, "kernel-%s-*" % kernel)):
+            add(link, reason)
+        for module in tree["kernels"][kernel]["modules"]:
+            add(module, reason)
+    for kernel, state in tree["kernels"].items():
+        if state["present"] and state["installed"] in tree["conflicting"]:
+            for link in glob.glob(os.path.join(module_dir, "kernel-%s-*" % kernel)):
+                add(link, "superseded version %s" % state["installed"])
+    if cache_root:
+        items.extend(_cache_garbage(tree, modules_root, cache_root, locked))
+    return items
+
+
+def _cache_garbage(
+    tree: Dict[str, Any],
+    modules_root: str,
+    cache_root: str,
+    locked: Optional[Set[str]],
+) -> List[Dict[str, Any]]:
+    active_dir = os.path.join(cache_root, "active")
+    cache_dir = os.path.join(cache_root, "modules")
+    items: List[Dict[str, Any]] = []
+
+    def present(kernel: str) -> bool:
+        state = tree["kernels"].get(kernel)
+        return bool(state["present"]) if state else kernel_present(kernel, modules_root)
+
+    def add(path: str, reason: str) -> None:
+        items.append({"path": path, "reason": reason, "bytes": disk_usage(path)})
+
+    kept = set()
+    for kernel in _listdir(active_dir):
+        if present(kernel):
+            for slot in ("current", "previous"):
+                line = _read_line(os.path.join(active_dir, kernel, slot))
+                if line:
+                    kept.add(line.split()[0])
+        elif locked is None or kernel in locked:
+            add(
+                os.path.join(active_dir, kernel),
+                "kernel %s no longer installed" % kernel,
+            )
+    for key in _listdir(cache_dir):
+        # <key>.tmp is a store in progress.
+        if key in kept or key.endswith(".tmp"):
+            continue
+        kernel = _read_line(os.path.join(cache_dir, key, "kernel"))
+        if kernel and locked is not None and kernel not in locked:
+            continue
+        if kernel and not present(kernel):
+            reason = "kernel %s no longer installed" % kernel
+        else:
+            reason = "superseded module cache entry"
+        add(os.path.join(cache_dir, key), reason)
+    return items
+
+
+def _remove(items: List[Dict[str, Any]]) -> None:
+    for item in items:
+        path = item["path"]
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+
+
+def _prune_empty(kernel: str, modules_root: str) -> None:
+    """Remove the install directories (and /lib/modules/<kernel>) left empty."""
+    base = os.path.join(modules_root, kernel)
+    for directory in sorted(INSTALL_DIRS, key=len, reverse=True) + [""]:
+        try:
+            os.rmdir(os.path.join(base, directory))
+        except OSError:
+            pass
+
+
+def collect_garbage(
+    tree: Dict[str, Any],
+    dkms_root: str = "/var/lib/dkms",
+    modules_root: str = "/lib/modules",
+    src_root: str = "/usr/src",
+    dry_run: bool = False,
+    cache_root: Optional[str] = None,
+    lock_root: str = BUILD_LOCK_DIR,
+) -> Dict[str, Any]:
+    """Remove the garbage and report what was (or would be) reclaimed."""
+    if dry_run or not cache_root:
+        items = garbage(tree, dkms_root, modules_root, src_root, cache_root)
+    else:
+        with build_locks(lock_root, cache_kernels(cache_root)) as locked:
+            items = garbage(tree, dkms_root, modules_root, src_root, cache_root, locked)
+            _remove(items)
+    if not dry_run:
+        if not cache_root:
+            _remove(items)
+        for kernel, state in tree["kernels"].items():
+            if not state["present"]:
+                _prune_empty(kernel, modules_root)
+    return {
+        "removed": items,
+        "reclaimed_bytes": sum(item["bytes"] for item in items),
+        "dry_run": dry_run,
+    }
+
+
+def human_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return "%.0f %s" % (size, unit) if unit == "B" else "%.1f %s" % (size, unit)
+        size /= 1024.0
+    return "%.1f GiB" % size
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="acer-battery-dkms", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument(
+        "--version", required=True, help="DKMS version the role installs"
+    )
+    parser.add_argument("--root", default="", help="filesystem root (for tests)")
+    parser.add_argument(
+        "--keep",
+        action="append",
+        default=[],
+        metavar="KVER",
+        help="kernel that always counts as present (default: the running kernel)",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    state_parser = sub.add_parser("state", help="print the per-kernel state")
+    state_parser.add_argument("--kernel", help="only this kernel")
+    state_parser.add_argument("--json", action="store_true")
+    gc_parser = sub.add_parser("gc", help="remove builds and modules nobody uses")
+    gc_parser.add_argument("--dry-run", action="store_true")
+    gc_parser.add_argument("--json", action="store_true")
+    gc_parser.add_argument(
+        "--cache-dir", help="module cache of build-cache.sh to collect as well"
+    )
+    args = parser.parse_args(argv)
+
+    root = args.root.rstrip("/")
+    dkms_root, modules_root = root + "/var/lib/dkms", root + "/lib/modules"
+    tree = read_tree(
+        args.version, dkms_root, modules_root, args.keep or [os.uname().release]
+    )
+
+    if args.command == "state":
+        kernels = tree["kernels"]
+        if args.kernel:
+            kernels = {
+                args.kernel: kernels.get(args.kernel)
+                or {
+                    "present": kernel_present(args.kernel, modules_root),
+                    "built": False,
+                    "installed": None,
+                    "modules": [],
+                }
+            }
+        if args.json:
+            print(json.dumps(dict(tree, kernels=kernels), indent=2, sort_keys=True))
+            return 0
+        # kernel, present, added, built, DKMS-installed version, installed module
+        for kernel, state in kernels.items():
+            print(
+                "\t".join(
+                    [
+                        kernel,
+                        str(int(state["present"])),
+                        str(int(tree["added"])),
+                        str(int(state["built"])),
+                        state["installed"] or "-",
+                        state["modules"][0] if state["modules"] else "-",
+                    ]
+                )
+            )
+        return 0
+
+    result = collect_garbage(
+        tree,
+        dkms_root,
+        modules_root,
+        root + "/usr/src",
+        dry_run=args.dry_run,
+        cache_root=args.cache_dir,
+        lock_root=root + BUILD_LOCK_DIR,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return 0
+    verb = "Would remove" if args.dry_run else "Removed"
+    for item in result["removed"]:
+        print(
+            "%s %s (%s, %s)"
+            % (verb, item["path"], item["reason"], human_size(item["bytes"]))
+        )
+    print(
+        "%s %d item(s), %s"
+        % (
+            "Reclaimable:" if args.dry_run else "Reclaimed:",
+            len(result["removed"]),
+            human_size(result["reclaimed_bytes"]),
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Shared fixtures for the acer_battery tests."""
+
+from typing import Any, Callable, Dict, Iterator, List
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+
+from fake_system import FakeSystem, PlaybookRunner, Scenario
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: List[pytest.Item]
+) -> None:
+    """Skip the tests that converge the role more than once unless asked for."""
+    if os.environ.get("ACER_BATTERY_SLOW_TESTS") == "1":
+        return
+    skip = pytest.mark.skip(reason="set ACER_BATTERY_SLOW_TESTS=1 to run slow tests")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+def create_git_repo(repo_path: Path) -> Path:
+    """Create a mock git repository for testing."""
+    # Create working repository
+    repo_path.mkdir(parents=True)
+
+    # Initialize git repo with master branch
+    subprocess.run(
+        ["git", "init", "--initial-branch=master"],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+    )
+
+    # Configure git
+    subprocess.run(
+        ["git", "config", "user.email", "test@example.com"],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+    )
+    subprocess.run(
+        ["git", "config", "user.name", "Test User"],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+    )
+
+    # Create dummy files
+    (repo_path / "Makefile").write_text("obj-m += acer-wmi-battery.o\n")
+    (repo_path / "acer-wmi-battery.c").write_text(
+        '#include <linux/module.h>\n\nMODULE_LICENSE("GPL");\n'
+    )
+
+    # Add and commit files
+    subprocess.run(
+        ["git", "add", "."],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+    )
+    subprocess.run(
+        ["git", "commit", "-m", "Initial commit"],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+    )
+
+    # Create a 'main' branch so tests can use the role default version.
+    subprocess.run(
+        ["git", "checkout", "-b", "main"],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+    )
+
+    return repo_path
+
+
+def create_fake_system(root: Path) -> FakeSystem:
+    """A fake root with the running kernel installed."""
+    system = FakeSystem(root)
+    system.add_kernel(platform.release())
+    return system
+
+
+def fake_role_vars(system: FakeSystem, repo: Path) -> Dict[str, Any]:
+    """Extra vars that point tests/test.yml at a fake system."""
+    return {
+        "acer_battery_root": str(system.root),
+        "acer_battery_require_root": False,
+        "acer_battery_package_manager": "dnf",
+        "acer_battery_repo_url": str(repo),
+        "ansible_become": False,
+        "ansible_python_interpreter": sys.executable,
+    }
+
+
+@pytest.fixture
+def mock_git_repo(tmp_path: Path) -> Iterator[Path]:
+    """Create a mock git repository for testing."""
+    repo_path = create_git_repo(tmp_path / "acer-wmi-battery")
+
+    yield repo_path
+
+    # Cleanup
+    shutil.rmtree(repo_path)
+
+
+@pytest.fixture(scope="session")
+def playbook_runner() -> PlaybookRunner:
+    """Playbook runner for tests that put the fake system on the environment."""
+    return PlaybookRunner()
+
+
+@pytest.fixture
+def fake_system(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> FakeSystem:
+    """A per-test fake root with the stub binaries first on PATH."""
+    system = create_fake_system(tmp_path / "root")
+    for key, value in system.env.items():
+        monkeypatch.setenv(key, value)
+    return system
+
+
+@pytest.fixture
+def role_vars(fake_system: FakeSystem, mock_git_repo: Path) -> Dict[str, Any]:
+    """Extra vars that point tests/test.yml at the fake system."""
+    return fake_role_vars(fake_system, mock_git_repo)
+
+
+@pytest.fixture(scope="module")
+def new_scenario(
+    tmp_path_factory: pytest.TempPathFactory, playbook_runner: PlaybookRunner
+) -> Callable[..., Scenario]:
+    """Factory for scenarios shared by the tests of a module.
+
+    Each scenario gets its own fake root and git repository; extra keyword
+    arguments are added to its role vars.
+    """
+
+    def make(**extra_vars: Any) -> Scenario:
+        base = tmp_path_factory.mktemp("scenario")
+        system = create_fake_system(base / "root")
+        repo = create_git_repo(base / "acer-wmi-battery")
+        role_vars = dict(fake_role_vars(system, repo), **extra_vars)
+        return Scenario(system, role_vars, playbook_runner)
+
+    return make
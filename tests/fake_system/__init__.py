@@ -0,0 +1,258 @@
+"""Hermetic fake system for converging the role for real in tests.
+
+The stubs in ``bin/`` (dkms, modprobe, modinfo, depmod, lsmod, mokutil,
+journalctl, logger, rpm, dnf, openssl, sign-file, systemctl, udevadm) are put
+first on PATH and work inside a temporary root (``ACER_BATTERY_FAKE_ROOT``).
+The role is pointed at the same root with ``acer_battery_root``, so nothing
+outside it is touched.
+
+Playbooks run in-process through ``PlaybookRunner``: Ansible is set up once
+per (xdist worker) process and each run only pays for the play itself. A
+converge still takes a while, so a ``Scenario`` converges one fake system once
+and the tests of a module share it; tests that change the system restore it
+from a snapshot taken after the converge.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import signal
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ansible import context
+from ansible.cli.playbook import PlaybookCLI
+from ansible.executor.playbook_executor import PlaybookExecutor
+from ansible.inventory.manager import InventoryManager
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import (
+    add_all_plugin_dirs,
+    callback_loader,
+    init_plugin_loader,
+)
+from ansible.utils.context_objects import CLIArgs
+from ansible.vars.manager import VariableManager
+
+BIN_DIR = Path(__file__).resolve().parent / "bin"
+CALLBACK_DIR = Path(__file__).resolve().parent / "callback_plugins"
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+@dataclass
+class FakeSystem:
+    """A temporary root plus the environment the stubs need."""
+
+    root: Path
+
+    def __post_init__(self) -> None:
+        # The directories every real system already has.
+        for path in (
+            "lib/modules",
+            "usr/src",
+            "usr/local/bin",
+            "etc/systemd/system",
+            "etc/udev/rules.d",
+            "var/lib/dkms",
+            "var/cache",
+            "var/log",
+            "run",
+        ):
+            (self.root / path).mkdir(parents=True, exist_ok=True)
+
+    @property
+    def env(self) -> Dict[str, str]:
+        return {
+            "ACER_BATTERY_FAKE_ROOT": str(self.root),
+            "PATH": "%s:%s" % (BIN_DIR, os.environ.get("PATH", "")),
+        }
+
+    def add_kernel(self, kernel: str, headers: bool = True) -> Path:
+        """Install /lib/modules/<kernel>, with its build dir when it has headers."""
+        modules = self.root / "lib" / "modules" / kernel
+        modules.mkdir(parents=True, exist_ok=True)
+        (modules / "modules.order").touch()
+        if headers:
+            sign_file = modules / "build" / "scripts" / "sign-file"
+            sign_file.parent.mkdir(parents=True, exist_ok=True)
+            sign_file.write_text('#!/bin/bash\nexec "%s/sign-file" "$@"\n' % BIN_DIR)
+            sign_file.chmod(0o755)
+        return modules
+
+    def calls(self, program: Optional[str] = None) -> List[str]:
+        """Command lines the stubs were invoked with, optionally for one program."""
+        log = self.root / "var" / "log" / "fake-system.log"
+        lines = log.read_text().splitlines() if log.exists() else []
+        if program is None:
+            return lines
+        return [line for line in lines if line.split(" ", 1)[0] == program]
+
+    def journal(self) -> List[Dict[str, str]]:
+        """Entries sent to journald through the fake logger, as field dicts."""
+        journal = self.root / "run" / "fake-system" / "journal"
+        text = journal.read_text() if journal.exists() else ""
+        return [
+            dict(line.split("=", 1) for line in block.splitlines() if "=" in line)
+            for block in text.split("\n\n")
+            if block.strip()
+        ]
+
+    def loaded(self) -> List[str]:
+        """Modules loaded through the fake modprobe."""
+        loaded = self.root / "run" / "fake-system" / "loaded"
+        return sorted(p.name for p in loaded.iterdir()) if loaded.exists() else []
+
+    @property
+    def _snapshot(self) -> Path:
+        return self.root.with_name(self.root.name + ".snapshot")
+
+    def snapshot(self) -> None:
+        """Copy the root aside, so ``restore`` can bring this state back."""
+        shutil.rmtree(self._snapshot, ignore_errors=True)
+        shutil.copytree(self.root, self._snapshot, symlinks=True)
+
+    def restore(self) -> None:
+        """Put the root back the way the last ``snapshot`` found it."""
+        shutil.rmtree(self.root)
+        shutil.copytree(self._snapshot, self.root, symlinks=True)
+
+
+@dataclass
+class RunResult:
+    """Outcome of one playbook run."""
+
+    rc: int
+    stats: Dict[str, int]
+    tasks: List[Dict[str, Any]] = field(default_factory=list)
+    # Stub calls made during the run, when it ran through a Scenario.
+    calls: List[str] = field(default_factory=list)
+
+    def changed_tasks(self) -> List[str]:
+        return [t["name"] for t in self.tasks if t["status"] == "changed"]
+
+    def failed_tasks(self) -> List[str]:
+        return [
+            "%s: %s" % (t["name"], t["msg"])
+            for t in self.tasks
+            if t["status"] == "failed"
+        ]
+
+
+class _RunVariables(VariableManager):
+    """Variables of one run, with its own extra vars and check mode.
+
+    ``load_extra_vars`` and ``load_options_vars`` read the command line only
+    once per process, so both are set here from the run's options instead.
+    """
+
+    def __init__(self, loader: Any, inventory: Any, extra_vars: Dict[str, Any]) -> None:
+        super().__init__(loader=loader, inventory=inventory)
+        self._extra_vars = loader.load(json.dumps(extra_vars))
+        self._options_vars = dict(
+            self._options_vars,  # type: ignore[has-type]
+            ansible_check_mode=context.CLIARGS["check"],
+        )
+
+
+class PlaybookRunner:
+    """Runs playbooks in this process and records per-task results.
+
+    The command line options, plugin loader and data loader are set up on the
+    first run and shared by all later ones, so a run only pays for its play.
+    Each run gets its own inventory, variables and task queue: ``group_by``
+    and ``add_host`` results are kept by an inventory across refreshes.
+    """
+
+    def __init__(self, inventory: str = "tests/inventory") -> None:
+        self.inventory = str(REPO_ROOT / inventory)
+        self._options: Optional[Dict[str, Any]] = None
+        self._loader: Any = None
+
+    def _setup(self) -> Dict[str, Any]:
+        if self._options is None:
+            cli = PlaybookCLI(["ansible-playbook", "-i", self.inventory, "playbook"])
+            cli.parse()
+            init_plugin_loader([])
+            callback_loader.add_directory(str(CALLBACK_DIR))
+            self._options = dict(context.CLIARGS)
+            self._loader = DataLoader()
+        return self._options
+
+    def run(
+        self,
+        playbook: str,
+        extra_vars: Optional[Dict[str, Any]] = None,
+        check: bool = False,
+        syntax: bool = False,
+        env: Optional[Dict[str, str]] = None,
+    ) -> RunResult:
+        path = str(REPO_ROOT / playbook)
+        options = dict(self._setup(), args=(path,), check=check, syntax=syntax)
+        add_all_plugin_dirs(os.path.dirname(path))
+        saved_args = context.CLIARGS
+        saved_env = dict(os.environ)
+        saved_signals = {
+            s: signal.getsignal(s) for s in (signal.SIGINT, signal.SIGTERM)
+        }
+        with tempfile.NamedTemporaryFile(prefix="fake-system-tasks-") as report:
+            os.environ.update(env or {}, FAKE_SYSTEM_TASKS_PATH=report.name)
+            context.CLIARGS = CLIArgs(options)
+            try:
+                inventory = InventoryManager(self._loader, sources=[self.inventory])
+                executor = PlaybookExecutor(
+                    playbooks=[path],
+                    inventory=inventory,
+                    variable_manager=_RunVariables(
+                        self._loader, inventory, extra_vars or {}
+                    ),
+                    loader=self._loader,
+                    passwords={},
+                )
+                rc = executor.run()
+            finally:
+                context.CLIARGS = saved_args
+                os.environ.clear()
+                os.environ.update(saved_env)
+                for signum, handler in saved_signals.items():
+                    signal.signal(signum, handler)
+            lines = Path(report.name).read_text().splitlines()
+        entries = [json.loads(line) for line in lines]
+        return RunResult(
+            # --syntax-check returns the parsed playbooks instead of an rc.
+            rc=rc if isinstance(rc, int) else 0,
+            stats=next((e["stats"] for e in entries if "stats" in e), {}),
+            tasks=[e for e in entries if "stats" not in e],
+        )
+
+
+@dataclass
+class Scenario:
+    """A fake system converged once and shared by the tests of a module."""
+
+    system: FakeSystem
+    vars: Dict[str, Any]
+    runner: PlaybookRunner
+    results: Dict[str, RunResult] = field(default_factory=dict)
+
+    def run(
+        self,
+        name: str,
+        playbook: str = "tests/test.yml",
+        check: bool = False,
+        env: Optional[Dict[str, str]] = None,
+        **extra_vars: Any,
+    ) -> RunResult:
+        """Run a playbook against the system and keep the result as ``name``."""
+        calls = len(self.system.calls())
+        result = self.runner.run(
+            playbook,
+            dict(self.vars, **extra_vars),
+            check=check,
+            env=dict(self.system.env, **(env or {})),
+        )
+        result.calls = self.system.calls()[calls:]
+        self.results[name] = result
+        return result
@@ -0,0 +1,27 @@
+# Shared helpers for the fake-system stubs (sourced, not executed).
+#
+# Every stub works inside $ACER_BATTERY_FAKE_ROOT and appends its command line
+# to $ACER_BATTERY_FAKE_ROOT/var/log/fake-system.log so tests can assert on
+# what the role ran.
+
+set -u
+
+ROOT="${ACER_BATTERY_FAKE_ROOT:?ACER_BATTERY_FAKE_ROOT is not set}"
+STATE="$ROOT/run/fake-system"
+mkdir -p "$STATE" "$ROOT/var/log"
+echo "$(basename "$0") $*" >>"$ROOT/var/log/fake-system.log"
+
+# Path of the module installed for a kernel, if any.
+installed_module() {
+    find "$ROOT/lib/modules/$1" \( -name 'acer_wmi_battery.ko*' -o -name 'acer-wmi-battery.ko*' \) 2>/dev/null | head -1
+}
+
+# sysfs directory the driver exposes while loaded.
+WMI_DIR="$ROOT/sys/bus/wmi/drivers/acer-wmi-battery"
+
+# The real program of the same name, found on PATH after the stubs.
+real_command() {
+    local stubs
+    stubs="$(cd "$(dirname "$0")" && pwd)"
+    PATH="${PATH//$stubs:/}" command -v "$1"
+}
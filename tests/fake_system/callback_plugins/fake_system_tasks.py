@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# MIT License (see LICENSE in the role repository)
+
+"""Task results of a fake system run, written as JSON lines."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = r"""
+---
+name: fake_system_tasks
+type: aggregate
+short_description: Record task results for the fake system tests
+description:
+  - Appends one JSON line per task result (name, status, message) and a last
+    line with the play recap, summed over all hosts.
+  - Loaded by the in-process playbook runner of the tests; it records nothing
+    unless I(path) is set.
+options:
+  path:
+    description: File the results are appended to.
+    env:
+      - name: FAKE_SYSTEM_TASKS_PATH
+"""
+
+
+class CallbackModule(CallbackBase):
+    """Append task results and the play recap to a JSON lines file."""
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "fake_system_tasks"
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        path = self.get_option("path")
+        if path:
+            with open(path, "a") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+    def _record(self, result: Any, status: str) -> None:
+        res = result._result
+        if status == "ok" and res.get("changed"):
+            status = "changed"
+        self._write(
+            {
+                "name": result._task.get_name(),
+                "status": status,
+                "msg": res.get("msg", ""),
+            }
+        )
+
+    def v2_runner_on_ok(self, result: Any) -> None:
+        self._record(result, "ok")
+
+    def v2_runner_on_failed(self, result: Any, ignore_errors: bool = False) -> None:
+        self._record(result, "ignored" if ignore_errors else "failed")
+
+    def v2_runner_on_skipped(self, result: Any) -> None:
+        self._record(result, "skipped")
+
+    def v2_runner_on_unreachable(self, result: Any) -> None:
+        self._record(result, "failed")
+
+    def v2_playbook_on_stats(self, stats: Any) -> None:
+        recap: Dict[str, int] = {}
+        for host in stats.processed:
+            for key, value in stats.summarize(host).items():
+                recap[key] = recap.get(key, 0) + value
+        self._write({"stats": recap})
@@ -0,0 +1,264 @@
+"""Test prebuilt module artifacts against the fake system.
+
+A builder converges in builder mode and publishes to a temporary directory;
+consumers converge in consumer mode and fetch from it through a ``file://``
+URL. The fallback tests publish an edited copy of the builder's manifest.
+The signed pair repeats this with signing forced on both hosts, each with its
+own MOK. Every scenario is a converge of its own, so the module only runs
+with ACER_BATTERY_SLOW_TESTS=1.
+"""
+
+import base64
+import hashlib
+import json
+import platform
+import shutil
+import struct
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from fake_system import RunResult, Scenario
+
+pytestmark = pytest.mark.slow
+
+KERNEL = platform.release()
+ROLE = "../roles/acer_battery : "
+
+
+def _status(result: RunResult, name: str) -> str:
+    return str([t["status"] for t in result.tasks if t["name"] == ROLE + name][-1])
+
+
+def _builds(result: RunResult) -> List[str]:
+    return [c for c in result.calls if c.startswith("dkms build")]
+
+
+def _mok(scenario: Scenario) -> bytes:
+    return (scenario.system.root / "var/lib/dkms/mok.pub").read_bytes()
+
+
+def _enroll(scenario: Scenario, certificate: bytes) -> None:
+    """Make certificate (PEM) the only entry of the consumer's MokListRT."""
+    body = certificate.split(b"-----BEGIN CERTIFICATE-----")[1]
+    der = base64.b64decode(b"".join(body.split(b"-----END")[0].split()))
+    entry = bytes(16) + der
+    x509 = uuid.UUID("a5c059a1-94e4-4aa7-87b5-ab155c2bf072").bytes_le
+    efivar = scenario.system.root / (
+        "sys/firmware/efi/efivars/MokListRT-605dab50-e046-4300-abb6-3dd810dd8b23"
+    )
+    efivar.parent.mkdir(parents=True, exist_ok=True)
+    efivar.write_bytes(
+        b"\x06\x00\x00\x00"
+        + x509
+        + struct.pack("<III", 28 + len(entry), 0, len(entry))
+        + entry
+    )
+
+
+def _published(builder: Scenario) -> Path:
+    return Path(builder.vars["acer_battery_artifact_publish_dir"]) / "main"
+
+
+def _edited_copy(
+    builder: Scenario, path: Path, edit: Callable[[Dict[str, Any]], None]
+) -> str:
+    """Copy the published artifacts to path with an edited manifest; return the URL."""
+    shutil.copytree(_published(builder), path / "main")
+    manifest_file = path / "main/manifest.json"
+    manifest = json.loads(manifest_file.read_text())
+    edit(manifest)
+    manifest_file.write_text(json.dumps(manifest))
+    return "file://%s" % path
+
+
+def _new_builder(
+    new_scenario: Callable[..., Scenario], publish_dir: Path, **extra_vars: Any
+) -> Scenario:
+    """A builder that published its module for the running kernel."""
+    scenario = new_scenario(
+        acer_battery_artifact_mode="builder",
+        acer_battery_artifact_publish_dir=str(publish_dir),
+        **extra_vars,
+    )
+    scenario.run("converge")
+    return scenario
+
+
+def _new_consumer(
+    new_scenario: Callable[..., Scenario], builder: Scenario, **extra_vars: Any
+) -> Scenario:
+    """A fresh consumer converged from the builder's artifacts, then rerun."""
+    scenario = new_scenario(
+        acer_battery_artifact_mode="consumer",
+        acer_battery_artifact_url="file://%s" % _published(builder).parent,
+        **extra_vars,
+    )
+    scenario.run("converge")
+    scenario.run("rerun")
+    scenario.system.snapshot()
+    return scenario
+
+
+@pytest.fixture(scope="module")
+def builder(
+    new_scenario: Callable[..., Scenario], tmp_path_factory: pytest.TempPathFactory
+) -> Scenario:
+    return _new_builder(new_scenario, tmp_path_factory.mktemp("artifacts"))
+
+
+@pytest.fixture(scope="module")
+def consumer(new_scenario: Callable[..., Scenario], builder: Scenario) -> Scenario:
+    return _new_consumer(new_scenario, builder)
+
+
+@pytest.fixture(scope="module")
+def signed_builder(
+    new_scenario: Callable[..., Scenario], tmp_path_factory: pytest.TempPathFactory
+) -> Scenario:
+    return _new_builder(
+        new_scenario,
+        tmp_path_factory.mktemp("signed-artifacts"),
+        acer_battery_force_signing=True,
+    )
+
+
+@pytest.fixture(scope="module")
+def signed_consumer(
+    new_scenario: Callable[..., Scenario], signed_builder: Scenario
+) -> Scenario:
+    return _new_consumer(new_scenario, signed_builder, acer_battery_force_signing=True)
+
+
+def test_builder_publishes_artifacts(builder: Scenario) -> None:
+    """The builder publishes the module and a manifest with its SHA-256 last."""
+    result = builder.results["converge"]
+    assert result.rc == 0, result.failed_tasks()
+    manifest = json.loads((_published(builder) / "manifest.json").read_text())
+    assert manifest["version"] == "main"
+    assert manifest["signer"] == "unsigned"
+    assert manifest["certificate"] is None
+    [module] = manifest["modules"]
+    assert module["kernel"] == KERNEL
+    assert module["file"] == KERNEL + "/acer_wmi_battery.ko"
+    published = (_published(builder) / module["file"]).read_bytes()
+    assert module["sha256"] == hashlib.sha256(published).hexdigest()
+    assert b"version=main" in published
+
+
+def test_consumer_installs_artifact(builder: Scenario, consumer: Scenario) -> None:
+    """A consumer installs the published module instead of building it."""
+    result = consumer.results["converge"]
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, "Install module artifact") == "changed"
+    assert _status(result, "Build and install module") == "skipped"
+    assert _builds(result) == []
+
+    consumer.system.restore()
+    module = consumer.system.root / "lib/modules" / KERNEL / "extra/acer_wmi_battery.ko"
+    published = _published(builder) / KERNEL / "acer_wmi_battery.ko"
+    assert module.read_bytes() == published.read_bytes()
+    assert consumer.system.loaded() == ["acer_wmi_battery"]
+
+
+def test_consumer_falls_back_on_bad_checksum(
+    builder: Scenario, consumer: Scenario, tmp_path: Path
+) -> None:
+    """An artifact that does not match its checksum is replaced by a local build."""
+
+    def corrupt(manifest: Dict[str, Any]) -> None:
+        manifest["modules"][0]["sha256"] = "0" * 64
+
+    consumer.system.restore()
+    url = _edited_copy(builder, tmp_path, corrupt)
+    result = consumer.run("bad-checksum", acer_battery_artifact_url=url)
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, "Fetch module artifact") == "failed"
+    assert _status(result, "Report artifact fetch failure") == "ok"
+    assert _builds(result)
+    assert consumer.system.loaded() == ["acer_wmi_battery"]
+
+
+def test_consumer_builds_locally_on_cache_miss(
+    builder: Scenario, consumer: Scenario, tmp_path: Path
+) -> None:
+    """Without an artifact for the running kernel the consumer builds locally."""
+
+    def other_kernel(manifest: Dict[str, Any]) -> None:
+        manifest["modules"][0]["kernel"] = "0.0.0-other"
+
+    consumer.system.restore()
+    url = _edited_copy(builder, tmp_path, other_kernel)
+    result = consumer.run("cache-miss", acer_battery_artifact_url=url)
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, "Install module artifact") == "skipped"
+    assert _builds(result)
+    assert consumer.system.loaded() == ["acer_wmi_battery"]
+
+
+def test_signed_consumer_verifies_builder_signature(
+    signed_builder: Scenario, signed_consumer: Scenario
+) -> None:
+    """A consumer with its own MOK checks an artifact hit against the builder's key."""
+    assert signed_builder.results["converge"].rc == 0
+    manifest = json.loads((_published(signed_builder) / "manifest.json").read_text())
+    assert manifest["certificate"] == "signer.pem"
+    certificate = (_published(signed_builder) / "signer.pem").read_bytes()
+    assert certificate == _mok(signed_builder)
+
+    result = signed_consumer.results["converge"]
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, "Install module artifact") == "changed"
+    assert _status(result, "Verify module signature") == "ok"
+    assert _builds(result) == []
+
+    signed_consumer.system.restore()
+    root = signed_consumer.system.root
+    assert _mok(signed_consumer) != certificate
+    assert (root / "var/lib/dkms/artifact-signer.pem").read_bytes() == certificate
+    drift = json.loads((root / "var/lib/acer-wmi-battery/drift.json").read_text())
+    assert drift["drifted"] is False, drift["reasons"]
+    rerun = signed_consumer.results["rerun"]
+    assert _status(rerun, "Install, build and load the module") == "skipped"
+
+
+def test_signed_consumer_rejects_unmatched_certificate(
+    signed_builder: Scenario, signed_consumer: Scenario, tmp_path: Path
+) -> None:
+    """A published certificate that did not sign the artifact means a local build."""
+    signed_consumer.system.restore()
+    url = _edited_copy(signed_builder, tmp_path, lambda manifest: None)
+    (tmp_path / "main/signer.pem").write_bytes(_mok(signed_consumer))
+    result = signed_consumer.run("other-certificate", acer_battery_artifact_url=url)
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, "Check module artifact signer certificate") == "failed"
+    assert _builds(result)
+    assert _status(result, "Verify module signature") == "ok"
+    root = signed_consumer.system.root
+    assert (root / "var/lib/dkms/artifact-signer.pem").read_bytes() == _mok(
+        signed_consumer
+    )
+
+
+def test_signed_consumer_builds_when_builder_key_not_enrolled(
+    signed_builder: Scenario, signed_consumer: Scenario, tmp_path: Path
+) -> None:
+    """An artifact whose signer is not enrolled would be rejected at boot."""
+    signed_consumer.system.restore()
+    _enroll(signed_consumer, _mok(signed_consumer))
+    url = _edited_copy(signed_builder, tmp_path, lambda manifest: None)
+    result = signed_consumer.run("not-enrolled", acer_battery_artifact_url=url)
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, "Verify module artifact signature") == "ok"
+    assert (
+        _status(result, "Reject module artifact that fails signature verification")
+        == "failed"
+    )
+    assert _builds(result)
+    assert _status(result, "Verify module signature") == "ok"
+    root = signed_consumer.system.root
+    assert (root / "var/lib/dkms/artifact-signer.pem").read_bytes() == _mok(
+        signed_consumer
+    )
@@ -0,0 +1,129 @@
+"""Benchmark harness: cold run and no-op rerun of tests/test.yml.
+
+The no-op rerun is held to the budget in benchmark_budget.json on every test
+run, against the fake system in ``fake_system``. The same check against the
+real system (DKMS, /lib/modules, systemd units) only runs when
+ACER_BATTERY_BENCHMARK=1 is set, as root on a test machine or VM:
+
+    sudo ACER_BATTERY_BENCHMARK=1 python -m pytest -m benchmark -s
+
+Timings and per-task profiles (from the acer_battery_profile callback) are
+written to ACER_BATTERY_BENCHMARK_RESULTS (default: the test's tmp dir).
+
+The budget is a measured no-op profile plus a small margin. To regenerate it,
+run the fake system benchmark a few times on an idle machine:
+
+    ACER_BATTERY_BENCHMARK_RESULTS=bench/ python -m pytest tests/test_benchmark.py
+
+and take noop.seconds of the slowest run plus about 50% (rounded up) and
+noop.totals.remote_executions as it is (it does not vary between runs) from
+bench/benchmark-fake-system.json. Update both whenever the role gains or loses
+tasks that run on a no-op rerun.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import pytest
+
+from fake_system import Scenario
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_FILE = ROOT / "tests" / "benchmark_budget.json"
+
+
+@pytest.fixture
+def results_dir(tmp_path: Path) -> Path:
+    path = Path(os.environ.get("ACER_BATTERY_BENCHMARK_RESULTS", tmp_path))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _run_profiled(
+    extra_vars: Dict[str, Any], env: Dict[str, str], report: Path
+) -> Dict[str, Any]:
+    """Run tests/test.yml with the profiling callback and return timings.
+
+    The playbook runs through ansible-playbook, so the timings include its
+    startup the way a user sees it.
+    """
+    env = dict(
+        os.environ,
+        ANSIBLE_CALLBACK_PLUGINS=str(ROOT / "callback_plugins"),
+        ANSIBLE_CALLBACKS_ENABLED="acer_battery_profile",
+        ACER_BATTERY_PROFILE_PATH=str(report),
+        **env,
+    )
+    start = time.monotonic()
+    result = subprocess.run(
+        ["ansible-playbook", "-i", "tests/inventory", "tests/test.yml"]
+        + ["-e", json.dumps(extra_vars)],
+        cwd=ROOT,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.monotonic() - start
+    assert result.returncode == 0, f"Playbook failed: {result.stdout}{result.stderr}"
+    profile = json.loads(report.read_text())
+    return {"seconds": round(elapsed, 2), "totals": profile["totals"]}
+
+
+def _check_budget(
+    results_dir: Path, name: str, cold: Dict[str, Any], noop: Dict[str, Any]
+) -> None:
+    """Record the timings and hold the no-op rerun to the stored budget."""
+    budget = json.loads(BUDGET_FILE.read_text())
+    summary = {"cold": cold, "noop": noop, "budget": budget}
+    (results_dir / f"benchmark-{name}.json").write_text(json.dumps(summary, indent=2))
+    print(json.dumps(summary, indent=2))
+
+    assert noop["seconds"] <= budget["noop_rerun_seconds"], (
+        f"No-op rerun took {noop['seconds']}s, "
+        f"budget is {budget['noop_rerun_seconds']}s"
+    )
+    assert (
+        noop["totals"]["remote_executions"] <= budget["noop_rerun_remote_executions"]
+    ), "No-op rerun ran more remote modules than budgeted"
+
+
+def test_noop_rerun_within_budget(
+    new_scenario: Callable[..., Scenario], results_dir: Path
+) -> None:
+    """A rerun with nothing to do must stay within the stored budget."""
+    scenario = new_scenario()
+    cold = _run_profiled(
+        scenario.vars,
+        scenario.system.env,
+        results_dir / "profile-fake-system-cold.json",
+    )
+    noop = _run_profiled(
+        scenario.vars,
+        scenario.system.env,
+        results_dir / "profile-fake-system-noop.json",
+    )
+    _check_budget(results_dir, "fake-system", cold, noop)
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(
+    os.environ.get("ACER_BATTERY_BENCHMARK") != "1",
+    reason="set ACER_BATTERY_BENCHMARK=1 to run the role benchmark",
+)
+def test_real_host_noop_rerun_within_budget(
+    mock_git_repo: Path, results_dir: Path
+) -> None:
+    """The same budget for a no-op rerun on the real system."""
+    extra_vars = {
+        "acer_battery_repo_url": str(mock_git_repo),
+        "ansible_python_interpreter": sys.executable,
+    }
+    cold = _run_profiled(extra_vars, {}, results_dir / "profile-real-host-cold.json")
+    noop = _run_profiled(extra_vars, {}, results_dir / "profile-real-host-noop.json")
+    _check_budget(results_dir, "real-host", cold, noop)
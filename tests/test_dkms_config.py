@@ -1,9 +1,32 @@
 """Tests for DKMS configuration and module loading."""
 
+import os
+import subprocess
 from pathlib import Path
+from typing import Any, Dict, List
+
+import jinja2
 import yaml
 
 
+def _template_dests(tasks: List[Dict[str, Any]]) -> List[str]:
+    """Destinations of the template tasks, resolved through the managed entries."""
+    with open("roles/acer_battery/vars/main.yml", "r") as f:
+        managed = yaml.safe_load(f)["acer_battery_managed_templates"]
+    entries = {
+        "{{ acer_battery_managed_templates.%s }}" % key: entry
+        for key, entry in managed.items()
+    }
+    dests = []
+    for task in tasks:
+        if task.get("ansible.builtin.template") is None:
+            continue
+        reference = (task.get("vars") or {}).get("managed")
+        references = [reference] if reference else task.get("loop") or []
+        dests += [entries[r]["dest"] for r in references if r in entries]
+    return dests
+
+
 def test_dkms_config_file_exists() -> None:
     """Test that DKMS configuration file exists."""
     with open("roles/acer_battery/templates/dkms.conf.j2", "r") as f:
@@ -16,7 +39,7 @@ def test_dkms_config_file_exists() -> None:
 
 def test_task_file_contains_dkms_config() -> None:
     """Test that main task file includes DKMS configuration."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         tasks_content = yaml.safe_load(f)
 
     # Find DKMS related tasks
@@ -38,27 +61,20 @@ def test_task_file_contains_dkms_config() -> None:
 
     dkms_config = dkms_config_tasks[0]
     assert "ansible.builtin.template" in dkms_config, "Should use template module"
-    assert dkms_config["ansible.builtin.template"]["dest"].endswith(
+    assert _template_dests([dkms_config])[0].endswith(
         "dkms.conf"
     ), "Should create dkms.conf file"
 
 
 def test_module_autoload_configuration() -> None:
     """Test that module autoload is configured correctly."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         tasks_content = yaml.safe_load(f)
 
-    template_tasks = [
-        task
-        for task in tasks_content
-        if isinstance(task, dict) and task.get("ansible.builtin.template") is not None
-    ]
-
     service_tasks = [
-        task
-        for task in template_tasks
-        if task["ansible.builtin.template"].get("dest")
-        == "/etc/systemd/system/acer-wmi-battery.service"
+        dest
+        for dest in _template_dests(tasks_content)
+        if dest == "{{ acer_battery_root }}/etc/systemd/system/acer-wmi-battery.service"
     ]
     assert len(service_tasks) == 1, "Should install systemd service"
 
@@ -72,7 +88,7 @@ def test_module_autoload_configuration() -> None:
         task
         for task in file_tasks
         if task["ansible.builtin.file"].get("path")
-        == "/etc/modules-load.d/acer-wmi-battery.conf"
+        == "{{ acer_battery_root }}/etc/modules-load.d/acer-wmi-battery.conf"
         and task["ansible.builtin.file"].get("state") == "absent"
     ]
     assert (
@@ -89,6 +105,52 @@ def test_dkms_make_passes_kernelrelease() -> None:
     assert "${kernelver}" in content, "Should use DKMS kernelver variable"
 
 
+def test_ccache_build_mode(tmp_path: Path) -> None:
+    """With ccache enabled the kbuild compiler is wrapped and the build runs in parallel."""
+    kdir = tmp_path / "build"
+    kdir.mkdir()
+    (kdir / ".config").write_text("CONFIG_CC_IS_GCC=y\n")
+    (kdir / "Makefile").write_text(
+        'modules:\n\t@echo "CC=$(CC) CCACHE_DIR=$$CCACHE_DIR BASE=$$CCACHE_BASEDIR"\n'
+    )
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "ccache").write_text('#!/bin/sh\nexec "$@"\n')
+    (bin_dir / "ccache").chmod(0o755)
+    env = dict(os.environ, PATH="%s:%s" % (bin_dir, os.environ["PATH"]))
+    template = jinja2.Template(
+        Path("roles/acer_battery/templates/Makefile.j2").read_text()
+    )
+
+    def build(**variables: object) -> str:
+        src = tmp_path / "src"
+        src.mkdir(exist_ok=True)
+        (src / "Makefile").write_text(template.render(**variables))
+        return subprocess.run(
+            ["make", "-s", "-C", str(src), "KDIR=%s" % kdir],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        ).stdout
+
+    cached = build(
+        acer_battery_ccache_enabled=True,
+        acer_battery_ccache_dir="/var/cache/acer-battery/ccache",
+        acer_battery_ccache_max_size="256M",
+    )
+    assert "CC=%s gcc" % (bin_dir / "ccache") in cached
+    assert "CCACHE_DIR=/var/cache/acer-battery/ccache" in cached
+    assert "BASE=%s" % kdir in cached
+    assert "ccache" not in build(acer_battery_ccache_enabled=False)
+
+    dkms_conf = jinja2.Template(
+        Path("roles/acer_battery/templates/dkms.conf.j2").read_text()
+    )
+    assert 'MAKE[0]="make -j$(nproc) ' in dkms_conf.render(acer_battery_build_jobs=0)
+    assert 'MAKE[0]="make -j4 ' in dkms_conf.render(acer_battery_build_jobs=4)
+
+
 def test_orphaned_modules_load_template_removed() -> None:
     """modules-load.conf.j2 should not exist (replaced by systemd service)."""
     path = Path("roles/acer_battery/templates/modules-load.conf.j2")
@@ -99,7 +161,7 @@ def test_orphaned_modules_load_template_removed() -> None:
 
 def test_no_hardcoded_version_in_load_module_task() -> None:
     """Load module task should use {{ acer_battery_version }}, not hardcoded 'main'."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         raw = f.read()
 
     # Find the "Load module" task block
@@ -121,7 +183,7 @@ def test_no_hardcoded_version_in_load_module_task() -> None:
 
 def test_module_check_uses_dynamic_find() -> None:
     """Module existence check should use find, not a hardcoded path."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         tasks = yaml.safe_load(f)
 
     locate_tasks = [
@@ -142,19 +204,120 @@ def test_module_check_uses_dynamic_find() -> None:
 
 def test_kernel_install_hook_is_installed() -> None:
     """Test that a kernel-install hook is installed (Fedora/RHEL kernel updates)."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         tasks_content = yaml.safe_load(f)
 
-    template_tasks = [
-        task
-        for task in tasks_content
-        if isinstance(task, dict) and task.get("ansible.builtin.template") is not None
-    ]
-
     kernel_install_tasks = [
-        task
-        for task in template_tasks
-        if task["ansible.builtin.template"].get("dest")
-        == "/etc/kernel/install.d/90-acer-wmi-battery.install"
+        dest
+        for dest in _template_dests(tasks_content)
+        if dest
+        == "{{ acer_battery_root }}/etc/kernel/install.d/90-acer-wmi-battery.install"
     ]
     assert len(kernel_install_tasks) == 1, "Should install kernel-install hook"
+
+
+def test_rebuild_call_sites_use_build_cache() -> None:
+    """Rebuild paths should go through the build cache instead of calling dkms build directly."""
+    call_sites = [
+        "roles/acer_battery/handlers/main.yml",
+        "roles/acer_battery/templates/acer-wmi-battery-rebuild.service.j2",
+        "roles/acer_battery/templates/scripts/build-queue.sh.j2",
+        "roles/acer_battery/tasks/artifact-builder.yml",
+    ]
+    for path in call_sites:
+        content = Path(path).read_text()
+        assert "acer-battery-rebuild" in content, f"{path} should use the rebuild helper"
+        assert "dkms build" not in content, f"{path} should not call dkms build directly"
+
+    helper = Path("roles/acer_battery/templates/scripts/rebuild.sh.j2").read_text()
+    assert "build-cache.sh" in helper and "ensure" in helper, (
+        "The rebuild helper should use the build cache"
+    )
+    assert "dkms build" not in helper
+
+    for path in (
+        "roles/acer_battery/templates/kernel-install.j2",
+        "roles/acer_battery/templates/kernel-postinst.j2",
+    ):
+        assert "dkms build" not in Path(path).read_text(), (
+            f"{path} should not call dkms build directly"
+        )
+
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
+        tasks = yaml.safe_load(f)
+    build_tasks = [
+        t for t in tasks
+        if isinstance(t, dict) and t.get("name") == "Build and install module"
+    ]
+    assert len(build_tasks) == 1
+    assert "acer-battery-rebuild" in build_tasks[0]["ansible.builtin.command"]["cmd"]
+
+
+def test_build_cache_key_inputs() -> None:
+    """Cache key should cover version, commit, kernel, rendered build files and signer."""
+    content = Path("roles/acer_battery/templates/scripts/build-cache.sh.j2").read_text()
+    for marker in ("version=", "commit=", "kernel=", "dkms.conf=", "Makefile=", "signer="):
+        assert marker in content, f"Cache key should include {marker}"
+    assert "{{ acer_battery_cache_dir }}" in content
+    assert "$MODULES_DIR/$KERNEL_VERSION/extra/" in content, (
+        "Cache hits should install straight into the kernel's extra/ directory"
+    )
+
+
+def test_kernel_hooks_use_build_queue() -> None:
+    """Kernel hooks should hand kernels to the locked build queue instead of building inline."""
+    for path in (
+        "roles/acer_battery/templates/kernel-install.j2",
+        "roles/acer_battery/templates/kernel-postinst.j2",
+    ):
+        content = Path(path).read_text()
+        assert "build-queue.sh submit" in content, f"{path} should submit to the build queue"
+
+    queue = Path("roles/acer_battery/templates/scripts/build-queue.sh.j2").read_text()
+    assert "flock -n" in queue, "Queue should deduplicate kernels with a lock"
+    assert "{{ acer_battery_build_queue_jobs }}" in queue, "Queue should be bounded"
+    assert "check" in queue, "Current kernels should be skipped"
+    assert "{{ acer_battery_build_queue_max_attempts }}" in queue, "Retries should be limited"
+
+    watcher = Path("roles/acer_battery/templates/acer-wmi-battery-build-queue.path.j2").read_text()
+    assert "Unit=acer-wmi-battery-build-queue.service" in watcher
+    service = Path("roles/acer_battery/templates/acer-wmi-battery-build-queue.service.j2").read_text()
+    assert "build-queue.sh drain" in service, "Deferred kernels should be drained by a unit"
+
+    cache = Path("roles/acer_battery/templates/scripts/build-cache.sh.j2").read_text()
+    assert 'build-$KERNEL_VERSION.lock' in cache, "ensure should hold a per-kernel lock"
+    assert "dkms build --dkmstree" in cache, "Each kernel should build in its own DKMS tree"
+
+
+def test_boot_service_is_event_driven() -> None:
+    """The boot service should not sleep and should leave rebuilds to a deferred unit."""
+    service = Path("roles/acer_battery/templates/acer-wmi-battery.service.j2").read_text()
+    assert "sleep" not in service, "Boot service should not sleep unconditionally"
+    assert "Restart=on-failure" not in service, "Failures are handled by the deferred rebuild unit"
+    assert "boot-load.sh" in service
+
+    loader = Path("roles/acer_battery/templates/scripts/boot-load.sh.j2").read_text()
+    assert "vermagic" in loader, "Fast path should compare vermagic with the running kernel"
+    assert "--no-block start acer-wmi-battery-rebuild.service" in loader
+    assert "dkms" not in loader, "Boot path should never compile"
+
+    rule = Path("roles/acer_battery/templates/acer-wmi-battery.rules.j2").read_text()
+    assert "SYSTEMD_WANTS" in rule and "{{ acer_battery_wmi_guid }}" in rule
+
+
+def test_load_paths_use_vermagic_checker() -> None:
+    """Mismatch detection should read the module's vermagic, not grep the kernel log."""
+    call_sites = [
+        "roles/acer_battery/templates/scripts/rebuild.sh.j2",
+        "roles/acer_battery/templates/scripts/check-status.sh.j2",
+        "roles/acer_battery/templates/scripts/boot-load.sh.j2",
+    ]
+    for path in call_sites:
+        content = Path(path).read_text()
+        assert "vermagic-check.sh" in content, f"{path} should use the vermagic checker"
+        assert "version magic" not in content, f"{path} should not grep the kernel log"
+
+    checker = Path("roles/acer_battery/templates/scripts/vermagic-check.sh.j2").read_text()
+    for decompressor in ("xz -dc", "zstd -dc"):
+        assert decompressor in checker, f"Checker should handle {decompressor} modules"
+    assert "journalctl" not in checker and "dmesg" not in checker
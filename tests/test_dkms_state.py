@@ -0,0 +1,219 @@
+"""Tests for the DKMS tree reader and garbage collector (acer-battery-dkms)."""
+
+import fcntl
+import importlib.util
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+
+
+def _load() -> ModuleType:
+    """Import the reader from the role's module_utils."""
+    spec = importlib.util.spec_from_file_location(
+        "acer_battery_dkms",
+        Path("roles/acer_battery/module_utils/acer_battery_dkms.py"),
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _build(root: Path, version: str, kernel: str, installed: bool = True) -> None:
+    """Lay out a DKMS build the way dkms build/install do."""
+    tree = root / "var/lib/dkms/acer-wmi-battery"
+    (tree / version).mkdir(parents=True, exist_ok=True)
+    source = tree / version / "source"
+    if not source.is_symlink():
+        source.symlink_to(root / "usr/src" / ("acer-wmi-battery-" + version))
+    module = tree / version / kernel / "x86_64/module/acer_wmi_battery.ko.xz"
+    module.parent.mkdir(parents=True)
+    module.write_bytes(b"\xfd7zXZ\x00" + bytes(1000))
+    if installed:
+        (tree / ("kernel-%s-x86_64" % kernel)).symlink_to(
+            "%s/%s/x86_64" % (version, kernel)
+        )
+        extra = root / "lib/modules" / kernel / "extra"
+        extra.mkdir(parents=True, exist_ok=True)
+        (extra / "acer_wmi_battery.ko.xz").write_bytes(bytes(2000))
+
+
+@pytest.fixture
+def root(tmp_path: Path) -> Path:
+    """Two installed kernels, one removed kernel and a superseded version."""
+    root = tmp_path / "root"
+    (root / "usr/src/acer-wmi-battery-main").mkdir(parents=True)
+    (root / "usr/src/acer-wmi-battery-0.1").mkdir(parents=True)
+    for kernel in ("6.8.0", "6.9.0"):
+        (root / "lib/modules" / kernel / "kernel").mkdir(parents=True)
+    _build(root, "main", "6.8.0")
+    _build(root, "main", "6.9.0")
+    _build(root, "main", "6.7.0")
+    _build(root, "0.1", "6.5.0", installed=False)
+    return root
+
+
+def test_read_tree(root: Path) -> None:
+    """Versions, builds, DKMS installs and kernel presence come from the layout."""
+    dkms = _load()
+    tree = dkms.read_tree("main", str(root / "var/lib/dkms"), str(root / "lib/modules"))
+
+    assert tree["versions"] == ["0.1", "main"]
+    assert tree["conflicting"] == ["0.1"]
+    assert tree["added"] is True
+    kernels = tree["kernels"]
+    assert sorted(kernels) == ["6.5.0", "6.7.0", "6.8.0", "6.9.0"]
+    assert kernels["6.9.0"]["present"] is True
+    assert kernels["6.9.0"]["built"] is True
+    assert kernels["6.9.0"]["installed"] == "main"
+    assert kernels["6.9.0"]["modules"][0].endswith("extra/acer_wmi_battery.ko.xz")
+    assert kernels["6.7.0"]["present"] is False
+    assert kernels["6.5.0"]["built"] is False
+    assert kernels["6.5.0"]["installed"] is None
+
+    kept = dkms.read_tree(
+        "main", str(root / "var/lib/dkms"), str(root / "lib/modules"), ["6.7.0"]
+    )
+    assert kept["kernels"]["6.7.0"]["present"] is True
+
+
+def test_collect_garbage(root: Path) -> None:
+    """Superseded versions and absent kernels are removed; a dry run only reports."""
+    dkms = _load()
+    paths = (
+        str(root / "var/lib/dkms"),
+        str(root / "lib/modules"),
+        str(root / "usr/src"),
+    )
+    tree = dkms.read_tree("main", *paths[:2])
+
+    dry = dkms.collect_garbage(tree, *paths, dry_run=True)
+    assert dry["dry_run"] is True
+    assert (root / "var/lib/dkms/acer-wmi-battery/0.1").exists()
+
+    result = dkms.collect_garbage(tree, *paths)
+    assert result["removed"] == dry["removed"]
+    assert {item["reason"] for item in result["removed"]} == {
+        "superseded version 0.1",
+        "kernel 6.7.0 no longer installed",
+    }
+    assert result["reclaimed_bytes"] >= 3 * 1000 + 2000
+
+    dkms_tree = root / "var/lib/dkms/acer-wmi-battery"
+    assert sorted(p.name for p in dkms_tree.iterdir()) == [
+        "kernel-6.8.0-x86_64",
+        "kernel-6.9.0-x86_64",
+        "main",
+    ]
+    assert sorted(p.name for p in (dkms_tree / "main").iterdir()) == [
+        "6.8.0",
+        "6.9.0",
+        "source",
+    ]
+    assert not (root / "usr/src/acer-wmi-battery-0.1").exists()
+    assert (root / "usr/src/acer-wmi-battery-main").exists()
+    assert not (root / "lib/modules/6.7.0").exists()
+    assert (root / "lib/modules/6.9.0/extra/acer_wmi_battery.ko.xz").exists()
+
+    again = dkms.collect_garbage(dkms.read_tree("main", *paths[:2]), *paths)
+    assert again["removed"] == []
+
+
+def _cache(root: Path, key: str, kernel: str) -> None:
+    """Store a module in the build-cache.sh cache the way store does."""
+    entry = root / "var/cache/acer-battery/modules" / key
+    entry.mkdir(parents=True)
+    (entry / "acer_wmi_battery.ko.xz").write_bytes(bytes(3000))
+    (entry / "kernel").write_text(kernel + "\n")
+
+
+def _activate(root: Path, kernel: str, current: str, previous: str = "") -> None:
+    active = root / "var/cache/acer-battery/active" / kernel
+    active.mkdir(parents=True)
+    (active / "current").write_text(current + " main\n")
+    if previous:
+        (active / "previous").write_text(previous + " 0.1\n")
+
+
+def test_collect_cache_garbage(root: Path) -> None:
+    """Only the active module of a present kernel and its rollback target stay."""
+    dkms = _load()
+    paths = (
+        str(root / "var/lib/dkms"),
+        str(root / "lib/modules"),
+        str(root / "usr/src"),
+    )
+    cache = root / "var/cache/acer-battery"
+    for key, kernel in [
+        ("a1", "6.9.0"),
+        ("a2", "6.9.0"),
+        ("a3", "6.9.0"),
+        ("b1", "6.7.0"),
+        ("c1", "6.8.0"),
+    ]:
+        _cache(root, key, kernel)
+    _activate(root, "6.9.0", "a3", "a2")
+    _activate(root, "6.7.0", "b1")
+    _activate(root, "6.8.0", "c1")
+    (cache / "modules/a4.tmp").mkdir()
+    locks = root / "run/acer-wmi-battery"
+    locks.mkdir(parents=True)
+    held = open(locks / "build-6.8.0.lock", "w")
+    fcntl.flock(held, fcntl.LOCK_EX)
+    _cache(root, "c0", "6.8.0")
+
+    tree = dkms.read_tree("main", *paths[:2])
+    kwargs = dict(cache_root=str(cache), lock_root=str(locks))
+    try:
+        dry = dkms.collect_garbage(tree, *paths, dry_run=True, **kwargs)
+        result = dkms.collect_garbage(tree, *paths, **kwargs)
+    finally:
+        held.close()
+
+    cached = [item for item in result["removed"] if item["path"].startswith(str(cache))]
+    assert {(Path(item["path"]).name, item["reason"]) for item in cached} == {
+        ("a1", "superseded module cache entry"),
+        ("b1", "kernel 6.7.0 no longer installed"),
+        ("6.7.0", "kernel 6.7.0 no longer installed"),
+    }
+    assert result["reclaimed_bytes"] >= sum(item["bytes"] for item in cached) > 6000
+    # The dry run does not lock, so it also reports the busy kernel's entry.
+    assert {item["path"] for item in dry["removed"]} == {
+        item["path"] for item in result["removed"]
+    } | {str(cache / "modules/c0")}
+    assert sorted(p.name for p in (cache / "modules").iterdir()) == [
+        "a2",
+        "a3",
+        "a4.tmp",
+        "c0",
+        "c1",
+    ]
+    assert sorted(p.name for p in (cache / "active").iterdir()) == ["6.8.0", "6.9.0"]
+
+    again = dkms.collect_garbage(dkms.read_tree("main", *paths[:2]), *paths, **kwargs)
+    assert [Path(item["path"]).name for item in again["removed"]] == ["c0"]
+
+
+def test_cli_state(root: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """state prints one tab-separated line per kernel for the shell scripts."""
+    dkms = _load()
+    args = ["--root", str(root), "--version", "main", "--keep", "6.9.0"]
+    assert dkms.main(args + ["state", "--kernel", "6.9.0"]) == 0
+    line = capsys.readouterr().out.strip().split("\t")
+    assert line[:5] == ["6.9.0", "1", "1", "1", "main"]
+    assert line[5].endswith("/lib/modules/6.9.0/extra/acer_wmi_battery.ko.xz")
+
+    assert dkms.main(args + ["state", "--kernel", "7.0.0"]) == 0
+    assert capsys.readouterr().out.strip().split("\t") == [
+        "7.0.0",
+        "0",
+        "1",
+        "0",
+        "-",
+        "-",
+    ]
+
+    assert dkms.main(args + ["gc", "--dry-run"]) == 0
+    assert "Reclaimable: " in capsys.readouterr().out
+    assert (root / "var/lib/dkms/acer-wmi-battery/0.1").exists()
@@ -0,0 +1,136 @@
+"""Tests for the acer-battery-drift local drift agent."""
+
+import importlib.util
+import json
+import os
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict
+
+import pytest
+
+KERNEL = "6.9.0"
+
+SIGCHECK_STUB = """import json, sys
+with open(%r, "a") as f:
+    f.write("run\\n")
+kernel = sys.argv[sys.argv.index("--kernel") + 1]
+print(json.dumps({"kernels": {kernel: {"status": "ok"}}}))
+"""
+
+
+def _load() -> ModuleType:
+    """Import the drift agent from the role's files directory."""
+    spec = importlib.util.spec_from_file_location(
+        "acer_battery_drift", Path("roles/acer_battery/files/acer_battery_drift.py")
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def root(tmp_path: Path) -> Path:
+    """A converged host: managed file, module, loaded driver and recorded policy."""
+    drift = _load()
+    root = tmp_path / "root"
+    status_script = root / "usr/local/bin/acer-battery-status"
+    status_script.parent.mkdir(parents=True)
+    status_script.write_text("#!/bin/bash\n")
+    module = root / "lib/modules" / KERNEL / "extra/acer_wmi_battery.ko.xz"
+    module.parent.mkdir(parents=True)
+    module.write_bytes(b"module")
+    wmi = root / "sys/bus/wmi/drivers/acer-wmi-battery"
+    wmi.mkdir(parents=True)
+    (wmi / "health_mode").write_text("1\n")
+    (root / "cert.pem").write_text("certificate\n")
+
+    manifest = {
+        "format": 1,
+        "inputs": {"signer": ""},
+        "files": {str(status_script): drift.file_digest(str(status_script))},
+    }
+    (root / "manifest.json").write_text(json.dumps(manifest))
+    (root / "policy.json").write_text(json.dumps({"health_mode": True}))
+    return root
+
+
+def _check(root: Path, previous: object = None, **kwargs: object) -> Dict[str, Any]:
+    drift = _load()
+    status: Dict[str, Any] = drift.check(
+        str(root / "manifest.json"),
+        str(root / "policy.json"),
+        previous,
+        str(root),
+        kernel=KERNEL,
+        **kwargs,
+    )
+    return status
+
+
+def test_drift_reasons(root: Path) -> None:
+    """Edited files, a reset health_mode and a missing driver or module are drift."""
+    status = _check(root)
+    assert status["drifted"] is False, status["reasons"]
+    assert status["health_mode"] is True
+    assert status["module"].endswith("/lib/modules/6.9.0/extra/acer_wmi_battery.ko.xz")
+
+    script = root / "usr/local/bin/acer-battery-status"
+    script.write_text("#!/bin/bash\n# local edit\n")
+    wmi = root / "sys/bus/wmi/drivers/acer-wmi-battery"
+    (wmi / "health_mode").write_text("0\n")
+    assert _check(root)["reasons"] == ["file %s" % script, "health_mode"]
+
+    (wmi / "health_mode").unlink()
+    assert _check(root)["reasons"][1:] == ["driver not loaded"]
+    (root / "lib/modules" / KERNEL / "extra/acer_wmi_battery.ko.xz").unlink()
+    assert _check(root)["reasons"][1:] == ["no module for kernel 6.9.0"]
+
+    (root / "manifest.json").unlink()
+    assert _check(root)["reasons"][0] == "no manifest"
+
+
+def test_signature_verdict_reused(root: Path, tmp_path: Path) -> None:
+    """sigcheck only runs again when the module or the certificate changes."""
+    drift = _load()
+    manifest = json.loads((root / "manifest.json").read_text())
+    manifest["inputs"]["signer"] = drift.file_digest(str(root / "cert.pem"))
+    (root / "manifest.json").write_text(json.dumps(manifest))
+    runs = tmp_path / "runs"
+    sigcheck = tmp_path / "sigcheck.py"
+    sigcheck.write_text(SIGCHECK_STUB % str(runs))
+    args = [
+        "--manifest",
+        str(root / "manifest.json"),
+        "--policy",
+        str(root / "policy.json"),
+        "--status-file",
+        str(root / "drift.json"),
+        "--cert",
+        str(root / "cert.pem"),
+        "--sigcheck",
+        str(sigcheck),
+        "--kernel",
+        KERNEL,
+        "--root",
+        str(root),
+    ]
+
+    first = _check(root, cert=str(root / "cert.pem"), sigcheck=str(sigcheck))
+    assert first["signature"]["status"] == "ok"
+    assert first["drifted"] is False
+    again = _check(root, first, cert=str(root / "cert.pem"), sigcheck=str(sigcheck))
+    assert again["signature"] == first["signature"]
+    assert runs.read_text().count("run") == 1
+
+    module = root / "lib/modules" / KERNEL / "extra/acer_wmi_battery.ko.xz"
+    os.utime(module, ns=(0, 0))
+    _check(root, again, cert=str(root / "cert.pem"), sigcheck=str(sigcheck))
+    assert runs.read_text().count("run") == 2
+
+    (root / "cert.pem").write_text("another certificate\n")
+    assert drift.main(args + ["--json"]) == 1
+    status = json.loads((root / "drift.json").read_text())
+    assert status["reasons"] == ["signing certificate"]
+    assert runs.read_text().count("run") == 3
@@ -0,0 +1,116 @@
+"""Tests for the acer_battery_facts module helpers."""
+
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+
+import yaml
+
+
+def _load(name: str, path: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location(name, Path(path))
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _load_facts_module() -> ModuleType:
+    """Import the role's acer_battery_facts module from its library path."""
+    # Ansible ships the role's module_utils with the module; do the same here.
+    sys.modules["ansible.module_utils.acer_battery_dkms"] = _load(
+        "acer_battery_dkms", "roles/acer_battery/module_utils/acer_battery_dkms.py"
+    )
+    return _load(
+        "acer_battery_facts", "roles/acer_battery/library/acer_battery_facts.py"
+    )
+
+
+def test_secure_boot_read_from_efivars(tmp_path: Path) -> None:
+    """SecureBoot state should come from the EFI variable value byte."""
+    facts = _load_facts_module()
+    efivars = tmp_path / "efivars"
+    efivars.mkdir()
+    var = efivars / facts.SECURE_BOOT_VAR
+
+    var.write_bytes(b"\x06\x00\x00\x00\x01")
+    assert facts.secure_boot_state(str(tmp_path)) == {
+        "enabled": True,
+        "source": "efivars",
+    }
+
+    var.write_bytes(b"\x06\x00\x00\x00\x00")
+    assert facts.secure_boot_state(str(tmp_path))["enabled"] is False
+
+    assert facts.secure_boot_state(str(tmp_path / "missing"))["source"] == "bios"
+
+
+def test_dkms_conflicting_versions(tmp_path: Path) -> None:
+    """Versions other than the configured one should be reported as conflicting."""
+    facts = _load_facts_module()
+    module_dir = tmp_path / "acer-wmi-battery"
+    (module_dir / "main").mkdir(parents=True)
+    (module_dir / "0.1").mkdir()
+    (module_dir / "original_module").mkdir()
+    (module_dir / "kernel-6.1-x86_64").symlink_to(module_dir / "main")
+
+    state = facts.dkms_state("main", str(tmp_path))
+    assert state["versions"] == ["0.1", "main"]
+    assert state["conflicting"] == ["0.1"]
+
+
+def test_find_module_and_format(tmp_path: Path) -> None:
+    """The module should be found anywhere in the kernel tree and identified by magic."""
+    facts = _load_facts_module()
+    extra = tmp_path / "6.1.0" / "updates" / "dkms"
+    extra.mkdir(parents=True)
+    (extra / "acer_wmi_battery.ko.xz").write_bytes(b"\xfd7zXZ\x00rest")
+
+    found = facts.find_module("6.1.0", str(tmp_path))
+    assert found["exists"] is True
+    assert found["path"].endswith("acer_wmi_battery.ko.xz")
+    assert found["format"] == "xz"
+
+    assert facts.find_module("6.2.0", str(tmp_path))["exists"] is False
+
+
+def test_build_index(tmp_path: Path) -> None:
+    """The latest hook build per kernel should come from the build index."""
+    facts = _load_facts_module()
+    index = tmp_path / "builds.tsv"
+    index.write_text(
+        "6.1.0\t2026-01-02T03:04:05+00:00\tbuild\tfailed\t5120\t/var/log/k.log\n"
+        "6.2.0\t2026-01-02T03:05:00+00:00\tdefer\tdeferred\t0\t/var/log/l.log\n"
+        "garbage line\n"
+    )
+
+    builds = facts.read_build_index(str(index))
+    assert sorted(builds) == ["6.1.0", "6.2.0"]
+    assert builds["6.1.0"]["result"] == "failed"
+    assert builds["6.1.0"]["duration_ms"] == 5120
+    assert builds["6.2.0"]["phase"] == "defer"
+    assert facts.read_build_index(str(tmp_path / "missing")) == {}
+
+
+def test_plays_rely_on_facts_module() -> None:
+    """Playbooks should skip full fact gathering in favor of acer_battery_facts."""
+    for playbook in ("site.yml", "tests/test.yml"):
+        with open(playbook, "r") as f:
+            plays = yaml.safe_load(f)
+        assert (
+            plays[0]["gather_facts"] is False
+        ), f"{playbook} should not gather all facts"
+
+    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+        tasks = yaml.safe_load(f)
+    assert (
+        "acer_battery_facts" in tasks[0]
+    ), "Facts should be gathered before anything else"
+
+    raw = "".join(
+        Path("roles/acer_battery/tasks", name).read_text()
+        for name in ("main.yml", "install.yml")
+    )
+    for probe in ("id -u", "getenforce", "mokutil --sb-state", "rpm -V", "dkms status"):
+        assert probe not in raw, f"'{probe}' should be covered by acer_battery_facts"
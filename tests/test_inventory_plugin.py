@@ -0,0 +1,112 @@
+"""Tests for the acer_battery inventory plugin (groups from the fact cache)."""
+
+import importlib.util
+import json
+import os
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict
+
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import inventory_loader
+
+PLUGINS = Path(__file__).resolve().parents[1] / "inventory_plugins"
+
+
+def _load() -> ModuleType:
+    """Import the plugin from inventory_plugins/."""
+    spec = importlib.util.spec_from_file_location(
+        "acer_battery_inventory", PLUGINS / "acer_battery.py"
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _facts(
+    version: str = "main", kernel: str = "6.9.0-1.fc40", **applied: Any
+) -> Dict[str, Any]:
+    """Cached facts of a host the role converged."""
+    return {
+        "ansible_kernel": kernel,
+        "acer_battery": {
+            "kernel": kernel,
+            "secure_boot": {"enabled": True},
+            "drift": None,
+        },
+        "acer_battery_applied": dict(
+            {
+                "version": version,
+                "kernel": kernel,
+                "loaded": True,
+                "signed": True,
+                "time": 100,
+            },
+            **applied,
+        ),
+    }
+
+
+def _groups(inventory: InventoryData, host: str) -> list:
+    return sorted(g.name for g in inventory.hosts[host].get_groups() if g.name != "all")
+
+
+def test_classify() -> None:
+    """needs_build covers version, kernel, load and post-run drift."""
+    module = _load()
+
+    groups, reasons = module.classify(_facts(), "main")
+    assert groups == ["by_kernel_6_9_0_1_fc40", "sb_enabled"]
+    assert reasons == []
+
+    facts = _facts(version="0.1", signed=False)
+    facts["ansible_kernel"] = "6.10.0"
+    groups, reasons = module.classify(facts, "main")
+    assert groups == ["by_kernel_6_10_0", "sb_enabled", "unsigned", "needs_build"]
+    assert reasons == ["version 0.1 applied", "applied on kernel 6.9.0-1.fc40"]
+
+    facts = _facts()
+    facts["acer_battery"]["drift"] = {
+        "drifted": True,
+        "checked_at": 50,
+        "reasons": ["x"],
+    }
+    assert module.classify(facts, "main")[1] == []
+    facts["acer_battery"]["drift"]["checked_at"] = 200
+    assert module.classify(facts, "main")[1] == ["drift: x"]
+    assert module.classify({"ansible_kernel": "6.9.0"}, "main")[1] == [
+        "role not applied"
+    ]
+
+
+def test_inventory_from_jsonfile_cache(tmp_path: Path) -> None:
+    """Hosts are grouped offline from both cache layouts, with stale entries expired."""
+    cache = tmp_path / "facts"
+    cache.mkdir()
+    (cache / "laptop1").write_text(json.dumps(_facts()))
+    wrapped = {"__payload__": json.dumps(_facts(version="0.1"))}
+    (cache / "s1_laptop2").write_text(json.dumps(wrapped))
+    (cache / "laptop3").write_text(json.dumps(_facts()))
+    os.utime(cache / "laptop3", (0, 0))
+    config = tmp_path / "fleet.acer_battery.yml"
+    config.write_text("plugin: acer_battery\nfact_cache: %s\nttl: 3600\n" % cache)
+
+    inventory_loader.add_directory(str(PLUGINS))
+    plugin = inventory_loader.get("acer_battery")
+    assert plugin.verify_file(str(config))
+    inventory = InventoryData()
+    inventory.add_host("laptop4")
+    plugin.parse(inventory, DataLoader(), str(config), cache=False)
+
+    assert _groups(inventory, "laptop1") == [
+        "acer_battery_by_kernel_6_9_0_1_fc40",
+        "acer_battery_sb_enabled",
+    ]
+    assert "acer_battery_needs_build" in _groups(inventory, "laptop2")
+    assert inventory.hosts["laptop2"].vars["acer_battery_inventory_reasons"] == [
+        "version 0.1 applied"
+    ]
+    assert _groups(inventory, "laptop3") == ["acer_battery_stale"]
+    assert _groups(inventory, "laptop4") == ["acer_battery_unknown"]
@@ -0,0 +1,109 @@
+"""Tests for the converged-state manifest module and its inputs."""
+
+import importlib.util
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict
+
+import yaml
+
+
+def _load() -> ModuleType:
+    """Import the manifest module from its path in the repository."""
+    spec = importlib.util.spec_from_file_location(
+        "acer_battery_manifest",
+        Path("roles/acer_battery/library/acer_battery_manifest.py"),
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _manifest(tmp_path: Path, **inputs: Any) -> Dict[str, Any]:
+    installed = tmp_path / "acer-battery-status"
+    return {
+        "format": 1,
+        "inputs": dict(
+            {"kernel": "6.9.0", "templates": {"a.j2": "1", "b.j2": "2"}}, **inputs
+        ),
+        "files": {str(installed): "0" * 64},
+    }
+
+
+def test_manifest_roundtrip_and_differences(tmp_path: Path) -> None:
+    """A written manifest should match itself and report every kind of drift."""
+    manifest = _load()
+    installed = tmp_path / "acer-battery-status"
+    installed.write_text("#!/bin/bash\n")
+    current = _manifest(tmp_path)
+    current["files"][str(installed)] = manifest.file_digest(str(installed))
+
+    path = tmp_path / "ANSIBLE-MANAGED.json"
+    assert manifest.differences(manifest.load_manifest(str(path)), current) == [
+        "no manifest"
+    ]
+    manifest.write_manifest(str(path), current)
+    assert manifest.differences(manifest.load_manifest(str(path)), current) == []
+
+    changed = _manifest(tmp_path, kernel="6.10.0", templates={"a.j2": "1", "b.j2": "3"})
+    changed["files"][str(installed)] = None
+    assert manifest.differences(manifest.load_manifest(str(path)), changed) == [
+        "kernel",
+        "template b.j2",
+        "file %s" % installed,
+    ]
+
+
+def test_remote_commit() -> None:
+    """The upstream commit comes from the branch, or the peeled line of a tag."""
+    manifest = _load()
+    branch, tag, peeled = "a" * 40, "b" * 40, "c" * 40
+    listing = "%s\trefs/heads/main\n%s\trefs/tags/v1\n%s\trefs/tags/v1^{}\n" % (
+        branch,
+        tag,
+        peeled,
+    )
+    assert manifest.remote_commit(listing, "main") == branch
+    assert manifest.remote_commit(listing, "v1") == peeled
+    assert manifest.remote_commit(listing, "v2") == ""
+    assert manifest.remote_commit("", "d" * 40) == "d" * 40
+
+
+def test_managed_files_follow_install_tasks() -> None:
+    """Every template and copy the role installs is a declared managed entry."""
+    with open("roles/acer_battery/vars/main.yml", "r") as f:
+        role_vars = yaml.safe_load(f)
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
+        tasks = yaml.safe_load(f)
+    declared = {
+        "{{ acer_battery_managed_%s.%s }}" % (kind, key): entry
+        for kind in ("templates", "copies")
+        for key, entry in role_vars["acer_battery_managed_" + kind].items()
+    }
+    for reference, entry in declared.items():
+        assert set(entry) == {"src", "dest", "enabled"}, reference
+        directory = "templates" if "_templates." in reference else "files"
+        assert (Path("roles/acer_battery") / directory / entry["src"]).exists()
+
+    installed = []
+    for task in tasks:
+        for action in ("ansible.builtin.template", "ansible.builtin.copy"):
+            args = task.get(action) or {}
+            if not args or args.get("remote_src") or "content" in args:
+                continue
+            if "loop" in task:
+                assert (args["src"], args["dest"]) == (
+                    "{{ item.src }}",
+                    "{{ item.dest }}",
+                )
+                assert task["when"] == "item.enabled"
+                installed += task["loop"]
+            else:
+                assert (args["src"], args["dest"]) == (
+                    "{{ managed.src }}",
+                    "{{ managed.dest }}",
+                ), task["name"]
+                assert task["when"] == "managed.enabled"
+                installed.append(task["vars"]["managed"])
+    assert sorted(installed) == sorted(declared)
@@ -0,0 +1,78 @@
+"""Tests for the acer_battery_mode module and the fleet summary callback."""
+
+import importlib.util
+import json
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+from typing import Any, Dict
+
+import yaml
+
+
+def _load(path: str, name: str) -> ModuleType:
+    """Import a plugin module from its path in the repository."""
+    spec = importlib.util.spec_from_file_location(name, Path(path))
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_mode_helpers_read_and_write(tmp_path: Path) -> None:
+    """Attributes should round-trip through read_mode/write_mode."""
+    mode = _load("roles/acer_battery/library/acer_battery_mode.py", "acer_battery_mode")
+    (tmp_path / "health_mode").write_text("0\n")
+
+    dirs = [str(tmp_path / "missing"), str(tmp_path)]
+    assert mode.find_wmi_dir(dirs) == str(tmp_path)
+    assert mode.read_mode(str(tmp_path / "health_mode")) is False
+    assert mode.read_mode(str(tmp_path / "calibration_mode")) is None
+
+    mode.write_mode(str(tmp_path / "health_mode"), True)
+    assert mode.read_mode(str(tmp_path / "health_mode")) is True
+
+    policy = tmp_path / "state/policy.json"
+    mode.record_policy(str(policy), True)
+    assert json.loads(policy.read_text()) == {"health_mode": True}
+
+
+def _result(host: str, changed: bool, state: Dict[str, Any]) -> SimpleNamespace:
+    return SimpleNamespace(
+        _task=SimpleNamespace(action="acer_battery_mode"),
+        _host=SimpleNamespace(get_name=lambda: host),
+        _result={"changed": changed, "acer_battery_mode": state},
+    )
+
+
+def test_summary_callback_aggregates_hosts() -> None:
+    """The callback should count hosts per state and list failures."""
+    summary_mod = _load(
+        "callback_plugins/acer_battery_summary.py", "acer_battery_summary"
+    )
+    callback = summary_mod.CallbackModule()
+    on = {"health_mode": True, "calibration_mode": False, "changed_attributes": []}
+    changed = dict(on, changed_attributes=["health_mode"])
+    callback.v2_runner_on_ok(_result("a", True, changed))
+    callback.v2_runner_on_ok(_result("b", False, on))
+    failed = _result("c", False, {})
+    failed._result = {"msg": "not loaded"}
+    callback.v2_runner_on_failed(failed)
+
+    summary = callback.summary()
+    assert summary["hosts"] == 3
+    assert summary["status"] == {"changed": 1, "failed": 1, "unchanged": 1}
+    assert summary["health_mode"] == {"on": 2}
+    assert summary["failed"] == ["c"]
+
+
+def test_fleet_playbook_uses_free_strategy() -> None:
+    """battery-mode.yml should apply the policy in one free-strategy round."""
+    with open("battery-mode.yml", "r") as f:
+        play = yaml.safe_load(f)[0]
+    assert play["strategy"] == "free"
+    assert play["gather_facts"] is False
+    assert play["tasks"][0]["ansible.builtin.import_role"]["tasks_from"] == "mode.yml"
+
+    with open("roles/acer_battery/tasks/mode.yml", "r") as f:
+        tasks = yaml.safe_load(f)
+    assert "acer_battery_mode" in tasks[0]
@@ -39,30 +39,33 @@ def test_package_definitions() -> None:
         set(packages.keys()) >= required_distros
     ), "Should support all required distributions"
 
-    # Test common required packages
+    # Test common required packages; versioned headers come from the prefix map
+    prefixes = defaults["acer_battery_kernel_headers_prefix"]
     for distro, pkg_list in packages.items():
         assert "git" in pkg_list, f"{distro} should include git"
         assert "dkms" in pkg_list, f"{distro} should include dkms"
-        assert any(
+        assert prefixes.get(distro) or any(
             "header" in pkg.lower() for pkg in pkg_list
         ), f"{distro} should include kernel headers"
 
 
 def test_package_installation_task() -> None:
-    """Test that package definitions exist in defaults.
-
-    The role currently does not actively install packages (it prints a debug message),
-    so asserting specific package tasks would be brittle.
-    """
-    with open("roles/acer_battery/defaults/main.yml", "r") as f:
-        defaults = yaml.safe_load(f)
+    """Test that packages are installed in one task, before the manifest check."""
+    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+        tasks = yaml.safe_load(f)
 
-    assert "packages" in defaults, "Should define package mappings"
+    names = [task.get("name") for task in tasks]
+    install = tasks[names.index("Install required packages")]
+    assert "acer_battery_packages" in install
+    assert install["when"] == "acer_battery_manage_packages"
+    assert names.index("Install required packages") < names.index(
+        "Compute converged-state inputs"
+    )
 
 
 def test_repository_update_tasks() -> None:
     """Test that repository fetch tasks are configured correctly."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         tasks = yaml.safe_load(f)
 
     # Find git tasks
@@ -71,16 +74,34 @@ def test_repository_update_tasks() -> None:
         for task in tasks
         if isinstance(task, dict) and task.get("ansible.builtin.git") is not None
     ]
-    assert len(git_tasks) == 1, "Should have a clone task for git"
+    assert len(git_tasks) == 1, "Should have a single mirror fetch task for git"
 
     clone_task = git_tasks[0]
     assert clone_task["ansible.builtin.git"]["repo"] == "{{ acer_battery_repo_url }}"
-    assert clone_task["ansible.builtin.git"]["dest"] == "/tmp/acer-wmi-battery"
+    assert clone_task["ansible.builtin.git"]["dest"] == "{{ acer_battery_mirror_dir }}"
+    assert clone_task["ansible.builtin.git"]["bare"] is True
     assert (
         clone_task["ansible.builtin.git"]["version"] == "{{ acer_battery_version }}"
     )
 
 
+def test_source_sync_is_commit_aware() -> None:
+    """The source tree should only be rewritten when the resolved commit moves."""
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
+        tasks = yaml.safe_load(f)
+
+    raw = Path("roles/acer_battery/tasks/install.yml").read_text()
+    assert "/tmp/acer-wmi-battery" not in raw, "Should not re-clone into /tmp every run"
+    assert "rsync" not in raw, "Should not rsync the tree every run"
+
+    export_tasks = [
+        t for t in tasks
+        if isinstance(t, dict) and t.get("name") == "Export upstream commit to system directory"
+    ]
+    assert len(export_tasks) == 1
+    assert export_tasks[0]["when"] == "source_sync_needed"
+
+
 def test_handlers() -> None:
     """Test that handlers are configured correctly."""
     with open("roles/acer_battery/handlers/main.yml", "r") as f:
@@ -102,9 +123,9 @@ def test_handlers() -> None:
     ]
     assert len(load_handlers) == 1, "Should have load handler"
     load = load_handlers[0]
-    assert (
-        "ansible.builtin.shell" in load
-    ), "Load handler should use shell to modprobe and optionally rebuild"
+    assert "acer-battery-rebuild --load" in load["ansible.builtin.command"]["cmd"], (
+        "Load handler should load through the rebuild helper"
+    )
 
 
 def test_handlers_have_become() -> None:
@@ -124,7 +145,7 @@ def test_handlers_have_become() -> None:
 
 def test_no_dead_home_dir_task() -> None:
     """The unused 'Get real home directory' task should be removed."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         tasks = yaml.safe_load(f)
 
     home_dir_tasks = [
@@ -136,7 +157,7 @@ def test_no_dead_home_dir_task() -> None:
 
 def test_status_symlink_not_generic() -> None:
     """Status script symlink should use a namespaced name, not bare 'status'."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         tasks = yaml.safe_load(f)
 
     file_tasks = [
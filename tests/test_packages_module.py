@@ -0,0 +1,81 @@
+"""Tests for the acer_battery_packages module helpers."""
+
+import importlib.util
+import os
+from pathlib import Path
+from types import ModuleType
+from typing import Any, List, Tuple
+
+
+def _load() -> ModuleType:
+    """Import the packages module from its path in the repository."""
+    spec = importlib.util.spec_from_file_location(
+        "acer_battery_packages",
+        Path("roles/acer_battery/library/acer_battery_packages.py"),
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _Runner:
+    """Stands in for AnsibleModule.run_command with canned output."""
+
+    def __init__(self, out: str, err: str = "") -> None:
+        self.out, self.err = out, err
+        self.commands: List[List[str]] = []
+
+    def run_command(self, cmd: List[str], **_kwargs: Any) -> Tuple[int, str, str]:
+        self.commands.append(cmd)
+        return 1, self.out, self.err
+
+
+def test_snapshot_invalidated_by_database_change(tmp_path: Path) -> None:
+    """The snapshot answers only while the package database is unchanged."""
+    packages = _load()
+    status = tmp_path / "var/lib/dpkg/status"
+    status.parent.mkdir(parents=True)
+    status.write_text("Package: git\n")
+    signature = packages.database_signature("apt", str(tmp_path))
+    snapshot = {"manager": "apt", "signature": signature, "installed": ["dkms", "git"]}
+
+    assert packages.snapshot_satisfies(snapshot, "apt", signature, ["git"])
+    assert not packages.snapshot_satisfies(snapshot, "apt", signature, ["gcc"])
+    assert not packages.snapshot_satisfies(snapshot, "dnf", signature, ["git"])
+    assert not packages.snapshot_satisfies(None, "apt", signature, ["git"])
+
+    os.utime(status, (0, 0))
+    changed = packages.database_signature("apt", str(tmp_path))
+    assert not packages.snapshot_satisfies(snapshot, "apt", changed, ["git"])
+
+
+def test_missing_packages_parsing() -> None:
+    """Missing packages are read from the rpm, dpkg-query and pacman messages."""
+    packages = _load()
+    names = ["dkms", "git", "kernel-devel-6.9.0"]
+
+    rpm = _Runner(
+        "git-2.45-1.fc40.x86_64\npackage dkms is not installed\n"
+        "package kernel-devel-6.9.0 is not installed\n"
+    )
+    assert packages.missing_packages(rpm, "dnf", names) == [
+        "dkms",
+        "kernel-devel-6.9.0",
+    ]
+    assert rpm.commands[0][:2] == ["rpm", "-q"]
+
+    dpkg = _Runner(
+        "dkms\tinstalled\ngit\tnot-installed\n",
+        "dpkg-query: no packages found matching kernel-devel-6.9.0\n",
+    )
+    assert packages.missing_packages(dpkg, "apt", names) == [
+        "git",
+        "kernel-devel-6.9.0",
+    ]
+
+    pacman = _Runner(
+        "dkms 3.0-1\ngit 2.45-1\n",
+        "error: package 'kernel-devel-6.9.0' was not found\n",
+    )
+    assert packages.missing_packages(pacman, "pacman", names) == ["kernel-devel-6.9.0"]
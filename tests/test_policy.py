@@ -0,0 +1,134 @@
+"""Tests for the acer-battery-policy charge policy service."""
+
+import datetime
+import importlib.util
+import json
+from pathlib import Path
+from types import ModuleType
+
+import jinja2
+import pytest
+
+CONFIG = {
+    "default": True,
+    "rules": [
+        {
+            "name": "morning",
+            "health_mode": False,
+            "days": ["mon", "tue", "wed", "thu", "fri"],
+            "from": "07:00",
+            "until": "08:00",
+        },
+        {
+            "name": "travel",
+            "health_mode": False,
+            "ac": True,
+            "flag": "/var/lib/acer-wmi-battery/travel",
+        },
+    ],
+}
+
+# 2024-06-03 is a Monday.
+MONDAY = datetime.datetime(2024, 6, 3)
+
+
+def _load() -> ModuleType:
+    """Import the policy service from the role's files directory."""
+    spec = importlib.util.spec_from_file_location(
+        "acer_battery_policy", Path("roles/acer_battery/files/acer_battery_policy.py")
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def root(tmp_path: Path) -> Path:
+    """A host on battery with the driver loaded and the 80% limit on."""
+    root = tmp_path / "root"
+    wmi = root / "sys/bus/wmi/drivers/acer-wmi-battery"
+    wmi.mkdir(parents=True)
+    (wmi / "health_mode").write_text("1\n")
+    for name, kind, online in (("AC", "Mains", "0"), ("BAT1", "Battery", "1")):
+        supply = root / "sys/class/power_supply" / name
+        supply.mkdir(parents=True)
+        (supply / "type").write_text(kind + "\n")
+        (supply / "online").write_text(online + "\n")
+    return root
+
+
+def test_evaluate_rules(root: Path) -> None:
+    """The first matching rule wins; windows may cross midnight."""
+    policy = _load()
+    at = MONDAY.replace(hour=7, minute=30)
+    assert policy.evaluate(CONFIG, at, False, str(root)) == (False, "morning")
+    assert policy.evaluate(CONFIG, at.replace(hour=8), False, str(root)) == (
+        True,
+        "default",
+    )
+    saturday = at + datetime.timedelta(days=5)
+    assert policy.evaluate(CONFIG, saturday, True, str(root)) == (True, "default")
+
+    flag = root / "var/lib/acer-wmi-battery/travel"
+    flag.parent.mkdir(parents=True)
+    flag.touch()
+    assert policy.evaluate(CONFIG, saturday, True, str(root)) == (False, "travel")
+    assert policy.evaluate(CONFIG, saturday, False, str(root))[1] == "default"
+    assert policy.evaluate(CONFIG, saturday, None, str(root))[1] == "default"
+
+    night = {"health_mode": False, "days": ["fri"], "from": "22:00", "until": "06:00"}
+    friday = MONDAY + datetime.timedelta(days=4)
+    assert policy.in_window(night, friday.replace(hour=23))
+    assert policy.in_window(night, friday + datetime.timedelta(days=1, hours=5))
+    assert not policy.in_window(night, friday.replace(hour=5))
+    assert not policy.in_window(night, friday.replace(hour=12))
+
+
+def test_apply_writes_only_on_change(root: Path, tmp_path: Path) -> None:
+    """health_mode is written when the rules ask for another value, never otherwise."""
+    policy = _load()
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps(CONFIG))
+    record = tmp_path / "policy.json"
+    attr = root / "sys/bus/wmi/drivers/acer-wmi-battery/health_mode"
+    args = ["--rules", str(rules), "--policy", str(record), "--root", str(root)]
+
+    assert policy.main(args + ["--now", "2024-06-03T12:00"]) == 0
+    assert attr.read_text() == "1\n", "an unchanged value must not be rewritten"
+    assert json.loads(record.read_text()) == {"health_mode": True}
+
+    assert policy.main(args + ["--now", "2024-06-03T07:00", "--dry-run"]) == 0
+    assert attr.read_text() == "1\n"
+    assert policy.main(args + ["--now", "2024-06-03T07:00"]) == 0
+    assert attr.read_text() == "0"
+    assert json.loads(record.read_text()) == {"health_mode": False}
+
+    (root / "sys/class/power_supply/AC/online").write_text("1\n")
+    assert policy.on_ac(str(root)) is True
+    attr.parent.joinpath("health_mode").unlink()
+    assert policy.main(args + ["--now", "2024-06-03T12:00"]) == 0
+
+
+def test_timer_ends_windows_on_their_days() -> None:
+    """A window's end fires on its days, one day later when it crosses midnight."""
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader("roles/acer_battery/templates"),
+        trim_blocks=True,
+    )
+    rules = [
+        {"days": ["mon", "tue"], "from": "07:00", "until": "08:00"},
+        {"days": ["Fri", "sunday"], "from": "22:00", "until": "06:30"},
+        {"from": "20:00", "until": "06:00"},
+    ]
+    timer = env.get_template("acer-battery-policy.timer.j2").render(
+        acer_battery_policy_rules=rules
+    )
+    assert [line for line in timer.splitlines() if line.startswith("OnCalendar")] == [
+        "OnCalendar=Mon,Tue *-*-* 07:00",
+        "OnCalendar=Mon,Tue *-*-* 08:00",
+        "OnCalendar=Fri,Sunday *-*-* 22:00",
+        "OnCalendar=Sat,Mon *-*-* 06:30",
+        "OnCalendar=*-*-* 20:00",
+        "OnCalendar=*-*-* 06:00",
+    ]
@@ -0,0 +1,62 @@
+"""Tests for the acer_battery_profile callback plugin."""
+
+import importlib.util
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+from typing import Any, Dict
+
+
+def _load_profile() -> ModuleType:
+    """Import the profiling callback from callback_plugins/."""
+    path = Path("callback_plugins/acer_battery_profile.py")
+    spec = importlib.util.spec_from_file_location("acer_battery_profile", path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_remote_executions_counts_module_runs() -> None:
+    """Only results carrying a module invocation count as remote executions."""
+    profile = _load_profile()
+    assert profile.remote_executions({"invocation": {}, "changed": True}) == 1
+    assert profile.remote_executions({"msg": "debug output"}) == 0
+    loop = {"results": [{"invocation": {}}, {"invocation": {}}, {"skipped": True}]}
+    assert profile.remote_executions(loop) == 2
+
+
+def _task(uuid: str, name: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        _uuid=uuid,
+        action="ansible.builtin.command",
+        get_name=lambda: name,
+        get_path=lambda: "tasks/main.yml:1",
+    )
+
+
+def _result(task: SimpleNamespace, res: Dict[str, Any]) -> SimpleNamespace:
+    return SimpleNamespace(
+        _task=task, _host=SimpleNamespace(get_name=lambda: "localhost"), _result=res
+    )
+
+
+def test_report_records_status_per_task() -> None:
+    """The report should carry per-task status, durations and totals."""
+    profile = _load_profile()
+    callback = profile.CallbackModule()
+    build = _task("1", "Build module")
+    skip = _task("2", "Optional step")
+    callback.v2_playbook_on_task_start(build, False)
+    callback.v2_runner_on_ok(_result(build, {"changed": True, "invocation": {}}))
+    callback.v2_playbook_on_task_start(skip, False)
+    callback.v2_runner_on_skipped(_result(skip, {"skipped": True}))
+
+    report = callback.report()
+    assert [t["name"] for t in report["tasks"]] == ["Build module", "Optional step"]
+    assert report["tasks"][0]["hosts"]["localhost"]["status"] == "changed"
+    assert report["totals"] == {
+        "tasks": 2,
+        "remote_executions": 1,
+        "changed": 1,
+        "skipped": 1,
+    }
@@ -0,0 +1,117 @@
+"""Tests for the single-flight module rebuild helper (acer-battery-rebuild)."""
+
+import subprocess
+from pathlib import Path
+
+import jinja2
+
+TEMPLATE = Path("roles/acer_battery/templates/scripts/rebuild.sh.j2")
+
+STUB = """#!/bin/bash
+echo "$1" >>"{calls}"
+case "$1" in
+    key) cat "{key}" ;;
+    check) exit 1 ;;
+    *) echo "dkms build failed for $2" >&2; exit 1 ;;
+esac
+"""
+
+
+def _render_rebuild(tmp_path: Path) -> Path:
+    """Render the helper with a build-cache stub whose builds always fail."""
+    scripts = tmp_path / "scripts"
+    scripts.mkdir()
+    (tmp_path / "key").write_text("k1\n")
+    stub = scripts / "build-cache.sh"
+    stub.write_text(STUB.format(calls=tmp_path / "calls", key=tmp_path / "key"))
+    stub.chmod(0o755)
+
+    script = tmp_path / "acer-battery-rebuild"
+    script.write_text(
+        jinja2.Template(TEMPLATE.read_text()).render(
+            acer_battery_source_dir=str(tmp_path),
+            acer_battery_root=str(tmp_path),
+            acer_battery_rebuild_state_dir=str(tmp_path / "state"),
+            acer_battery_rebuild_backoff=300,
+            acer_battery_rebuild_backoff_max=86400,
+            acer_battery_mok_der="/var/lib/shim-signed/mok/MOK.der",
+        )
+    )
+    script.chmod(0o755)
+    return script
+
+
+def _builds(tmp_path: Path) -> list[str]:
+    """Build actions the helper asked the build cache for."""
+    calls = (tmp_path / "calls").read_text().split()
+    return [call for call in calls if call in ("ensure", "rebuild")]
+
+
+def test_failed_build_backs_off(tmp_path: Path) -> None:
+    """A failure is recorded and replayed until the inputs change or --force."""
+    script = _render_rebuild(tmp_path)
+    record = tmp_path / "state/6.9.0"
+
+    first = subprocess.run([str(script), "6.9.0"], capture_output=True, text=True)
+    assert first.returncode == 1
+    assert "dkms build failed for 6.9.0" in first.stderr
+    fields = dict(line.split("=", 1) for line in record.read_text().splitlines())
+    assert fields["key"] == "k1"
+    assert fields["failures"] == "1"
+    assert int(fields["retry_after"]) - int(fields["failed_at"]) == 300
+    assert fields["message"] == "dkms build failed for 6.9.0"
+
+    again = subprocess.run([str(script), "6.9.0"], capture_output=True, text=True)
+    assert again.returncode == 75
+    assert "failed 1 time(s) with unchanged inputs" in again.stderr
+    assert _builds(tmp_path) == ["ensure"]
+
+    forced = subprocess.run(
+        [str(script), "--force", "6.9.0"], capture_output=True, text=True
+    )
+    assert forced.returncode == 1
+    assert _builds(tmp_path) == ["ensure", "rebuild"]
+    fields = dict(line.split("=", 1) for line in record.read_text().splitlines())
+    assert fields["failures"] == "2"
+    assert int(fields["retry_after"]) - int(fields["failed_at"]) == 600
+
+    (tmp_path / "key").write_text("k2\n")
+    changed = subprocess.run([str(script), "6.9.0"], capture_output=True, text=True)
+    assert changed.returncode == 1
+    assert _builds(tmp_path) == ["ensure", "rebuild", "ensure"]
+    assert "failures=1" in record.read_text()
+
+    subprocess.run([str(script), "--clear", "6.9.0"], check=True, capture_output=True)
+    assert not record.exists()
+
+
+def test_load_only_rebuilds_a_stale_module(tmp_path: Path) -> None:
+    """--load loads a module whose vermagic matches without asking for a build."""
+    script = _render_rebuild(tmp_path)
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name, body in (
+        ("lsmod", "exit 0"),
+        ("modprobe", 'echo "$@" >>"%s"' % (tmp_path / "modprobe")),
+    ):
+        (bin_dir / name).write_text("#!/bin/bash\n%s\n" % body)
+        (bin_dir / name).chmod(0o755)
+    vermagic = tmp_path / "scripts/vermagic-check.sh"
+    vermagic.write_text('#!/bin/bash\necho "match $1"\n')
+    vermagic.chmod(0o755)
+    env = {"PATH": "%s:/usr/bin:/bin" % bin_dir}
+
+    loaded = subprocess.run(
+        [str(script), "--load"], capture_output=True, text=True, env=env
+    )
+    assert loaded.returncode == 0, loaded.stderr
+    assert "Module loaded successfully" in loaded.stdout
+    assert not (tmp_path / "calls").exists()
+
+    vermagic.write_text('#!/bin/bash\necho "mismatch $1 6.1.0"; exit 1\n')
+    stale = subprocess.run(
+        [str(script), "--load"], capture_output=True, text=True, env=env
+    )
+    assert "is not current (mismatch" in stale.stdout
+    assert _builds(tmp_path) == ["ensure"]
+    assert (tmp_path / "modprobe").read_text().splitlines() == ["acer_wmi_battery"] * 2
@@ -1,149 +1,538 @@
-"""Test the acer_battery role functionality."""
+"""Test the acer_battery role functionality.
 
-from typing import Iterator
+The role is converged for real against the fake system in ``fake_system``:
+stub dkms/modprobe/systemctl binaries and a temporary root, so the tests
+need neither root nor a kernel build environment. The default scenario, with
+forced signing and charge policy rules, is converged once per module; tests
+that change the system get the converged root restored from a snapshot.
+Tests marked ``slow`` converge the role again and only run with
+ACER_BATTERY_SLOW_TESTS=1.
+"""
+
+import json
 import os
+import platform
 import shutil
 import subprocess
-import pytest
+import time
 from pathlib import Path
+from typing import Any, Callable, Dict, List
 
+import pytest
 
-@pytest.fixture
-def mock_git_repo(tmp_path: Path) -> Iterator[Path]:
-    """Create a mock git repository for testing."""
-    # Create working repository
-    repo_path = tmp_path / "acer-wmi-battery"
-    repo_path.mkdir()
-
-    # Initialize git repo with master branch
-    subprocess.run(
-        ["git", "init", "--initial-branch=master"],
-        cwd=repo_path,
-        check=True,
-        capture_output=True,
+from fake_system import FakeSystem, PlaybookRunner, RunResult, Scenario
+
+KERNEL = platform.release()
+PIPELINE = "../roles/acer_battery : Install, build and load the module"
+TRAVEL_FLAG = "/var/lib/acer-wmi-battery/travel"
+POLICY_RULES = [
+    {
+        "name": "morning",
+        "health_mode": False,
+        "days": ["mon", "tue"],
+        "from": "07:00",
+        "until": "08:00",
+    },
+    {"name": "travel", "health_mode": False, "flag": TRAVEL_FLAG},
+]
+
+
+def _status(result: RunResult, name: str) -> str:
+    return str([t["status"] for t in result.tasks if t["name"] == name][-1])
+
+
+def _calls(result: RunResult, program: str) -> List[str]:
+    return [c for c in result.calls if c.split(" ", 1)[0] == program]
+
+
+@pytest.fixture(scope="module")
+def converged(new_scenario: Callable[..., Scenario]) -> Scenario:
+    """A fresh system converged, rerun and then run in check mode."""
+    scenario = new_scenario(
+        acer_battery_force_signing=True,
+        acer_battery_health_mode=True,
+        acer_battery_policy_rules=POLICY_RULES,
     )
+    scenario.system.add_kernel("6.98.0-next")
+    scenario.system.add_kernel("2.6.32-old")
+    flag = scenario.system.root / TRAVEL_FLAG.lstrip("/")
+    flag.parent.mkdir(parents=True)
+    flag.touch()
+    scenario.run("converge")
+    scenario.run("rerun")
+    scenario.run("check", check=True)
+    scenario.system.snapshot()
+    return scenario
 
-    # Configure git
-    subprocess.run(
-        ["git", "config", "user.email", "test@example.com"],
-        cwd=repo_path,
-        check=True,
-        capture_output=True,
+
+@pytest.fixture
+def converged_system(
+    converged: Scenario, monkeypatch: pytest.MonkeyPatch
+) -> FakeSystem:
+    """The converged system, restored for a test that looks at or changes it."""
+    converged.system.restore()
+    for key, value in converged.system.env.items():
+        monkeypatch.setenv(key, value)
+    return converged.system
+
+
+def test_role_syntax(
+    playbook_runner: PlaybookRunner, role_vars: Dict[str, Any]
+) -> None:
+    """Test that the role syntax is valid."""
+    result = playbook_runner.run("tests/test.yml", role_vars, syntax=True)
+    assert result.rc == 0
+
+
+def test_role_converge(converged: Scenario, converged_system: FakeSystem) -> None:
+    """Test that the role installs its packages, builds and loads the module."""
+    result = converged.results["converge"]
+    assert result.rc == 0, result.failed_tasks()
+    assert result.stats["failures"] == 0
+
+    dnf = _calls(result, "dnf")
+    assert len(dnf) == 1, "packages should be installed in one transaction"
+    # Versioned headers for the running and the newer, not yet booted kernel only.
+    packages = dnf[0].split()
+    assert [p for p in packages if p.endswith("-" + KERNEL)]
+    assert [p for p in packages if p.endswith("-6.98.0-next")]
+    assert not [p for p in packages if p.endswith("-2.6.32-old")]
+
+    dkms = _calls(result, "dkms")
+    assert "dkms add -m acer-wmi-battery -v main" in dkms
+    # Each kernel is compiled in its own DKMS tree, outside the dkms add lock.
+    build = "/build/%s -m acer-wmi-battery -v main -k %s" % (KERNEL, KERNEL)
+    assert any(c.startswith("dkms build --dkmstree") and build in c for c in dkms)
+    assert not [c for c in dkms if c.startswith("dkms install")]
+    assert converged_system.loaded() == ["acer_wmi_battery"]
+
+    root = converged_system.root
+    link = "var/lib/dkms/acer-wmi-battery/kernel-%s-%s" % (KERNEL, platform.machine())
+    assert os.readlink(root / link) == "main/%s/%s" % (KERNEL, platform.machine())
+    assert not list((root / "var/cache/acer-battery/build").iterdir())
+    assert (root / "lib/modules" / KERNEL / "extra/acer_wmi_battery.ko").exists()
+    assert (root / "usr/local/bin/acer-battery-status").exists()
+    assert (root / "etc/systemd/system/acer-wmi-battery.service").exists()
+
+
+def test_role_idempotency(converged: Scenario) -> None:
+    """Test that a second converge changes nothing and rebuilds nothing."""
+    rerun = converged.results["rerun"]
+    assert rerun.rc == 0, rerun.failed_tasks()
+    assert rerun.changed_tasks() == []
+    assert not [
+        c for c in _calls(rerun, "dkms") if c.split()[1] in ("build", "install")
+    ]
+
+
+def test_role_rerun_skips_pipeline(converged: Scenario) -> None:
+    """Test that a converged host only gets the module verified."""
+    rerun = converged.results["rerun"]
+    assert _status(rerun, PIPELINE) == "skipped"
+    assert rerun.calls == ["lsmod "]
+    assert _status(rerun, "../roles/acer_battery : Record applied state") == "ok"
+
+
+def test_role_check_mode_after_converge(converged: Scenario) -> None:
+    """Test that check mode on a converged system reports no changes."""
+    result = converged.results["check"]
+    assert result.rc == 0, result.failed_tasks()
+    assert result.changed_tasks() == []
+
+
+@pytest.mark.slow
+def test_role_reconverges_on_drift(
+    converged: Scenario, converged_system: FakeSystem
+) -> None:
+    """Test that a modified installed file and an unloaded module run the pipeline."""
+    status = converged_system.root / "usr/local/bin/acer-battery-status"
+    original = status.read_text()
+    status.write_text(original + "# local edit\n")
+    (converged_system.root / "run/fake-system/loaded/acer_wmi_battery").unlink()
+
+    result = converged.run("drifted")
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, PIPELINE) == "ok"
+    assert status.read_text() == original
+    assert converged_system.loaded() == ["acer_wmi_battery"]
+
+
+def test_role_collects_dkms_garbage(
+    converged: Scenario, converged_system: FakeSystem
+) -> None:
+    """Test that builds for removed kernels and superseded versions are removed."""
+    root = converged_system.root
+    old_version = root / "var/lib/dkms/acer-wmi-battery/0.9/6.0.0/x86_64/module"
+    old_version.mkdir(parents=True)
+    (old_version / "acer_wmi_battery.ko").write_bytes(bytes(4096))
+    removed_kernel = root / "var/lib/dkms/acer-wmi-battery/main/6.1.0/x86_64/module"
+    removed_kernel.mkdir(parents=True)
+    (removed_kernel / "acer_wmi_battery.ko").write_bytes(bytes(4096))
+    (root / "lib/modules/6.1.0/extra").mkdir(parents=True)
+    (root / "lib/modules/6.1.0/extra/acer_wmi_battery.ko").write_bytes(bytes(4096))
+    cache = root / "var/cache/acer-battery"
+    active = sorted(p.name for p in (cache / "modules").iterdir())
+    for key, kernel in (("stale", "6.1.0"), ("superseded", KERNEL)):
+        (cache / "modules" / key).mkdir()
+        (cache / "modules" / key / "acer_wmi_battery.ko").write_bytes(bytes(4096))
+        (cache / "modules" / key / "kernel").write_text(kernel + "\n")
+    (cache / "active/6.1.0").mkdir()
+    (cache / "active/6.1.0/current").write_text("stale main\n")
+
+    result = converged.run("garbage")
+    assert result.rc == 0, result.failed_tasks()
+    assert "../roles/acer_battery : Collect DKMS garbage" in result.changed_tasks()
+    assert sorted(
+        p.name for p in (root / "var/lib/dkms/acer-wmi-battery").iterdir()
+    ) == [
+        "kernel-%s-%s" % (KERNEL, platform.machine()),
+        "main",
+    ]
+    assert not (root / "lib/modules/6.1.0").exists()
+    assert (root / "lib/modules" / KERNEL / "extra/acer_wmi_battery.ko").exists()
+    assert sorted(p.name for p in (cache / "modules").iterdir()) == active
+    assert sorted(p.name for p in (cache / "active").iterdir()) == [KERNEL]
+
+
+def test_role_defers_kernels_without_headers(
+    converged_system: FakeSystem, tmp_path: Path
+) -> None:
+    """Test that a kernel installed before its headers is built once they appear."""
+    fake_system = converged_system
+    root = fake_system.root
+    hook = root / "etc/kernel/install.d/90-acer-wmi-battery.install"
+    queue = root / "usr/src/acer-wmi-battery-main/scripts/build-queue.sh"
+
+    def queue_state(*args: str, env: Any = None) -> str:
+        return subprocess.run(
+            [str(queue), *args], check=True, capture_output=True, text=True, env=env
+        ).stdout
+
+    fake_system.add_kernel("6.99.0-next", headers=False)
+    for _ in range(2):
+        subprocess.run([str(hook), "add", "6.99.0-next"], check=True)
+    assert queue_state("list") == "6.99.0-next\tqueued\t0\n"
+    timer = "acer-wmi-battery-build-queue.timer"
+    assert (
+        fake_system.calls("systemctl").count("systemctl start --no-block " + timer) == 1
     )
-    subprocess.run(
-        ["git", "config", "user.name", "Test User"],
-        cwd=repo_path,
-        check=True,
-        capture_output=True,
+    queue_state("drain")
+    assert queue_state("list") == "6.99.0-next\tqueued\t0\n"
+
+    # Every build fails: the kernel is given up after the retry limit.
+    fake_system.add_kernel("6.99.0-next")
+    broken = tmp_path / "broken-bin"
+    broken.mkdir()
+    (broken / "dkms").write_text("#!/bin/bash\nexit 1\n")
+    (broken / "dkms").chmod(0o755)
+    env = dict(os.environ, PATH="%s:%s" % (broken, os.environ["PATH"]))
+    queue_state("drain", env=env)
+    assert queue_state("list") == "6.99.0-next\tqueued\t1\n"
+    # Same inputs within the backoff: the recorded failure is not retried.
+    queue_state("drain", env=env)
+    assert queue_state("list") == "6.99.0-next\tqueued\t1\n"
+    rebuild = root / "usr/local/bin/acer-battery-rebuild"
+    for _ in range(2):
+        subprocess.run([str(rebuild), "--clear", "6.99.0-next"], check=True)
+        queue_state("drain", env=env)
+    assert queue_state("list") == "6.99.0-next\tfailed\t3\n"
+
+    queue_state("defer", "6.99.0-next")
+    queue_state("drain")
+    assert queue_state("list") == ""
+    assert fake_system.calls("systemctl")[-1] == "systemctl stop --no-block " + timer
+    assert (root / "lib/modules/6.99.0-next/extra/acer_wmi_battery.ko").exists()
+
+
+def test_role_records_kernel_builds(
+    converged: Scenario, converged_system: FakeSystem, tmp_path: Path
+) -> None:
+    """Test that hook builds are logged per kernel and indexed for status and role."""
+    fake_system = converged_system
+    root = fake_system.root
+    hook = root / "etc/kernel/install.d/90-acer-wmi-battery.install"
+    fake_system.add_kernel("6.99.0-next")
+    subprocess.run([str(hook), "add", "6.99.0-next"], check=True)
+
+    broken = tmp_path / "broken-bin"
+    broken.mkdir()
+    # Only the compile fails; dkms add goes to the fake dkms after this one.
+    (broken / "dkms").write_text(
+        '#!/bin/bash\n[ "$1" = build ] || PATH="${PATH#*:}" exec dkms "$@"\n'
+        "echo 'make: *** [modules] Error 2'\nexit 1\n"
     )
+    (broken / "dkms").chmod(0o755)
+    fake_system.add_kernel("6.99.1-next")
+    env = dict(os.environ, PATH="%s:%s" % (broken, os.environ["PATH"]))
+    subprocess.run([str(hook), "add", "6.99.1-next"], check=True, env=env)
 
-    # Create dummy files
-    (repo_path / "Makefile").write_text("obj-m += acer-wmi-battery.o\n")
-    (repo_path / "acer-wmi-battery.c").write_text(
-        '#include <linux/module.h>\n\nMODULE_LICENSE("GPL");\n'
+    index = root / "var/lib/acer-wmi-battery/builds.tsv"
+    rows = {
+        line.split("\t")[0]: line.split("\t") for line in index.read_text().splitlines()
+    }
+    assert rows["6.99.0-next"][2:4] == ["build", "ok"]
+    assert rows["6.99.1-next"][2:4] == ["build", "failed"]
+    log = root / "var/log/acer-wmi-battery/kernel-6.99.1-next.log"
+    assert rows["6.99.1-next"][5] == str(log)
+    assert "Error 2" in log.read_text()
+    assert (
+        "Error 2"
+        not in (root / "var/log/acer-wmi-battery-kernel-install.log").read_text()
     )
+    assert {
+        (e["ACER_BATTERY_KERNEL"], e["ACER_BATTERY_PHASE"], e["ACER_BATTERY_RESULT"])
+        for e in fake_system.journal()
+        if e.get("SYSLOG_IDENTIFIER") == "acer-wmi-battery-build"
+    } == {("6.99.0-next", "build", "ok"), ("6.99.1-next", "build", "failed")}
 
-    # Add and commit files
-    subprocess.run(
-        ["git", "add", "."],
-        cwd=repo_path,
-        check=True,
+    status = subprocess.run(
+        [str(root / "usr/local/bin/acer-battery-status"), "--json"],
         capture_output=True,
-    )
-    subprocess.run(
-        ["git", "commit", "-m", "Initial commit"],
-        cwd=repo_path,
+        text=True,
         check=True,
-        capture_output=True,
     )
+    last = {k["kernel"]: k["last_build"] for k in json.loads(status.stdout)["dkms"]}
+    assert last["6.99.1-next"]["result"] == "failed"
+    assert last[KERNEL] is None
 
-    # Create a 'main' branch so tests can use the role default version.
-    subprocess.run(
-        ["git", "checkout", "-b", "main"],
-        cwd=repo_path,
-        check=True,
-        capture_output=True,
+    result = converged.run("failed-hook-build")
+    assert result.rc == 0, result.failed_tasks()
+    assert (
+        _status(result, "../roles/acer_battery : Report failed kernel hook builds")
+        == "ok"
     )
 
-    yield repo_path
+    subprocess.run([str(hook), "remove", "6.99.1-next"], check=True)
+    assert "6.99.1-next" not in index.read_text()
+    assert not log.exists()
 
-    # Cleanup
-    shutil.rmtree(repo_path)
 
+@pytest.mark.slow
+def test_role_switches_versions_side_by_side(
+    converged: Scenario, converged_system: FakeSystem
+) -> None:
+    """Test that a new version is built side by side and rolled back from cache."""
+    fake_system = converged_system
+    root = fake_system.root
+    module = root / "lib/modules" / KERNEL / "extra/acer_wmi_battery.ko"
+    assert b"version=main" in module.read_bytes()
 
-def test_role_syntax(mock_git_repo: Path) -> None:
-    """Test that the role syntax is valid."""
-    result = subprocess.run(
-        [
-            "ansible-playbook",
-            "-i",
-            "tests/inventory",
-            "--syntax-check",
-            "tests/test.yml",
-        ],
-        cwd=os.path.dirname(os.path.dirname(__file__)),
-        capture_output=True,
-        text=True,
-        env={
-            **os.environ,
-            "ANSIBLE_ROLES_PATH": str(mock_git_repo.parent),
-            "MOCK_REPO_PATH": str(mock_git_repo),
-            "ANSIBLE_PYTHON_INTERPRETER": "/usr/bin/python3",
-        },
-    )
-    assert result.returncode == 0, f"Syntax check failed: {result.stderr}"
+    result = converged.run("upgrade", acer_battery_version="master")
+    assert result.rc == 0, result.failed_tasks()
+    assert b"version=master" in module.read_bytes()
+    upgrade = result.calls
+    assert not [c for c in upgrade if c.startswith(("dkms remove", "dkms uninstall"))]
+    assert upgrade.count("modprobe -r acer_wmi_battery") == 1
+    assert fake_system.loaded() == ["acer_wmi_battery"]
+    active = root / "var/cache/acer-battery/active" / KERNEL
+    assert (active / "current").read_text().split()[1] == "master"
+    assert (active / "previous").read_text().split()[1] == "main"
 
+    build_cache = root / "usr/src/acer-wmi-battery-master/scripts/build-cache.sh"
+    rollback = [str(build_cache), "rollback", KERNEL]
+    builds = len(fake_system.calls("dkms"))
+    subprocess.run(rollback, check=True, capture_output=True)
+    assert b"version=main" in module.read_bytes()
+    assert len(fake_system.calls("dkms")) == builds
+    assert fake_system.loaded() == ["acer_wmi_battery"]
+    assert (active / "current").read_text().split()[1] == "main"
+    subprocess.run(rollback, check=True, capture_output=True)
+    assert b"version=master" in module.read_bytes()
 
-def test_role_check_mode(mock_git_repo: Path) -> None:
-    """Test that the role runs in check mode."""
-    result = subprocess.run(
-        ["ansible-playbook", "-i", "tests/inventory", "--check", "tests/test.yml"],
-        cwd=os.path.dirname(os.path.dirname(__file__)),
-        capture_output=True,
-        text=True,
-        env={
-            **os.environ,
-            "ANSIBLE_ROLES_PATH": str(mock_git_repo.parent),
-            "MOCK_REPO_PATH": str(mock_git_repo),
-            "ANSIBLE_PYTHON_INTERPRETER": "/usr/bin/python3",
-        },
-    )
-    assert result.returncode == 0, f"Check mode failed: {result.stderr}"
+    result = converged.run("downgrade")
+    assert result.rc == 0, result.failed_tasks()
+    assert b"version=main" in module.read_bytes()
+    assert not [c for c in _calls(result, "dkms") if c.startswith("dkms build")]
 
 
-def test_role_idempotency(mock_git_repo: Path) -> None:
-    """Test that the role is idempotent."""
-    # First run
-    result1 = subprocess.run(
-        ["ansible-playbook", "-i", "tests/inventory", "--check", "tests/test.yml"],
-        cwd=os.path.dirname(os.path.dirname(__file__)),
-        capture_output=True,
-        text=True,
-        env={
-            **os.environ,
-            "ANSIBLE_ROLES_PATH": str(mock_git_repo.parent),
-            "MOCK_REPO_PATH": str(mock_git_repo),
-            "ANSIBLE_PYTHON_INTERPRETER": "/usr/bin/python3",
-        },
+def _detect_drift(fake_system: FakeSystem) -> subprocess.CompletedProcess:
+    """Unload the driver, e.g. after a BIOS reset, and run the drift agent."""
+    root = fake_system.root
+    (root / "run/fake-system/loaded/acer_wmi_battery").unlink()
+    shutil.rmtree(root / "sys/bus/wmi/drivers/acer-wmi-battery")
+    agent = [
+        str(root / "usr/local/bin/acer-battery-drift"),
+        "--manifest",
+        str(root / "usr/src/acer-wmi-battery-main/ANSIBLE-MANAGED.json"),
+        "--status-file",
+        str(root / "var/lib/acer-wmi-battery/drift.json"),
+        "--cert",
+        str(root / "var/lib/dkms/mok.pub"),
+        "--root",
+        str(root),
+    ]
+    return subprocess.run(agent, capture_output=True, text=True)
+
+
+def test_role_drift_agent(converged: Scenario, converged_system: FakeSystem) -> None:
+    """Test that drift.yml skips a host in sync and the agent notices drift."""
+    status_file = converged_system.root / "var/lib/acer-wmi-battery/drift.json"
+    assert json.loads(status_file.read_text())["drifted"] is False
+
+    result = converged.run("drift-clean", "drift.yml")
+    assert result.rc == 0, result.failed_tasks()
+    assert not [t for t in result.tasks if t["name"].startswith("acer_battery : ")]
+
+    check = _detect_drift(converged_system)
+    assert check.returncode == 1
+    assert "driver not loaded" in check.stdout
+    assert json.loads(status_file.read_text())["drifted"] is True
+
+
+@pytest.mark.slow
+def test_role_drift_converges_drifted_host(
+    converged: Scenario, converged_system: FakeSystem
+) -> None:
+    """Test that drift.yml converges a host the drift agent reports as drifted."""
+    assert _detect_drift(converged_system).returncode == 1
+
+    result = converged.run("drift-detected", "drift.yml")
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, "acer_battery : Install, build and load the module") == "ok"
+    assert converged_system.loaded() == ["acer_wmi_battery"]
+    status_file = converged_system.root / "var/lib/acer-wmi-battery/drift.json"
+    assert json.loads(status_file.read_text())["drifted"] is False
+
+
+@pytest.mark.slow
+def test_role_async_build(
+    playbook_runner: PlaybookRunner, role_vars: Dict[str, Any], fake_system: FakeSystem
+) -> None:
+    """Test that the fleet playbook builds as an async job in a compile slot."""
+    fleet_vars = dict(role_vars, acer_battery_build_slots=1)
+    result = playbook_runner.run("fleet.yml", fleet_vars)
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, "acer_battery : Build and install module") == "skipped"
+    assert _status(result, "acer_battery : Wait for module build") == "changed"
+    assert fake_system.loaded() == ["acer_wmi_battery"]
+    slot = fake_system.root / "run/acer-wmi-battery/compile-slot-1.lock"
+    assert slot.exists()
+
+    rerun = playbook_runner.run("fleet.yml", fleet_vars)
+    assert rerun.rc == 0, rerun.failed_tasks()
+    assert rerun.changed_tasks() == []
+
+
+def test_role_charge_policy(converged: Scenario, converged_system: FakeSystem) -> None:
+    """Test that the charge policy rules set health_mode, writing only on a change."""
+    root = converged_system.root
+    result = converged.results["converge"]
+    assert _status(result, "../roles/acer_battery : Apply charge policy rules") == "ok"
+    health_mode = root / "sys/bus/wmi/drivers/acer-wmi-battery/health_mode"
+    assert health_mode.read_text().strip() == "0"
+
+    units = root / "etc/systemd/system"
+    timer = (units / "acer-battery-policy.timer").read_text()
+    assert "OnCalendar=Mon,Tue *-*-* 07:00\nOnCalendar=Mon,Tue *-*-* 08:00\n" in timer
+    assert "OnUnitActiveSec" not in timer and "OnBootSec" not in timer
+    path = (units / "acer-battery-policy.path").read_text()
+    assert "PathChanged=%s" % TRAVEL_FLAG in path
+    udev = (root / "etc/udev/rules.d/90-acer-wmi-battery.rules").read_text()
+    assert (
+        'SUBSYSTEM=="power_supply", ACTION=="change", ATTR{type}=="Mains|USB"' in udev
     )
-    assert result1.returncode == 0, f"First run failed: {result1.stderr}"
 
-    # Second run
-    result2 = subprocess.run(
-        ["ansible-playbook", "-i", "tests/inventory", "--check", "tests/test.yml"],
-        cwd=os.path.dirname(os.path.dirname(__file__)),
-        capture_output=True,
-        text=True,
-        env={
-            **os.environ,
-            "ANSIBLE_ROLES_PATH": str(mock_git_repo.parent),
-            "MOCK_REPO_PATH": str(mock_git_repo),
-            "ANSIBLE_PYTHON_INTERPRETER": "/usr/bin/python3",
-        },
+    # What the policy service runs when the flag is removed, on a Sunday and
+    # on a Monday morning.
+    (root / TRAVEL_FLAG.lstrip("/")).unlink()
+    policy = [
+        str(root / "usr/local/bin/acer-battery-policy"),
+        "--rules",
+        str(root / "etc/acer-wmi-battery/charge-policy.json"),
+        "--policy",
+        str(root / "var/lib/acer-wmi-battery/policy.json"),
+        "--root",
+        str(root),
+    ]
+
+    def apply(now: str) -> str:
+        return subprocess.run(
+            policy + ["--now", now], check=True, capture_output=True, text=True
+        ).stdout
+
+    assert apply("2026-10-18T07:30").startswith("Set ")
+    assert health_mode.read_text() == "1"
+    assert json.loads((root / "var/lib/acer-wmi-battery/policy.json").read_text()) == {
+        "health_mode": True
+    }
+    assert not apply("2026-10-18T07:30").startswith("Set ")
+    assert apply("2026-10-19T07:30").startswith("Set ")
+    assert health_mode.read_text() == "0"
+
+
+@pytest.mark.slow
+def test_role_reapplies_charge_policy(
+    converged: Scenario, converged_system: FakeSystem
+) -> None:
+    """Test that a role run applies the rules again, reporting a change only once."""
+    task = "../roles/acer_battery : Apply charge policy rules"
+    root = converged_system.root
+    health_mode = root / "sys/bus/wmi/drivers/acer-wmi-battery/health_mode"
+    (root / TRAVEL_FLAG.lstrip("/")).unlink()
+    # Around noon local time, outside the morning window on any day.
+    env = {"TZ": "UTC%+d" % (time.gmtime().tm_hour - 12)}
+
+    result = converged.run("policy-changed", env=env)
+    assert result.rc == 0, result.failed_tasks()
+    assert _status(result, task) == "changed"
+    assert health_mode.read_text() == "1"
+    assert _status(converged.run("policy-unchanged", env=env), task) == "ok"
+
+
+def test_role_reports_facts_failure(
+    playbook_runner: PlaybookRunner, role_vars: Dict[str, Any], fake_system: FakeSystem
+) -> None:
+    """Test that a crashing facts module is reported as such, not as a root error."""
+    index = fake_system.root / "var/lib/acer-wmi-battery/builds.tsv"
+    index.parent.mkdir(parents=True)
+    index.write_bytes(b"\xff\xfe not utf-8\n")
+    result = playbook_runner.run("tests/test.yml", role_vars)
+    assert result.rc != 0
+    failed = result.failed_tasks()
+    assert len(failed) == 1
+    assert failed[0].startswith(
+        "../roles/acer_battery : Fail if acer-wmi-battery facts could not be gathered: "
+        "Gathering acer-wmi-battery facts failed: "
     )
-    assert result2.returncode == 0, f"Second run failed: {result2.stderr}"
+    assert "can't decode byte 0xff" in failed[0]
+
+
+@pytest.mark.slow
+def test_role_check_mode(
+    playbook_runner: PlaybookRunner, role_vars: Dict[str, Any], fake_system: FakeSystem
+) -> None:
+    """Test that check mode on a fresh system fails nothing and changes nothing."""
+    result = playbook_runner.run("tests/test.yml", role_vars, check=True)
+    assert result.rc == 0, result.failed_tasks()
+    assert fake_system.loaded() == []
+    assert not [c for c in fake_system.calls("dkms") if c.split()[1] != "status"]
+    assert not (fake_system.root / "usr/local/bin/acer-battery-status").exists()
+
 
-    # In check mode, Ansible may still report changes depending on tasks/handlers.
-    # The key invariant for this test suite is that the role can run repeatedly
-    # without failures.
-    assert "failed=0" in result2.stdout, "Role should not report failures"
+def test_role_forced_signing(converged: Scenario, converged_system: FakeSystem) -> None:
+    """Test that forced signing generates a MOK and signs the installed module."""
+    result = converged.results["converge"]
+    assert _calls(result, "openssl")
+
+    root = converged_system.root
+    module = root / "lib/modules" / KERNEL / "extra/acer_wmi_battery.ko"
+    assert module.read_bytes().endswith(b"~Module signature appended~\n")
+    assert _status(result, "../roles/acer_battery : Verify module signature") == "ok"
+
+
+@pytest.mark.slow
+def test_role_rejects_unsigned_module(
+    playbook_runner: PlaybookRunner, role_vars: Dict[str, Any], fake_system: FakeSystem
+) -> None:
+    """Test that a module left unsigned by the build is never installed."""
+    sign_file = fake_system.root / "lib/modules" / KERNEL / "build/scripts/sign-file"
+    sign_file.write_text("#!/bin/bash\nexit 0\n")
+    result = playbook_runner.run(
+        "tests/test.yml", dict(role_vars, acer_battery_force_signing=True)
+    )
+    assert result.rc != 0
+    assert any(
+        "Fail if the new module could not be activated" in t
+        for t in result.failed_tasks()
+    )
+    assert not (fake_system.root / "lib/modules" / KERNEL / "extra").exists()
@@ -0,0 +1,126 @@
+"""Tests for the acer-battery-sampler telemetry daemon."""
+
+import importlib.util
+from pathlib import Path
+from types import ModuleType
+from typing import Callable
+
+import pytest
+import yaml
+
+
+def _load_sampler() -> ModuleType:
+    """Import the sampler from the role's files directory."""
+    path = Path("roles/acer_battery/files/acer_battery_sampler.py")
+    spec = importlib.util.spec_from_file_location("acer_battery_sampler", path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_sampler_rereads_open_attributes(tmp_path: Path) -> None:
+    """Samples should reflect sysfs updates through the descriptors opened once."""
+    sampler_mod = _load_sampler()
+    battery = tmp_path / "BAT1"
+    battery.mkdir()
+    (battery / "capacity").write_text("80\n")
+    (battery / "status").write_text("Discharging\n")
+    (battery / "charge_now").write_text("3000000\n")
+    wmi = tmp_path / "wmi"
+    wmi.mkdir()
+    (wmi / "health_mode").write_text("1\n")
+
+    sampler = sampler_mod.Sampler(str(battery), str(wmi))
+    first = sampler.sample()
+    assert first.capacity == 80
+    assert first.status == sampler_mod.STATUS_CODES["Discharging"]
+    assert first.charge_now == 3000000
+    assert first.energy_now == sampler_mod.MISSING
+    assert first.health_mode == 1
+    assert first.as_dict()["temperature"] is None
+
+    (battery / "capacity").write_text("79\n")
+    assert sampler.sample().capacity == 79
+    sampler.close()
+
+
+def test_ring_buffer_is_bounded_and_sliceable(tmp_path: Path) -> None:
+    """The ring file should keep a fixed size and return time-range slices."""
+    sampler_mod = _load_sampler()
+    path = tmp_path / "samples.ring"
+    ring = sampler_mod.RingBuffer(str(path), 5)
+    size = path.stat().st_size
+    template = sampler_mod.Sample(0.0, *([sampler_mod.MISSING] * 12))
+    for ts in range(12):
+        ring.append(template._replace(timestamp=float(ts), capacity=ts))
+    ring.close()
+    assert path.stat().st_size == size
+
+    reader = sampler_mod.RingBuffer(str(path))
+    assert [s.timestamp for s in reader.records()] == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert [s.capacity for s in reader.records(since=8.5, until=10)] == [9, 10]
+    assert reader.records(since=20) == []
+    reader.close()
+
+    # Reopening for writing with the same capacity keeps the data.
+    assert sampler_mod.RingBuffer(str(path), 5).written == 12
+
+
+def test_sampler_service_installed() -> None:
+    """The role should install the sampler and its systemd unit."""
+    with open("roles/acer_battery/vars/main.yml", "r") as f:
+        copies = yaml.safe_load(f)["acer_battery_managed_copies"]
+    assert copies["sampler"] == {
+        "src": "acer_battery_sampler.py",
+        "dest": "{{ acer_battery_root }}/usr/local/bin/acer-battery-sampler",
+        "enabled": True,
+    }
+
+    with open("roles/acer_battery/templates/acer-battery-sampler.service.j2", "r") as f:
+        unit = f.read()
+    assert "acer-battery-sampler run" in unit
+    assert "acer_battery_sampler_capacity" in unit
+
+
+def test_sampler_follows_module_reload(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Attributes that fail to read or appear later are opened again."""
+    sampler_mod = _load_sampler()
+    battery = tmp_path / "BAT1"
+    battery.mkdir()
+    (battery / "capacity").write_text("80\n")
+    wmi = tmp_path / "wmi"
+    sampler = sampler_mod.Sampler(str(battery), str(wmi))
+    first = sampler.sample()
+    assert first.health_mode == sampler_mod.MISSING
+    assert first.status == first.charge_now == sampler_mod.MISSING
+
+    # Battery attributes that were not there at start are picked up too.
+    (battery / "status").write_text("Charging\n")
+    (battery / "charge_now").write_text("4000000\n")
+    second = sampler.sample()
+    assert (second.status, second.charge_now) == (1, 4000000)
+
+    # The driver loads after the sampler started.
+    wmi.mkdir()
+    (wmi / "health_mode").write_text("1\n")
+    assert sampler.sample().health_mode == 1
+
+    # A module swap: the next read through the old descriptor fails with ENODEV.
+    stale = [sampler._fds["health_mode"]]
+    pread: Callable[[int, int, int], bytes] = sampler_mod.os.pread
+
+    def unloaded(fd: int, size: int, offset: int) -> bytes:
+        if fd in stale:
+            stale.clear()
+            raise OSError(19, "No such device")
+        return pread(fd, size, offset)
+
+    monkeypatch.setattr(sampler_mod.os, "pread", unloaded)
+    (wmi / "health_mode").unlink()
+    (wmi / "health_mode").write_text("0\n")
+    assert sampler.sample().health_mode == 0
+    assert sampler.sample().capacity == 80
+    sampler.close()
@@ -3,26 +3,34 @@
 import yaml
 
 
-def test_bootloader_verification_tasks_exist() -> None:
-    """Test that bootloader verification tasks are present in main.yml."""
+def _facts_task() -> dict:
+    """Return the preflight acer_battery_facts task."""
     with open("roles/acer_battery/tasks/main.yml", "r") as f:
         tasks = yaml.safe_load(f)
+    facts_tasks = [
+        task
+        for task in tasks
+        if isinstance(task, dict) and task.get("name") == "Gather acer-wmi-battery facts"
+    ]
+    assert len(facts_tasks) == 1, "Should gather preflight facts in a single task"
+    task: dict = facts_tasks[0]["acer_battery_facts"]
+    return task
+
+
+def test_bootloader_verification_tasks_exist() -> None:
+    """Test that bootloader verification is part of the preflight facts and warned about."""
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
+        tasks = yaml.safe_load(f)
+
+    facts = _facts_task()
+    assert facts.get("bootloader_files"), "Should check if bootloader files exist"
+    assert facts.get("bootloader_packages"), "Should verify bootloader package integrity"
 
-    # Find bootloader verification tasks
     task_names = [
         task.get("name", "")
         for task in tasks
         if isinstance(task, dict) and "name" in task
     ]
-
-    assert any(
-        "bootloader files exist" in name.lower() for name in task_names
-    ), "Should check if bootloader files exist"
-
-    assert any(
-        "verify bootloader packages" in name.lower() for name in task_names
-    ), "Should verify bootloader package integrity"
-
     assert any(
         "warn if bootloader" in name.lower() for name in task_names
     ), "Should warn about unsigned bootloaders"
@@ -30,60 +38,25 @@ def test_bootloader_verification_tasks_exist() -> None:
 
 def test_bootloader_check_targets_correct_files() -> None:
     """Test that bootloader verification checks the correct EFI files."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
-        tasks = yaml.safe_load(f)
-
-    # Find the stat task for bootloader files
-    bootloader_stat_tasks = [
-        task
-        for task in tasks
-        if isinstance(task, dict)
-        and task.get("name", "").lower().find("bootloader files exist") != -1
-    ]
-
-    assert len(bootloader_stat_tasks) == 1, "Should have one bootloader file check task"
-
-    stat_task = bootloader_stat_tasks[0]
-    assert "ansible.builtin.stat" in stat_task, "Should use stat module"
-    assert "loop" in stat_task, "Should check multiple files"
-
-    # Verify it checks for shimx64.efi and grubx64.efi
-    loop_items = stat_task.get("loop", [])
-    assert any(
-        "shimx64.efi" in str(item) for item in loop_items
-    ), "Should check shimx64.efi"
-    assert any(
-        "grubx64.efi" in str(item) for item in loop_items
-    ), "Should check grubx64.efi"
+    files = _facts_task()["bootloader_files"]
+    assert any("shimx64.efi" in str(item) for item in files), "Should check shimx64.efi"
+    assert any("grubx64.efi" in str(item) for item in files), "Should check grubx64.efi"
 
 
 def test_bootloader_verification_uses_rpm() -> None:
     """Test that bootloader verification uses rpm -V for Fedora/RHEL."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
-        tasks = yaml.safe_load(f)
-
-    # Find the rpm verification task
-    rpm_verify_tasks = [
-        task
-        for task in tasks
-        if isinstance(task, dict)
-        and task.get("name", "").lower().find("verify bootloader packages") != -1
-    ]
+    packages = _facts_task()["bootloader_packages"]
+    assert "shim-x64" in packages, "Should verify shim-x64 package"
+    assert "grub2-efi-x64" in packages, "Should verify grub2-efi-x64 package"
 
-    assert len(rpm_verify_tasks) == 1, "Should have one rpm verification task"
-
-    verify_task = rpm_verify_tasks[0]
-    assert "ansible.builtin.command" in verify_task, "Should use command module"
-
-    cmd = verify_task["ansible.builtin.command"].get("cmd", "")
-    assert "rpm -V" in cmd, "Should use rpm -V to verify packages"
-    assert "shim-x64" in cmd, "Should verify shim-x64 package"
-    assert "grub2-efi-x64" in cmd, "Should verify grub2-efi-x64 package"
+    with open("roles/acer_battery/library/acer_battery_facts.py", "r") as f:
+        source = f.read()
+    assert '["rpm", "-V"]' in source, "Should use rpm -V to verify packages"
 
 
 def test_bootloader_warning_mentions_acer() -> None:
     """Test that bootloader warning includes Acer-specific instructions."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         tasks = yaml.safe_load(f)
 
     # Find the warning task
@@ -109,37 +82,28 @@ def test_bootloader_warning_mentions_acer() -> None:
 
 def test_bootloader_tasks_conditional_on_redhat() -> None:
     """Test that bootloader verification is conditional on RedHat/Fedora."""
-    with open("roles/acer_battery/tasks/main.yml", "r") as f:
+    with open("roles/acer_battery/tasks/install.yml", "r") as f:
         tasks = yaml.safe_load(f)
 
-    # Find bootloader-related tasks
-    bootloader_tasks = [
+    warning_tasks = [
         task
         for task in tasks
-        if isinstance(task, dict)
-        and "name" in task
-        and (
-            "bootloader files exist" in task["name"].lower()
-            or "verify bootloader packages" in task["name"].lower()
-            or "warn if bootloader" in task["name"].lower()
-        )
+        if isinstance(task, dict) and "warn if bootloader" in task.get("name", "").lower()
     ]
+    assert len(warning_tasks) == 1, "Should have one bootloader warning task"
 
-    assert len(bootloader_tasks) == 3, "Should have three bootloader-related tasks"
-
-    # All should be conditional on RedHat/Fedora
-    for task in bootloader_tasks:
-        when_clause = task.get("when", [])
-        if isinstance(when_clause, str):
-            when_clause = [when_clause]
-
-        # Should have RedHat or Fedora condition
-        has_os_condition = any(
-            "RedHat" in str(cond) or "Fedora" in str(cond) for cond in when_clause
-        )
-        assert (
-            has_os_condition
-        ), f"Task '{task['name']}' should be conditional on RedHat/Fedora"
+    when_clause = warning_tasks[0].get("when", [])
+    if isinstance(when_clause, str):
+        when_clause = [when_clause]
+    assert any(
+        "RedHat" in str(cond) or "Fedora" in str(cond) for cond in when_clause
+    ), "Bootloader warning should be conditional on RedHat/Fedora"
+
+    with open("roles/acer_battery/library/acer_battery_facts.py", "r") as f:
+        source = f.read()
+    assert 'system.get("os_family") == "RedHat"' in source, (
+        "rpm -V should only run on RedHat-family systems"
+    )
 
 
 def test_documentation_explains_when_to_retrust() -> None:
@@ -0,0 +1,150 @@
+"""Tests for the acer-battery-sigcheck module signature verifier."""
+
+import importlib.util
+import lzma
+import shutil
+import struct
+import subprocess
+import uuid
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("openssl") is None, reason="openssl is needed to sign test modules"
+)
+
+
+def _load() -> ModuleType:
+    """Import the verifier from its path in the repository."""
+    spec = importlib.util.spec_from_file_location(
+        "acer_battery_sigcheck",
+        Path("roles/acer_battery/files/acer_battery_sigcheck.py"),
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _certificate(tmp_path: Path, name: str) -> Path:
+    subprocess.run(
+        ["openssl", "req", "-new", "-x509", "-newkey", "rsa:2048", "-nodes"]
+        + [
+            "-keyout",
+            str(tmp_path / (name + ".key")),
+            "-out",
+            str(tmp_path / (name + ".pub")),
+        ]
+        + ["-days", "1", "-subj", "/CN=%s/" % name],
+        check=True,
+        capture_output=True,
+    )
+    return tmp_path / (name + ".pub")
+
+
+def _signed_module(path: Path, cert: Path) -> None:
+    """Write a module signed the way scripts/sign-file does it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\x7fELF" + bytes(200000))
+    signature = subprocess.run(
+        ["openssl", "cms", "-sign", "-in", str(path), "-signer", str(cert)]
+        + ["-inkey", str(cert.with_suffix(".key")), "-md", "sha512", "-binary"]
+        + ["-noattr", "-nocerts", "-outform", "DER"],
+        check=True,
+        capture_output=True,
+    ).stdout
+    trailer = struct.pack(">BBBBB3xI", 0, 0, 2, 0, 0, len(signature))
+    with open(path, "ab") as f:
+        f.write(signature + trailer + b"~Module signature appended~\n")
+
+
+def test_report_covers_every_kernel(tmp_path: Path) -> None:
+    """Signed, compressed, foreign-key and unsigned modules get their own status."""
+    sigcheck = _load()
+    mok = _certificate(tmp_path, "Acer Battery Module")
+    other = _certificate(tmp_path, "Other")
+    modules = tmp_path / "root/lib/modules"
+
+    _signed_module(modules / "6.1.0/extra/acer_wmi_battery.ko", mok)
+    xz = modules / "6.2.0/extra/acer_wmi_battery.ko"
+    _signed_module(xz, mok)
+    xz.with_suffix(".ko.xz").write_bytes(lzma.compress(xz.read_bytes()))
+    xz.unlink()
+    _signed_module(modules / "6.3.0/extra/acer_wmi_battery.ko", other)
+    (modules / "6.4.0/extra").mkdir(parents=True)
+    (modules / "6.4.0/extra/acer_wmi_battery.ko").write_bytes(b"\x7fELF")
+
+    result = sigcheck.report(str(tmp_path / "root"), str(mok))
+    statuses = {k: v["status"] for k, v in result["kernels"].items()}
+    assert statuses == {
+        "6.1.0": "ok",
+        "6.2.0": "ok",
+        "6.3.0": "wrong-key",
+        "6.4.0": "unsigned",
+    }
+    assert result["kernels"]["6.2.0"]["signer"] == "Acer Battery Module"
+    assert result["kernels"]["6.2.0"]["digest"] == "sha512"
+    assert sigcheck.problems(result) == ["6.3.0", "6.4.0"]
+    assert sigcheck.main(["--root", str(tmp_path / "root"), "--cert", str(mok)]) == 1
+    assert (
+        sigcheck.main(
+            ["--root", str(tmp_path / "root"), "--cert", str(mok), "--kernel", "6.2.0"]
+        )
+        == 0
+    )
+
+    staged = tmp_path / "staged/acer_wmi_battery.ko"
+    _signed_module(staged, other)
+    args = ["--cert", str(mok), "--kernel", "6.1.0", "--module", str(staged)]
+    assert sigcheck.main(args) == 1
+    result = sigcheck.report("", str(mok), ["6.1.0"], str(staged))
+    assert result["kernels"]["6.1.0"]["module"] == str(staged)
+    assert result["kernels"]["6.1.0"]["status"] == "wrong-key"
+
+
+def test_enrolled_mok_list(tmp_path: Path) -> None:
+    """The signer is looked up in MokListRT read from efivars."""
+    sigcheck = _load()
+    mok = _certificate(tmp_path, "Acer Battery Module")
+    root = tmp_path / "root"
+    _signed_module(root / "lib/modules/6.1.0/extra/acer_wmi_battery.ko", mok)
+
+    result = sigcheck.report(str(root), str(mok))
+    assert result["mok_list"] is None
+    assert result["kernels"]["6.1.0"]["enrolled"] is None
+
+    other = _certificate(tmp_path, "Other")
+    der = subprocess.run(
+        ["openssl", "x509", "-in", str(other), "-outform", "DER"],
+        check=True,
+        capture_output=True,
+    ).stdout
+    entry = bytes(16) + der
+    x509 = uuid.UUID("a5c059a1-94e4-4aa7-87b5-ab155c2bf072").bytes_le
+    efivar = root / (
+        "sys/firmware/efi/efivars/MokListRT-605dab50-e046-4300-abb6-3dd810dd8b23"
+    )
+    efivar.parent.mkdir(parents=True)
+    efivar.write_bytes(
+        b"\x06\x00\x00\x00"
+        + x509
+        + struct.pack("<III", 28 + len(entry), 0, len(entry))
+        + entry
+    )
+
+    result = sigcheck.report(str(root), str(mok), mok_path=str(mok))
+    assert result["mok_list"] == 1
+    assert result["kernels"]["6.1.0"]["status"] == "not-enrolled"
+    assert sigcheck.problems(result) == []
+    assert sigcheck.problems(result, require_enrolled=True) == ["6.1.0"]
+
+    # Only the local MOK may wait for enrollment; another signer (an artifact
+    # builder's) must already be enrolled.
+    builder = _certificate(tmp_path, "Builder")
+    _signed_module(root / "lib/modules/6.1.0/extra/acer_wmi_battery.ko", builder)
+    result = sigcheck.report(str(root), str(builder), mok_path=str(mok))
+    assert result["kernels"]["6.1.0"]["status"] == "not-enrolled"
+    assert result["kernels"]["6.1.0"]["local_mok"] is False
+    assert sigcheck.problems(result) == ["6.1.0"]
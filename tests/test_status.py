@@ -0,0 +1,109 @@
+"""Tests for the acer-battery-status machine-readable output modes."""
+
+import json
+import os
+import subprocess
+from pathlib import Path
+
+import jinja2
+
+TEMPLATE = Path("roles/acer_battery/templates/scripts/check-status.sh.j2")
+
+
+def _render_status(tmp_path: Path, **variables: object) -> Path:
+    """Render the status script with a stub vermagic checker in tmp_path."""
+    scripts = tmp_path / "scripts"
+    scripts.mkdir()
+    checker = scripts / "vermagic-check.sh"
+    checker.write_text("#!/bin/bash\necho missing\nexit 2\n")
+    checker.chmod(0o755)
+
+    script = tmp_path / "acer-battery-status"
+    script.write_text(
+        jinja2.Template(TEMPLATE.read_text()).render(
+            acer_battery_version="main",
+            acer_battery_source_dir=str(tmp_path),
+            acer_battery_cache_dir=str(tmp_path),
+            **variables,
+        )
+    )
+    script.chmod(0o755)
+    return script
+
+
+def test_status_json_output(tmp_path: Path) -> None:
+    """--json should print a single parseable object and populate the cache."""
+    script = _render_status(tmp_path)
+    result = subprocess.run(
+        [str(script), "--json"], capture_output=True, text=True, check=True
+    )
+    status = json.loads(result.stdout)
+    assert set(status) >= {
+        "kernel",
+        "module",
+        "health_mode",
+        "temperature",
+        "service",
+        "dkms",
+    }
+    assert "kernel_log_errors" not in status
+    assert set(status["module"]) == {"loaded", "signed", "vermagic"}
+    assert (tmp_path / "status.cache").exists()
+
+
+def test_status_prometheus_textfile(tmp_path: Path) -> None:
+    """--prometheus FILE should write node_exporter metrics atomically."""
+    script = _render_status(tmp_path)
+    output = tmp_path / "acer_battery.prom"
+    subprocess.run([str(script), "--prometheus", str(output)], check=True)
+    metrics = output.read_text()
+    assert "acer_battery_module_loaded " in metrics
+    assert "# TYPE acer_battery_service_active gauge" in metrics
+    assert not list(tmp_path.glob("acer_battery.prom.*"))
+
+
+def test_status_reports_ccache_stats(tmp_path: Path) -> None:
+    """With the compiler cache enabled its counters show up in --json and --prometheus."""
+    ccache_dir = tmp_path / "ccache"
+    ccache_dir.mkdir()
+    script = _render_status(
+        tmp_path,
+        acer_battery_ccache_enabled=True,
+        acer_battery_ccache_dir=str(ccache_dir),
+    )
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    stub = bin_dir / "ccache"
+    stub.write_text(
+        "#!/bin/sh\nprintf 'direct_cache_hit\\t7\\npreprocessed_cache_hit\\t2\\n"
+        "cache_miss\\t3\\ncache_size_kibibyte\\t40\\n'\n"
+    )
+    stub.chmod(0o755)
+    env = dict(os.environ, PATH="%s:%s" % (bin_dir, os.environ["PATH"]))
+
+    result = subprocess.run(
+        [str(script), "--json"], capture_output=True, text=True, check=True, env=env
+    )
+    assert json.loads(result.stdout)["ccache"] == {
+        "hits": 9,
+        "misses": 3,
+        "size_bytes": 40960,
+    }
+    metrics = subprocess.run(
+        [str(script), "--prometheus"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    ).stdout
+    assert "acer_battery_ccache_hits_total 9" in metrics
+    assert "acer_battery_ccache_misses_total 3" in metrics
+
+
+def test_status_does_not_run_dkms_status() -> None:
+    """Scrapes should use cached per-kernel state instead of dkms status."""
+    content = TEMPLATE.read_text()
+    assert "dkms status" not in content
+    assert "dmesg" not in content and "journalctl" not in content
+    assert "status.cache" in content
+    assert "/var/lib/dkms" in content and "/lib/modules" in content